@@ -0,0 +1,179 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from packet_encoder import convert_image_to_rgb565, convert_image_to_jpeg, quantize_rgb565, packetize_art, ArtFormat, JPEG_MAX_BYTES
+
+class ArtCache:
+    """Content-addressed LRU cache for converted album art.
+
+    Entries are keyed by a hash of the raw thumbnail bytes plus the target size
+    and format (and byte budget for JPEG), and hold the converted pixel buffer
+    (chunking it into frames is cheap, decoding/resizing is not), or for JPEG the
+    encoded image at the quality that met the budget. Memory use is bounded by `max_bytes`.
+    If `disk_dir` is set, entries are also written there so they survive restarts.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, disk_dir: str = None, max_disk_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock() # encode runs in the executor
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.convert_time = 0.0 # Total seconds spent converting on misses
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(image_data: bytes, size: tuple, format: int, max_bytes: int = None) -> str:
+        h = hashlib.blake2b(image_data, digest_size=16)
+        h.update(f"|{size[0]}x{size[1]}|{int(format)}".encode())
+        if max_bytes is not None:
+            h.update(f"|{max_bytes}".encode())
+        return h.hexdigest()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        value = self._disk_read(key)
+        if value is not None:
+            with self._lock:
+                self.disk_hits += 1
+            self._store(key, value)
+        return value
+
+    def put(self, key: str, value: bytes):
+        self._store(key, value)
+        self._disk_write(key, value)
+
+    def get_or_convert(self, image_data: bytes, size: tuple, format: int, max_bytes: int = JPEG_MAX_BYTES) -> bytes:
+        """Returns converted pixel data for `image_data`, converting only on a miss.
+
+        For ArtFormat.JPEG it is the JPEG data within `max_bytes` (see encode_jpeg), so the
+        quality search runs once per thumbnail and budget.
+        """
+        jpeg = format == ArtFormat.JPEG
+        key = self.make_key(image_data, size, format, max_bytes if jpeg else None)
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        start = time.perf_counter()
+        if jpeg:
+            value = convert_image_to_jpeg(image_data, size, max_bytes)
+        else:
+            value = convert_image_to_rgb565(image_data, size)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.misses += 1
+            self.convert_time += elapsed
+        self.put(key, value)
+        return value
+
+    def encode_art(self, image_data: bytes, format: int, chunk_size: int = 3072, size: tuple = (240,200)) -> list[bytes | memoryview]:
+        """Drop-in replacement for packet_encoder.encode_art that goes through the cache."""
+        if format == ArtFormat.PNG:
+            raise ValueError("PNG art isn't supported, no firmware decodes it")
+        pixels = self.get_or_convert(image_data, size, format)
+        if format == ArtFormat.PALETTE8:
+            palette, indices = quantize_rgb565(pixels, size)
+            return packetize_art(indices, format, chunk_size, size, palette=palette)
+        return packetize_art(pixels, format, chunk_size, size)
+
+    def stats(self) -> dict:
+        with self._lock:
+            misses = self.misses
+            avg_convert = self.convert_time / misses if misses else 0.0
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "convert_time_s": self.convert_time,
+                # Estimate: every hit would otherwise have cost an average conversion
+                "saved_time_s": (self.hits + self.disk_hits) * avg_convert,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _store(self, key: str, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = value
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key + ".bin")
+
+    def _disk_read(self, key: str) -> bytes | None:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+            os.utime(path) # Keep recently used entries from being pruned
+            return value
+        except OSError:
+            return None
+
+    def _disk_write(self, key: str, value: bytes):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(value)
+            os.replace(tmp, path)
+            self._disk_prune()
+        except OSError as e:
+            print(f"Art cache write error: {e}")
+
+    def _disk_prune(self):
+        """Deletes least recently used files until the store fits in `max_disk_bytes`."""
+        files = []
+        total = 0
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".bin"):
+                st = entry.stat()
+                files.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        if total <= self.max_disk_bytes:
+            return
+        files.sort()
+        for _, file_size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= file_size
+            except OSError:
+                pass
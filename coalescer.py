@@ -0,0 +1,75 @@
+import asyncio
+
+class EventCoalescer:
+    """Folds bursts of events into a single run of an async handler.
+
+    `trigger` may be called from any thread (WinRT callbacks). The handler runs once no new
+    event arrived for `settle` seconds, but at most `max_wait` seconds after the first event
+    of a burst, so a steady stream of events can't starve it. Runs never overlap: events that
+    arrive during a run are folded into one follow-up run.
+
+    The handler receives the trace of the first event of its burst (the others are folded).
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, handler, settle: float = 0.15, max_wait: float = 0.5):
+        self.loop = loop
+        self.handler = handler
+        self.settle = settle
+        self.max_wait = max_wait
+        self._first = None # Loop time of the first pending event
+        self._trace = None
+        self._timer: asyncio.TimerHandle = None
+        self._running = False
+        self._rerun = False
+
+        self.events = 0 # Events received
+        self.runs = 0 # Handler runs (property fetches)
+        self.max_waits = 0 # Runs forced by max_wait while events kept arriving
+
+    def trigger(self, trace=None):
+        self.loop.call_soon_threadsafe(self._on_event, trace)
+
+    def _on_event(self, trace):
+        self.events += 1
+        now = self.loop.time()
+        if self._first is None:
+            self._first = now
+            self._trace = trace
+        if self._timer:
+            self._timer.cancel()
+        remaining = self._first + self.max_wait - now
+        if remaining <= self.settle:
+            self._timer = self.loop.call_later(max(remaining, 0), self._fire, True)
+        else:
+            self._timer = self.loop.call_later(self.settle, self._fire)
+
+    def _fire(self, forced: bool = False):
+        self._timer = None
+        if forced:
+            self.max_waits += 1
+        if self._running:
+            self._rerun = True
+            return
+        trace = self._trace
+        self._first = self._trace = None
+        self._running = True
+        self.runs += 1
+        if trace: trace.mark("settle")
+        self.loop.create_task(self._run(trace))
+
+    async def _run(self, trace):
+        try:
+            await self.handler(trace)
+        finally:
+            self._running = False
+            if self._rerun:
+                self._rerun = False
+                self._fire()
+
+    def stats(self) -> dict:
+        return {
+            "events": self.events,
+            "runs": self.runs,
+            "folded": self.events - self.runs,
+            "max_wait_runs": self.max_waits,
+        }
@@ -0,0 +1,383 @@
+"""Headless stand-in for the desk-thing firmware, for measuring latency without the board.
+
+Mirrors hardware/desk_thing_wifi.ino: the frame parser and its payload limit, the META,
+PLAYBACK_STATE, TIMELINE, TIMELINE_SYNC and ART_* handlers, drawing into a 240x280 RGB565
+framebuffer, credit flow control, v1/v2 framing with CAPS on connect, and ART_NAK replies.
+`tick` stands in for the firmware loop, which moves the timeline bar between TIMELINE_SYNC
+frames. Every message that changes the screen is timestamped when its pixels land, together
+with the bytes received since the previous visible update.
+
+    python device_sim.py              # TCP on port 7777, like the WiFi firmware
+    python device_sim.py --pty        # pty pair, connect the host to the printed port
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from packet_encoder import (
+    FrameDecoder, ArtReceiver, encode_credit, encode_caps, decode_timeline_sync,
+    META, PLAYBACK_STATE, TIMELINE, TIMELINE_SYNC, HELLO, PROTOCOL_VERSION, CAP_TIMELINE_SYNC, CAP_ART_NAK, CAP_ART_PREVIEW,
+    CAP_ART_PALETTE, CAP_ART_JPEG, FRAME_OVERHEAD,
+)
+
+WIDTH = 240
+HEIGHT = 280
+BLACK = 0x0000
+WHITE = 0xFFFF
+RED = 0xF800
+GRAY = 0xB5B6
+
+# Same values as the firmware
+RX_WINDOW = 16384
+CREDIT_BATCH = 2048
+PAYLOAD_LIMIT = 4096 # sizeof(payload) in desk_thing_wifi.ino
+
+_KINDS = {META: "meta", PLAYBACK_STATE: "playback", TIMELINE: "timeline", TIMELINE_SYNC: "timeline",
+          HELLO: "control"} # Anything else is art
+
+@dataclass
+class VisibleEvent:
+    time: float # Clock reading once the pixels were in the framebuffer
+    kind: str # "meta", "playback", "timeline" or "art"
+    detail: object # Title, playback state, bar width or art transfer id, for matching host events
+    bytes: int # Frame bytes of this kind received since its previous visible update
+
+class DeviceSimulator:
+    """Firmware model: feed it received bytes, write back what `feed` returns (CREDIT frames).
+
+    `consume_rate` (bytes/s) adds the parse/draw time of the real board, None for none.
+    `clock` must match the host's clock for latency measurements, the default is
+    `time.perf_counter`, which is system-wide on Linux. `protocol_version=1` behaves like
+    firmware from before v2: no CAPS frame, and v2 frames aren't recognized. `caps` are the
+    CAP_* flags it announces. With `answer_hello` (the serial firmware, set by open_pty) it
+    answers HELLO like a new connection, see encode_hello.
+    """
+
+    def __init__(self, payload_limit: int = PAYLOAD_LIMIT, rx_window: int = RX_WINDOW,
+                 credit_batch: int = CREDIT_BATCH, consume_rate: float = None, clock=time.perf_counter,
+                 on_visible=None, protocol_version: int = PROTOCOL_VERSION,
+                 caps: int = CAP_TIMELINE_SYNC | CAP_ART_NAK | CAP_ART_PREVIEW | CAP_ART_PALETTE | CAP_ART_JPEG):
+        self.payload_limit = payload_limit
+        self.rx_window = rx_window
+        self.credit_batch = credit_batch
+        self.consume_rate = consume_rate
+        self.clock = clock
+        self.on_visible = on_visible
+        self.protocol_version = protocol_version
+        self.caps = caps
+        self.ticker = None # tick_forever task while served
+        self.answer_hello = False
+        self._hello = False # HELLO in the bytes being fed
+
+        self.framebuffer = np.zeros((HEIGHT, WIDTH), dtype=np.uint16)
+        self.events: list[VisibleEvent] = []
+        self.title = self.artist = self.album = ""
+        self.is_playing = True
+        self.timeline_width = 0
+        self.timeline_sync = None # (position_ms, duration_ms, rate, seq, clock at receipt) of the last TIMELINE_SYNC
+        self.reset()
+
+    def reset(self):
+        """Power-on state of the parser and art handler, e.g. on a new client."""
+        self._decoder = FrameDecoder(max_payload=self.payload_limit, max_version=self.protocol_version)
+        self._out = bytearray() # Frames to send back
+        self.art = ArtReceiver(self._draw_art, self._out.extend)
+        self._consumed = 0
+        self._pending = {} # Frame bytes per kind since its last visible update
+        self.bytes_received = 0
+
+    def connect(self) -> bytes:
+        """Called when a host connects, returns the capabilities and initial credit grant to send it."""
+        self.reset()
+        self.timeline_sync = None # A new host starts its sequence over
+        self.framebuffer[:] = BLACK
+        return self.announce()
+
+    def announce(self) -> bytes:
+        """CAPS (v2 only) and a full CREDIT window."""
+        if self.protocol_version < 2:
+            return encode_credit(self.rx_window)
+        return encode_caps(self.protocol_version, self.caps) + encode_credit(self.rx_window)
+
+    def feed(self, data: bytes) -> bytes:
+        """Processes received bytes, returns bytes to send back to the host."""
+        self.bytes_received += len(data)
+        for msg_type, payload in self._decoder.feed(data):
+            size = len(payload) + FRAME_OVERHEAD[self._decoder.version]
+            if self.consume_rate:
+                time.sleep(size / self.consume_rate)
+            kind = _KINDS.get(msg_type, "art")
+            self._pending[kind] = self._pending.get(kind, 0) + size
+            self.handle(msg_type, payload)
+
+        self._consumed += len(data)
+        if self._hello:
+            # A new host, which knows nothing of the old one's credit
+            self._hello = False
+            self._consumed = 0
+            self._out += self.announce()
+        if self._consumed >= self.credit_batch:
+            self._out += encode_credit(self._consumed)
+            self._consumed = 0
+        reply = bytes(self._out)
+        self._out.clear()
+        return reply
+
+    def handle(self, msg_type: int, payload: bytes):
+        if msg_type == META:
+            self._handle_meta(payload)
+        elif msg_type == PLAYBACK_STATE:
+            self._handle_playback(payload)
+        elif msg_type == TIMELINE:
+            self._handle_timeline(payload)
+        elif msg_type == TIMELINE_SYNC:
+            self._handle_timeline_sync(payload)
+        elif msg_type == HELLO:
+            if self.answer_hello and self.protocol_version >= 2:
+                self._hello = True
+                self._decoder.seq = None # The new host starts its sequence over
+                self.timeline_sync = None
+        else:
+            self.art.handle(msg_type, payload)
+
+    def _handle_meta(self, data: bytes):
+        fields = []
+        idx = 0
+        for _ in range(3):
+            if idx >= len(data):
+                return
+            n = data[idx]
+            fields.append(data[idx + 1:idx + 1 + n].decode('utf-8', errors='replace'))
+            idx += 1 + n
+        self.title, self.artist, self.album = fields
+
+        self._fill_rect(0, 205, WIDTH, 75, BLACK)
+        self._draw_text(0, 210, f"{self.title} - {self.artist}\n{self.album}")
+        self._visible("meta", self.title)
+
+    def _handle_playback(self, data: bytes):
+        if len(data) != 1:
+            return
+        self.is_playing = data[0] == 4
+        self._draw_timeline()
+        self._visible("playback", data[0])
+
+    def _handle_timeline(self, data: bytes):
+        if len(data) != 8:
+            return
+        pos = int.from_bytes(data[0:4], 'little')
+        dur = int.from_bytes(data[4:8], 'little')
+        if dur == 0:
+            return
+        self.timeline_sync = None # Host drives the bar again
+        self.timeline_width = min(pos * WIDTH // dur, WIDTH)
+        self._draw_timeline()
+        self._visible("timeline", self.timeline_width)
+
+    def _handle_timeline_sync(self, data: bytes):
+        sync = decode_timeline_sync(data)
+        if sync is None:
+            return
+        seq = sync[3]
+        if self.timeline_sync and ((seq - self.timeline_sync[3]) & 0xFFFF) >= 0x8000:
+            return # Older than the one applied
+        self.timeline_sync = (*sync, self.clock())
+        self.tick(force=True)
+
+    def tick(self, force: bool = False):
+        """Moves the bar to the extrapolated position, like every pass of the firmware loop."""
+        if not self.timeline_sync:
+            return
+        position_ms, duration_ms, rate, _, received = self.timeline_sync
+        if duration_ms == 0:
+            return
+        position = position_ms + (self.clock() - received) * 1000 * rate
+        width = min(int(position) * WIDTH // duration_ms, WIDTH)
+        if width != self.timeline_width or force:
+            self.timeline_width = width
+            self._draw_timeline()
+            self._visible("timeline", width)
+
+    def _draw_timeline(self):
+        self._fill_rect(0, 200, self.timeline_width, 5, RED if self.is_playing else GRAY)
+        self._fill_rect(self.timeline_width, 200, WIDTH - self.timeline_width, 5, BLACK)
+
+    def _draw_art(self, transfer_id: int):
+        w, h = self.art.size
+        x = max((WIDTH - w) // 2, 0)
+        pixels = np.frombuffer(self.art.frame, dtype='<u2').reshape(h, w)
+        self.framebuffer[:h, x:x + w] = pixels[:HEIGHT, :WIDTH - x] # Clipped like the GFX library
+        self._visible("art", transfer_id)
+
+    def _fill_rect(self, x: int, y: int, w: int, h: int, color: int):
+        self.framebuffer[y:y + h, x:x + w] = color
+
+    def _draw_text(self, x: int, y: int, text: str):
+        """Stand-in for GFX text at size 2: a 10x14 block per glyph in a 12x16 cell, wrapping."""
+        cx, cy = x, y
+        for ch in text:
+            if ch == "\n" or cx + 12 > WIDTH:
+                cx, cy = x, cy + 16
+                if ch == "\n":
+                    continue
+            if cy + 16 > HEIGHT:
+                break
+            if not ch.isspace():
+                self._fill_rect(cx, cy, 10, 14, WHITE)
+            cx += 12
+
+    def _visible(self, kind: str, detail):
+        event = VisibleEvent(self.clock(), kind, detail, self._pending.pop(kind, 0))
+        self.events.append(event)
+        if self.on_visible:
+            self.on_visible(event)
+
+    def stats(self) -> dict:
+        kinds = {}
+        for event in self.events:
+            k = kinds.setdefault(event.kind, {"updates": 0, "bytes": 0})
+            k["updates"] += 1
+            k["bytes"] += event.bytes
+        for k in kinds.values():
+            k["bytes_per_update"] = k["bytes"] / k["updates"]
+        return {
+            "bytes_received": self.bytes_received,
+            "frames": self._decoder.frames,
+            "crc_errors": self._decoder.crc_errors,
+            "oversized": self._decoder.oversized,
+            "protocol_version": self._decoder.version,
+            "seq_lost": self._decoder.seq_lost,
+            "seq_late": self._decoder.seq_late,
+            "art_draws": self.art.draws,
+            "art_stale": self.art.stale,
+            "art_naks": self.art.naks,
+            "updates": kinds,
+        }
+
+    def save_png(self, path: str):
+        from PIL import Image
+        fb = self.framebuffer
+        rgb = np.dstack((
+            ((fb >> 11) & 0x1F) << 3,
+            ((fb >> 5) & 0x3F) << 2,
+            (fb & 0x1F) << 3,
+        )).astype(np.uint8)
+        Image.fromarray(rgb, "RGB").save(path)
+
+async def tick_forever(sim: DeviceSimulator, interval: float = 0.01):
+    """The rest of the firmware loop: calls `sim.tick` whenever no bytes are being processed."""
+    while True:
+        await asyncio.sleep(interval)
+        sim.tick()
+
+async def serve_tcp(sim: DeviceSimulator, host: str = "0.0.0.0", port: int = 7777) -> asyncio.AbstractServer:
+    """Listens like the WiFi firmware. Serves one client at a time, a new one replaces it."""
+    current = None
+    sim.ticker = asyncio.get_running_loop().create_task(tick_forever(sim))
+
+    async def on_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        nonlocal current
+        if current:
+            current.close()
+        current = writer
+        print(f"CLIENT CONNECTED! ({writer.get_extra_info('peername')})")
+        writer.write(sim.connect())
+        try:
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                reply = sim.feed(data)
+                if reply:
+                    writer.write(reply)
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+        print("CLIENT DISCONNECTED")
+
+    return await asyncio.start_server(on_client, host, port)
+
+def open_pty(sim: DeviceSimulator, boot_delay: float = 0.2, reset_on_open: bool = True) -> str:
+    """Serves the serial firmware over a pty pair, returns the port path for the host.
+
+    The grant is sent after `boot_delay`, because opening the port flushes its input
+    (on the board it resets the ESP32, which grants once booted); bytes that arrive before
+    are lost like on a booting board. Without `reset_on_open` (native USB, a reopened port)
+    the board is already running and only answers the host's HELLO.
+    """
+    import pty
+    import tty
+    master, slave = pty.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    loop = asyncio.get_running_loop()
+    sim.answer_hello = True
+    booted = [not reset_on_open]
+
+    def write(data: bytes):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(master, view):]
+
+    def on_readable():
+        try:
+            data = os.read(master, 4096)
+        except OSError:
+            return
+        if not booted[0]:
+            return
+        reply = sim.feed(data)
+        if reply:
+            write(reply)
+
+    def boot():
+        booted[0] = True
+        write(sim.connect())
+
+    if reset_on_open:
+        loop.call_later(boot_delay, boot)
+    loop.add_reader(master, on_readable)
+    sim.ticker = loop.create_task(tick_forever(sim))
+    return os.ttyname(slave)
+
+async def main(args):
+    sim = DeviceSimulator(payload_limit=args.payload_limit, consume_rate=args.rate, protocol_version=args.protocol)
+    server = None
+    if args.pty:
+        print(f"Serial port: {open_pty(sim)}")
+    else:
+        server = await serve_tcp(sim, args.host, args.port)
+        print(f"Listening on {args.host}:{args.port}")
+    try:
+        while True:
+            await asyncio.sleep(args.stats_interval or 3600)
+            if args.stats_interval:
+                print(json.dumps(sim.stats()))
+    finally:
+        if server:
+            server.close()
+        if args.dump:
+            sim.save_png(args.dump)
+        print(json.dumps(sim.stats(), indent=2))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Headless desk-thing firmware simulator")
+    parser.add_argument("--pty", action="store_true", help="serve over a pty instead of TCP")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--payload-limit", type=int, default=PAYLOAD_LIMIT)
+    parser.add_argument("--rate", type=float, default=None, help="device consume rate in bytes/s, default unlimited")
+    parser.add_argument("--protocol", type=int, default=PROTOCOL_VERSION, help="1 to act like firmware without v2 frames")
+    parser.add_argument("--stats-interval", type=float, default=0)
+    parser.add_argument("--dump", help="save the framebuffer as PNG on exit")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
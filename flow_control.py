@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+from packet_encoder import FrameDecoder, CREDIT, decode_credit
+
+class CreditWindow:
+    """Credit-based flow control for the host sender.
+
+    The device grants a receive window in bytes with CREDIT frames on connect, and
+    replenishes it with further CREDIT frames as it consumes data. The sender awaits
+    `acquire` before writing a frame, which waits only while the window is exhausted.
+
+    If no CREDIT arrives within `handshake_timeout` of `reset` (old firmware), `acquire`
+    returns False and the caller should fall back to `legacy_pace`.
+
+    `on_grant(n, buffered)` is called for every CREDIT, with the bytes the device still holds.
+    """
+
+    def __init__(self, handshake_timeout: float = 0.5, stall_timeout: float = 2.0, on_grant=None):
+        self.handshake_timeout = handshake_timeout
+        self.stall_timeout = stall_timeout
+        self.on_grant = on_grant
+        self._cond = asyncio.Condition()
+        self._reset_time = time.monotonic()
+        self.credits = 0
+        self.window = 0 # The device's first grant after reset
+        self.enabled = False
+
+        self.granted = 0
+        self.sent = 0
+        self.waits = 0
+        self.stalls = 0 # Timed out waiting for credit, sent anyway
+
+    def reset(self):
+        """Forget all credit, e.g. after a reconnect (the device grants a fresh window)."""
+        self.credits = 0
+        self.window = 0
+        self.enabled = False
+        self._reset_time = time.monotonic()
+
+    async def grant(self, n: int):
+        async with self._cond:
+            if not self.enabled:
+                self.window = n
+            self.credits += n
+            self.granted += n
+            self.enabled = True
+            self._cond.notify_all()
+        if self.on_grant:
+            self.on_grant(n, max(self.window - self.credits, 0))
+
+    async def acquire(self, n: int) -> bool:
+        """Takes `n` bytes of credit, waiting while the window is exhausted."""
+        async with self._cond:
+            if not self.enabled:
+                remaining = self.handshake_timeout - (time.monotonic() - self._reset_time)
+                if remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(self._cond.wait_for(lambda: self.enabled), remaining)
+                except asyncio.TimeoutError:
+                    return False
+            if self.credits < n:
+                self.waits += 1
+                try:
+                    await asyncio.wait_for(self._cond.wait_for(lambda: self.credits >= n), self.stall_timeout)
+                except asyncio.TimeoutError:
+                    # Credit frame probably lost, don't deadlock the link over it
+                    self.stalls += 1
+                    print(f"Flow control stalled ({self.credits} credits, need {n}), sending anyway")
+            self.credits -= n
+            self.sent += n
+            return True
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "credits": self.credits,
+            "granted": self.granted,
+            "sent": self.sent,
+            "waits": self.waits,
+            "stalls": self.stalls,
+        }
+
+async def legacy_pace(msg: bytes, small_delay: float = 0.05, large_delay: float = 0.001):
+    """Fixed sleep pacing for firmware without flow control."""
+    # Throttle: Small pause for header, tiny pause for chunks
+    if len(msg) < 50:
+        await asyncio.sleep(small_delay)
+    else:
+        await asyncio.sleep(large_delay)
+
+class CreditReader:
+    """Feeds device bytes to a FrameDecoder and applies CREDIT frames to a CreditWindow.
+
+    Bytes outside of frames (firmware debug prints) are passed to `on_text` line by line.
+    Other frames are passed to `on_frame(msg_type, payload)` if given.
+    """
+
+    def __init__(self, window: CreditWindow, on_text=None, on_frame=None):
+        self.window = window
+        self.on_text = on_text
+        self.on_frame = on_frame
+        self._line = bytearray()
+        self._decoder = FrameDecoder(max_payload=1024, on_skipped=self._handle_text if on_text else None)
+
+    async def feed(self, data: bytes):
+        for msg_type, payload in self._decoder.feed(data):
+            if msg_type == CREDIT:
+                await self.window.grant(decode_credit(payload))
+            elif self.on_frame:
+                self.on_frame(msg_type, payload)
+
+    def _handle_text(self, data: bytes):
+        self._line += data
+        while b"\n" in self._line:
+            head, _, self._line = self._line.partition(b"\n")
+            text = head.decode('utf-8', errors='ignore').strip()
+            if text:
+                self.on_text(text)
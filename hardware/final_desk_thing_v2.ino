@@ -1,6 +1,7 @@
 #include <SPI.h>
 #include <Adafruit_GFX.h>
 #include <Adafruit_ST7789.h>
+#include <TJpg_Decoder.h>
 
 // --- HARDWARE CONFIG ---
 #define TFT_CS    10
@@ -14,14 +15,25 @@ Adafruit_ST7789 tft(TFT_CS, TFT_DC, TFT_RST);
 #define ST77XX_GRAY 0xB5B6
 
 // --- FUNCTION PROTOTYPES (Fixes "Not Declared" errors) ---
+void initCrc16Table();
 void parseByte(uint8_t b);
 void handleMessage(uint8_t type, uint8_t* data, uint16_t len);
+void handleHello();
 void handleMeta(uint8_t* data, uint16_t len);
 void handleArtBegin(uint8_t* data, uint16_t len);
 void handleArtChunk(uint8_t* data, uint16_t len);
-void handleArtEnd();
-
-enum ArtFormat : uint8_t { ART_FMT_JPEG = 0, ART_FMT_PNG = 1, ART_FMT_RGB565 = 2 };
+void handleArtEnd(uint8_t* data, uint16_t len);
+void handleArtTile(uint8_t* data, uint16_t len);
+void drawArt(uint16_t* pixels);
+void sendCaps(Print& out);
+void sendArtNak(Print& out, uint8_t id, uint16_t count, const uint8_t* missing);
+void sendCredit(Print& out, uint32_t n);
+bool decodeRle565(const uint8_t* src, uint32_t src_len, uint16_t* dst, uint32_t pixel_count);
+bool decodePalette8(const uint8_t* src, uint32_t src_len, uint16_t* dst, uint32_t pixel_count);
+bool decodeJpeg(const uint8_t* src, uint32_t src_len, uint16_t* dst, uint16_t w, uint16_t h);
+bool jpegBlock(int16_t x, int16_t y, uint16_t w, uint16_t h, uint16_t* bitmap);
+
+enum ArtFormat : uint8_t { ART_FMT_JPEG = 0, ART_FMT_PNG = 1, ART_FMT_RGB565 = 2, ART_FMT_RGB565_RLE = 3, ART_FMT_PALETTE8 = 4 };
 
 struct ArtState {
   uint8_t* buf = nullptr;
@@ -30,20 +42,65 @@ struct ArtState {
   uint16_t width = 0;
   uint16_t height = 0;
   ArtFormat format;
+  uint8_t transfer_id = 0; // Chunks/tiles for any other transfer are stale
   bool active = false;
+  uint16_t chunk_size = 0;  // From ART_BEGIN, 0 = host doesn't want ART_NAK
+  uint16_t chunk_count = 0;
+  uint8_t* chunk_map = nullptr; // Bit set = chunk still missing
+  bool done = false;        // Drawn, ART_END is answered again if the host repeats it
+  uint8_t scale = 1;        // From ART_BEGIN, width/height are the drawn size (the pixels sent times scale)
+  uint16_t palette[256];    // From ART_BEGIN, PALETTE8 only
+  uint16_t palette_size = 0;
 };
 ArtState art;
 
 uint16_t timeline_width = 0;
 bool is_playing = true;
 
-enum ParseState { WAIT_SOF, READ_TYPE, READ_LEN_1, READ_LEN_2, READ_PAYLOAD, READ_CRC };
+struct TimelineSync {
+  uint32_t position_ms = 0; // At anchor_ms
+  uint32_t duration_ms = 0;
+  uint16_t rate = 0;        // Thousandths, 0 = paused
+  uint16_t seq = 0;
+  uint32_t anchor_ms = 0;   // millis() when the sync arrived
+  bool active = false;      // The bar is extrapolated locally, not driven by TIMELINE frames
+};
+TimelineSync tl;
+
+// --- PROTOCOL ---
+// v1: [0x7E][TYPE][LEN:2][payload][XOR:1]
+// v2: [0x7D][TYPE][SEQ:2][LEN:2][payload][CRC16:2], CRC-16/CCITT-FALSE over all bytes before it
+// Both are accepted; the host switches to v2 after our CAPS frame.
+#define PROTOCOL_VERSION 2
+#define CAP_TIMELINE_SYNC 0x0001
+#define CAP_ART_NAK 0x0002
+#define CAP_ART_PREVIEW 0x0004
+#define CAP_ART_PALETTE 0x0008
+#define CAP_ART_JPEG 0x0010
+#define DEVICE_CAPS (CAP_TIMELINE_SYNC | CAP_ART_NAK | CAP_ART_PREVIEW | CAP_ART_PALETTE | CAP_ART_JPEG)
+#define MAX_NAK_CHUNKS 4096 // Larger transfers don't get ART_NAK
+#define MAX_ART_SCALE 8     // Largest preview scale drawArt handles
+
+enum ParseState { WAIT_SOF, READ_TYPE, READ_SEQ_1, READ_SEQ_2, READ_LEN_1, READ_LEN_2, READ_PAYLOAD, READ_CRC, READ_CRC_2 };
 ParseState state = WAIT_SOF;
-uint8_t msgType, crc;
+uint8_t msgType, crc, frameVersion;
 uint16_t msgLen, bytesRead;
+uint16_t crc16, rxCrc16, seq;
+
+uint16_t crc16_table[256];
+uint16_t expected_seq = 0;
+bool seq_valid = false;    // Set by the first v2 frame of a connection
+uint32_t frames_lost = 0;  // Sequence gaps (corrupted or dropped frames)
 
 // Increased payload buffer for safety (fits 4096 chunks + header)
-uint8_t payload[8192]; 
+uint8_t payload[8192] __attribute__((aligned(4)));
+
+// --- FLOW CONTROL ---
+#define RX_WINDOW 16384     // Bytes granted to the host on boot (half the RX buffer)
+#define CREDIT_BATCH 2048   // Return credit once this many bytes are consumed
+uint32_t consumed = 0;
+bool hello_received = false; // HELLO in the bytes being parsed
+#define HOST_OUT Serial // Where replies (ART_NAK) go
 
 void setup() {
   // 1. Critical: Large Serial Buffer
@@ -55,6 +112,9 @@ void setup() {
     digitalWrite(TFT_BLK, HIGH); 
   #endif
   
+  initCrc16Table();
+  TJpgDec.setCallback(jpegBlock);
+
   // 2. Display Init (240x240)
   tft.init(240, 280); 
   tft.setRotation(2);
@@ -72,6 +132,8 @@ void setup() {
     Serial.println("ERR: No PSRAM");
   }
   Serial.println("SETUP COMPLETE");
+  sendCaps(Serial);
+  sendCredit(Serial, RX_WINDOW);
 }
 
 void loop() {
@@ -84,22 +146,69 @@ void loop() {
     for (int i = 0; i < count; i++) {
       parseByte(temp[i]);
     }
+    consumed += count;
+    if (hello_received) {
+      // The host forgot the old connection's credit, so do we
+      hello_received = false;
+      consumed = 0;
+      sendCaps(Serial);
+      sendCredit(Serial, RX_WINDOW);
+    }
+    if (consumed >= CREDIT_BATCH) {
+      sendCredit(Serial, consumed);
+      consumed = 0;
+    }
+  }
+  updateTimeline(false);
+}
+
+void initCrc16Table() {
+  for (uint16_t i = 0; i < 256; i++) {
+    uint16_t c = i << 8;
+    for (int k = 0; k < 8; k++) c = (c & 0x8000) ? (c << 1) ^ 0x1021 : c << 1;
+    crc16_table[i] = c;
   }
 }
 
+inline void addCrc(uint8_t b) {
+  crc ^= b;
+  crc16 = (crc16 << 8) ^ crc16_table[((crc16 >> 8) ^ b) & 0xFF];
+}
+
+void checkSequence(uint16_t s) {
+  if (seq_valid) {
+    uint16_t gap = s - expected_seq;
+    if (gap >= 0x8000) { Serial.println("SEQ: late frame"); return; } // Older than one already seen
+    if (gap) { frames_lost += gap; Serial.printf("SEQ: %u lost (%u total)\n", gap, frames_lost); }
+  }
+  expected_seq = s + 1;
+  seq_valid = true;
+}
+
 void parseByte(uint8_t b) {
   switch (state) {
     case WAIT_SOF:
-      if (b == 0x7E) { crc = b; state = READ_TYPE; }
+      if (b == 0x7E || b == 0x7D) {
+        frameVersion = (b == 0x7D) ? 2 : 1;
+        crc = 0; crc16 = 0xFFFF; addCrc(b);
+        state = READ_TYPE;
+      }
       break;
     case READ_TYPE:
-      msgType = b; crc ^= b; state = READ_LEN_1;
+      msgType = b; addCrc(b);
+      state = (frameVersion == 2) ? READ_SEQ_1 : READ_LEN_1;
+      break;
+    case READ_SEQ_1:
+      seq = b; addCrc(b); state = READ_SEQ_2;
+      break;
+    case READ_SEQ_2:
+      seq |= (b << 8); addCrc(b); state = READ_LEN_1;
       break;
     case READ_LEN_1:
-      msgLen = b; crc ^= b; state = READ_LEN_2;
+      msgLen = b; addCrc(b); state = READ_LEN_2;
       break;
     case READ_LEN_2:
-      msgLen |= (b << 8); crc ^= b; bytesRead = 0;
+      msgLen |= (b << 8); addCrc(b); bytesRead = 0;
       
       // Safety: Prevent buffer overflow
       if (msgLen > sizeof(payload)) {
@@ -113,14 +222,24 @@ void parseByte(uint8_t b) {
 
     case READ_PAYLOAD:
       if (bytesRead < sizeof(payload)) payload[bytesRead] = b;
-      bytesRead++; crc ^= b;
+      bytesRead++; addCrc(b);
       if (bytesRead >= msgLen) state = READ_CRC;
       break;
 
     case READ_CRC:
+      if (frameVersion == 2) { rxCrc16 = b; state = READ_CRC_2; break; }
       if (crc == b) handleMessage(msgType, payload, msgLen);
       state = WAIT_SOF;
       break;
+
+    case READ_CRC_2:
+      rxCrc16 |= (b << 8);
+      if (crc16 == rxCrc16) {
+        checkSequence(seq);
+        handleMessage(msgType, payload, msgLen);
+      }
+      state = WAIT_SOF;
+      break;
   }
 }
 
@@ -129,12 +248,23 @@ void handleMessage(uint8_t type, uint8_t* data, uint16_t len) {
     case 0x01: handleMeta(data, len); break;
     case 0x02: handlePlayback(data, len); break;
     case 0x03: handleTimeline(data, len); break;
+    case 0x04: handleTimelineSync(data, len); break;
+    case 0x05: handleHello(); break;
     case 0x10: handleArtBegin(data, len); break;
     case 0x11: handleArtChunk(data, len); break; 
-    case 0x12: handleArtEnd(); break;
+    case 0x12: handleArtEnd(data, len); break;
+    case 0x13: handleArtTile(data, len); break;
   }
 }
 
+void handleHello() {
+  // A host (re)opened the port without resetting us: start over like after boot,
+  // answered in loop() once the bytes that carried it are accounted for
+  seq_valid = false;
+  tl.active = false;
+  hello_received = true;
+}
+
 void handleMeta(uint8_t* data, uint16_t len) {
   uint16_t idx = 0;
   if(idx >= len) return; uint8_t tL = data[idx++]; String title = String((char*)&data[idx], tL); idx += tL;
@@ -164,6 +294,7 @@ void handleTimeline(uint8_t* data, uint16_t len) {
   uint16_t pos; memcpy(&pos, data, 2);
   uint16_t dur; memcpy(&dur, data+2, 2);
   if(dur==0) return;
+  tl.active = false; // Host drives the bar again
 
   
 
@@ -178,6 +309,31 @@ void handleTimeline(uint8_t* data, uint16_t len) {
   
 }
 
+void handleTimelineSync(uint8_t* data, uint16_t len) {
+  // [position_ms:4][duration_ms:4][rate:2][seq:2]
+  if (len != 12) return;
+  uint16_t seq; memcpy(&seq, data+10, 2);
+  if (tl.active && (uint16_t)(seq - tl.seq) >= 0x8000) return; // Older than the one applied
+  memcpy(&tl.position_ms, data, 4);
+  memcpy(&tl.duration_ms, data+4, 4);
+  memcpy(&tl.rate, data+8, 2);
+  tl.seq = seq;
+  tl.anchor_ms = millis();
+  tl.active = true;
+  updateTimeline(true);
+}
+
+void updateTimeline(bool force) {
+  // Called every loop pass, redraws only when the bar moved a pixel
+  if (!tl.active || tl.duration_ms == 0) return;
+  uint64_t pos = tl.position_ms + (uint64_t)(millis() - tl.anchor_ms) * tl.rate / 1000;
+  uint32_t width = (pos * 240) / tl.duration_ms;
+  if (width > 240) width = 240;
+  if (width == timeline_width && !force) return;
+  timeline_width = width;
+  drawTimeline();
+}
+
 void drawTimeline(){
   // 6. Draw the Bar (Red part)
   tft.fillRect(0, 200, timeline_width, 5, is_playing ? ST77XX_RED : ST77XX_GRAY); // Moved to y=220 to not overlap text
@@ -190,12 +346,23 @@ void drawTimeline(){
 
 void handleArtBegin(uint8_t* data, uint16_t len) {
   if (art.buf) { free(art.buf); art.buf = nullptr; }
-  if (len != 9) return;
+  if (art.chunk_map) { free(art.chunk_map); art.chunk_map = nullptr; }
+  art.active = false;
+  art.done = false;
+  if (len >= 10 && data[8] == ART_FMT_PALETTE8) {
+    // [...][chunk_size:2][scale:1][palette: 1-256 RGB565 entries]
+    if (len < 15 || len > 13 + 512 || len % 2 == 0) return;
+  } else if (len != 10 && len != 12 && len != 13) return;
 
   uint32_t total; memcpy(&total, data, 4);
   uint16_t w; memcpy(&w, data+4, 2);
   uint16_t h; memcpy(&h, data+6, 2);
   uint8_t fmt; memcpy(&fmt, data+8, 1);
+  art.transfer_id = data[9]; // New transfer, anything older is now stale
+  art.chunk_size = 0;
+  if (len >= 12) memcpy(&art.chunk_size, data+10, 2);
+  uint8_t scale = (len >= 13 && data[12]) ? data[12] : 1;
+  if (scale > MAX_ART_SCALE || (uint32_t)w * scale > 240) return;
 
   if (total > 1024 * 300) return;
 
@@ -205,29 +372,234 @@ void handleArtBegin(uint8_t* data, uint16_t len) {
   art.buf = buf;
   art.total_size = total;
   art.received = 0;
-  art.width = w; art.height = h;
+  art.width = w * scale; art.height = h * scale;
+  art.scale = scale;
+  art.palette_size = 0;
+  if (fmt == ART_FMT_PALETTE8) {
+    art.palette_size = (len - 13) / 2;
+    memcpy(art.palette, data + 13, len - 13);
+  }
   art.format = (ArtFormat)fmt;
   art.active = true;
+
+  if (art.chunk_size) {
+    art.chunk_count = (total + art.chunk_size - 1) / art.chunk_size;
+    if (art.chunk_count > MAX_NAK_CHUNKS) return;
+    art.chunk_map = (uint8_t*)malloc((art.chunk_count + 7) / 8);
+    if (!art.chunk_map) return;
+    memset(art.chunk_map, 0xFF, (art.chunk_count + 7) / 8);
+    if (art.chunk_count % 8) art.chunk_map[art.chunk_count / 8] = (1 << (art.chunk_count % 8)) - 1;
+  }
 }
 
 void handleArtChunk(uint8_t* data, uint16_t len) {
-  if (!art.active || !art.buf || len < 5) return;
+  // [offset:4][transfer_id:1][data]
+  if (!art.active || !art.buf || len < 6) return;
+  if (data[4] != art.transfer_id) return; // Stale transfer
   uint32_t offset; memcpy(&offset, data, 4);
-  uint16_t chunk_len = len - 4;
+  uint16_t chunk_len = len - 5;
   
   if (offset + chunk_len <= art.total_size) {
-    memcpy(art.buf + offset, data + 4, chunk_len);
+    memcpy(art.buf + offset, data + 5, chunk_len);
+    if (art.chunk_map && offset % art.chunk_size == 0) {
+      uint32_t i = offset / art.chunk_size;
+      if (i < art.chunk_count) art.chunk_map[i >> 3] &= ~(1 << (i & 7));
+    }
   }
 }
 
-void handleArtEnd() {
-  if (!art.active || !art.buf) return;
+void handleArtEnd(uint8_t* data, uint16_t len) {
+  if (len != 1) return;
+  uint8_t id = data[0];
+  if (id != art.transfer_id) {
+    // Stale transfer, or a newer one whose ART_BEGIN never arrived
+    if ((uint8_t)(id - art.transfer_id) < 128) sendArtNak(HOST_OUT, id, 0, nullptr);
+    return;
+  }
+  if (!art.active || !art.buf) {
+    if (art.done) sendArtNak(HOST_OUT, id, art.chunk_count, nullptr); // Our answer got lost
+    else if (!art.chunk_size) sendArtNak(HOST_OUT, id, 0, nullptr); // Only its preview arrived, not the full ART_BEGIN
+    return;
+  }
+  if (art.chunk_map) {
+    for (uint16_t i = 0; i < (art.chunk_count + 7) / 8; i++) {
+      if (art.chunk_map[i]) {
+        // Keep the buffer, the host resends the missing chunks and ART_END
+        sendArtNak(HOST_OUT, id, art.chunk_count, art.chunk_map);
+        return;
+      }
+    }
+  }
   
   if (art.format == ART_FMT_RGB565) {
-    tft.drawRGBBitmap((240-art.width)/2, 0, (uint16_t*)art.buf, art.width, art.height);
+    drawArt((uint16_t*)art.buf);
+  } else if (art.format == ART_FMT_RGB565_RLE) {
+    uint32_t pixel_count = (uint32_t)(art.width / art.scale) * (art.height / art.scale);
+    uint16_t* pixels = (uint16_t*)heap_caps_malloc(pixel_count * 2, MALLOC_CAP_SPIRAM);
+    if (pixels) {
+      if (decodeRle565(art.buf, art.total_size, pixels, pixel_count)) {
+        drawArt(pixels);
+      }
+      free(pixels);
+    } else {
+      Serial.println("ERR: MALLOC");
+    }
+  } else if (art.format == ART_FMT_PALETTE8) {
+    uint32_t pixel_count = (uint32_t)(art.width / art.scale) * (art.height / art.scale);
+    uint16_t* pixels = (uint16_t*)heap_caps_malloc(pixel_count * 2, MALLOC_CAP_SPIRAM);
+    if (pixels) {
+      if (decodePalette8(art.buf, art.total_size, pixels, pixel_count)) {
+        drawArt(pixels);
+      }
+      free(pixels);
+    } else {
+      Serial.println("ERR: MALLOC");
+    }
+  } else if (art.format == ART_FMT_JPEG) {
+    uint16_t w = art.width / art.scale, h = art.height / art.scale;
+    uint16_t* pixels = (uint16_t*)heap_caps_malloc((uint32_t)w * h * 2, MALLOC_CAP_SPIRAM);
+    if (pixels) {
+      if (decodeJpeg(art.buf, art.total_size, pixels, w, h)) {
+        drawArt(pixels);
+      }
+      free(pixels);
+    } else {
+      Serial.println("ERR: MALLOC");
+    }
   }
   
+  if (art.chunk_map) {
+    sendArtNak(HOST_OUT, id, art.chunk_count, nullptr);
+    free(art.chunk_map); art.chunk_map = nullptr;
+    art.done = true;
+  }
   if (art.buf) { free(art.buf); art.buf = nullptr; }
   art.active = false;
   Serial.println("Done.");
-}
\ No newline at end of file
+}
+
+void drawArt(uint16_t* pixels) {
+  // Full size, or a preview with every pixel drawn as a scale x scale block
+  if (art.scale == 1) {
+    tft.drawRGBBitmap((240-art.width)/2, 0, pixels, art.width, art.height);
+    return;
+  }
+  static uint16_t rows[240 * MAX_ART_SCALE];
+  uint16_t w = art.width / art.scale;
+  for (uint16_t y = 0; y < art.height / art.scale; y++) {
+    for (uint16_t x = 0; x < w; x++) {
+      for (uint8_t k = 0; k < art.scale; k++) rows[x * art.scale + k] = pixels[y * w + x];
+    }
+    for (uint8_t r = 1; r < art.scale; r++) memcpy(rows + r * art.width, rows, art.width * 2);
+    tft.drawRGBBitmap((240-art.width)/2, y * art.scale, rows, art.width, art.scale);
+  }
+}
+
+void handleArtTile(uint8_t* data, uint16_t len) {
+  // Delta update: [x:2][y:2][w:2][h:2][transfer_id:1][pixels], drawn over the last full image
+  if (len < 9 || art.width == 0) return;
+  uint16_t x; memcpy(&x, data, 2);
+  uint16_t y; memcpy(&y, data+2, 2);
+  uint16_t w; memcpy(&w, data+4, 2);
+  uint16_t h; memcpy(&h, data+6, 2);
+  uint8_t id = data[8];
+
+  if (id != art.transfer_id) {
+    if ((uint8_t)(id - art.transfer_id) >= 128) return; // Older generation, stale
+    // Newer generation supersedes any transfer in progress
+    if (art.buf) { free(art.buf); art.buf = nullptr; }
+    if (art.chunk_map) { free(art.chunk_map); art.chunk_map = nullptr; }
+    art.active = false;
+    art.done = false;
+    art.transfer_id = id;
+  }
+
+  if ((uint32_t)w * h * 2 != (uint32_t)(len - 9)) return;
+  if (x + w > art.width || y + h > art.height) return;
+
+  // Pixels start at an odd offset, move them to the (aligned) start of the buffer
+  memmove(data, data + 9, len - 9);
+  tft.drawRGBBitmap((240-art.width)/2 + x, y, (uint16_t*)data, w, h);
+}
+
+bool decodeRle565(const uint8_t* src, uint32_t src_len, uint16_t* dst, uint32_t pixel_count) {
+  // [n < 0x80: n+1 literal pixels] [n >= 0x80: one pixel repeated (n & 0x7F)+1 times]
+  uint32_t i = 0, out = 0;
+  while (i < src_len) {
+    uint8_t header = src[i++];
+    uint32_t count = (header & 0x7F) + 1;
+    if (out + count > pixel_count) return false;
+    if (header & 0x80) {
+      if (i + 2 > src_len) return false;
+      uint16_t px; memcpy(&px, src + i, 2); i += 2;
+      for (uint32_t k = 0; k < count; k++) dst[out++] = px;
+    } else {
+      if (i + count * 2 > src_len) return false;
+      memcpy(dst + out, src + i, count * 2);
+      i += count * 2; out += count;
+    }
+  }
+  return out == pixel_count;
+}
+
+bool decodePalette8(const uint8_t* src, uint32_t src_len, uint16_t* dst, uint32_t pixel_count) {
+  // One index into art.palette per pixel
+  if (src_len != pixel_count) return false;
+  for (uint32_t i = 0; i < pixel_count; i++) {
+    if (src[i] >= art.palette_size) return false;
+    dst[i] = art.palette[src[i]];
+  }
+  return true;
+}
+
+uint16_t* jpeg_dst = nullptr; // Where jpegBlock writes, w x h
+uint16_t jpeg_w = 0, jpeg_h = 0;
+
+bool decodeJpeg(const uint8_t* src, uint32_t src_len, uint16_t* dst, uint16_t w, uint16_t h) {
+  // Baseline JPEG of exactly w x h (TJpg_Decoder doesn't do progressive)
+  uint16_t jw, jh;
+  if (TJpgDec.getJpgSize(&jw, &jh, src, src_len) != JDR_OK || jw != w || jh != h) return false;
+  jpeg_dst = dst; jpeg_w = w; jpeg_h = h;
+  return TJpgDec.drawJpg(0, 0, src, src_len) == JDR_OK;
+}
+
+bool jpegBlock(int16_t x, int16_t y, uint16_t w, uint16_t h, uint16_t* bitmap) {
+  // TJpg_Decoder output callback, one block (MCU) at a time, clipped to the image
+  if (x < 0 || y < 0 || x + w > jpeg_w || y + h > jpeg_h) return false;
+  for (uint16_t row = 0; row < h; row++) memcpy(jpeg_dst + (y + row) * jpeg_w + x, bitmap + row * w, w * 2);
+  return true;
+}
+
+void sendCaps(Print& out) {
+  // CAPS frame (0x21), always v1: [version:1][flags:2]
+  uint8_t frame[8] = {0x7E, 0x21, 3, 0, PROTOCOL_VERSION, DEVICE_CAPS & 0xFF, DEVICE_CAPS >> 8};
+  uint8_t c = 0;
+  for (int i = 0; i < 7; i++) c ^= frame[i];
+  frame[7] = c;
+  out.write(frame, 8);
+}
+
+void sendArtNak(Print& out, uint8_t id, uint16_t count, const uint8_t* missing) {
+  // ART_NAK frame (0x22), always v1: [transfer_id:1][chunk_count:2][bitmap], missing = nullptr for none
+  static uint8_t frame[5 + 3 + MAX_NAK_CHUNKS / 8];
+  uint16_t n = 3 + (count + 7) / 8;
+  frame[0] = 0x7E; frame[1] = 0x22; frame[2] = n & 0xFF; frame[3] = n >> 8;
+  frame[4] = id;
+  memcpy(frame + 5, &count, 2);
+  if (missing) memcpy(frame + 7, missing, n - 3);
+  else memset(frame + 7, 0, n - 3);
+  uint8_t c = 0;
+  for (int i = 0; i < 4 + n; i++) c ^= frame[i];
+  frame[4 + n] = c;
+  out.write(frame, 5 + n);
+}
+
+void sendCredit(Print& out, uint32_t n) {
+  // CREDIT frame (0x20): host may send n more bytes
+  uint8_t frame[9] = {0x7E, 0x20, 4, 0};
+  memcpy(frame + 4, &n, 4);
+  uint8_t c = 0;
+  for (int i = 0; i < 8; i++) c ^= frame[i];
+  frame[8] = c;
+  out.write(frame, 9);
+}
@@ -0,0 +1,119 @@
+import math
+import time
+
+from packet_encoder import FRAME_OVERHEAD
+
+DEVICE_MAX_PAYLOAD = 4096 # Smallest payload buffer of the firmwares (desk_thing_wifi.ino)
+CHUNK_HEADER = 5 # [offset:4][transfer_id:1] of an ART_CHUNK payload
+CHUNK_ALIGN = 64
+MIN_CHUNK = 256
+MAX_CHUNK = (DEVICE_MAX_PAYLOAD - CHUNK_HEADER) // CHUNK_ALIGN * CHUNK_ALIGN
+FIXED_CHUNK = 3072 # What every link used before tuning, and still does with adaptive=False
+
+class LinkEstimator:
+    """Effective throughput and byte error rate of one link, as exponentially weighted averages.
+
+    Throughput comes from the device's CREDIT frames: credit returned while the device still had
+    bytes buffered is what it consumed in that time, so idle gaps and the first window (which
+    goes out at socket speed) don't count. Busy time adds up across transfers until there is
+    `min_interval` of it. Firmware without flow control gives no samples, the estimate stays
+    at `initial_Bps`.
+
+    The error rate comes from ART_NAK: the share of the chunks of a round the device reports
+    missing, converted to a per-byte probability so that it carries over between chunk sizes.
+    """
+
+    def __init__(self, initial_Bps: float = None, alpha: float = 0.25, min_interval: float = 0.1, max_gap: float = 0.25):
+        self.bandwidth = initial_Bps # Bytes/s, None until known
+        self.byte_error_rate = 0.0
+        self.alpha = alpha
+        self.min_interval = min_interval # Seconds of busy device per throughput sample
+        self.max_gap = max_gap # Longer between two credits means the device sat idle in between
+        self._last = None # perf_counter() of the last credit, None if the device had nothing left then
+        self._busy = [0, 0.0] # Bytes credited, seconds, towards the next sample
+
+        self.samples = 0
+        self.rounds = 0 # Art rounds (ART_END) answered or timed out
+        self.frames_lost = 0
+        self.timeouts = 0
+
+    def on_credit(self, n: int, buffered: int, now: float = None):
+        """Called for every CREDIT of `n` bytes; `buffered` is what the device still holds after it."""
+        now = time.perf_counter() if now is None else now
+        if self._last is not None and now - self._last <= self.max_gap:
+            self._busy[0] += n
+            self._busy[1] += now - self._last
+            if self._busy[1] >= self.min_interval:
+                self._update("bandwidth", self._busy[0] / self._busy[1])
+                self.samples += 1
+                self._busy = [0, 0.0]
+        self._last = now if buffered else None
+
+    def on_round(self, frames: int, lost: int, frame_bytes: int):
+        """Called once per art round: `lost` of `frames` frames of about `frame_bytes` each didn't arrive."""
+        self.rounds += 1
+        self.frames_lost += lost
+        loss = min(lost / frames, 0.99) if frames else 0.0
+        self._update("byte_error_rate", -math.expm1(math.log1p(-loss) / frame_bytes))
+
+    def on_timeout(self, frames: int, frame_bytes: int):
+        """ART_END or the answer to it got lost."""
+        self.timeouts += 1
+        self.on_round(frames, 1, frame_bytes)
+
+    def _update(self, name: str, sample: float):
+        old = getattr(self, name)
+        setattr(self, name, sample if not old else old + self.alpha * (sample - old))
+
+    def stats(self) -> dict:
+        return {
+            "Bps": self.bandwidth or 0.0,
+            "byte_error_rate": self.byte_error_rate,
+            "samples": self.samples,
+            "rounds": self.rounds,
+            "frames_lost": self.frames_lost,
+            "timeouts": self.timeouts,
+        }
+
+class LinkTuner:
+    """Picks the art chunk size and the write size of a link from its LinkEstimator.
+
+    A chunk hit by one bad byte is resent whole, so at byte error rate p a chunk of c bytes with
+    h bytes of framing delivers c/(c+h)*(1-p)^(c+h) per byte sent, best at c² + h·c = h/-ln(1-p).
+    Neither a chunk nor a write should take longer than `frame_time` at the measured bandwidth:
+    a playback frame queued behind art waits for the write in progress, and the device only gets
+    to it after the chunk it is parsing. The chunk size only changes once the target moved by
+    more than `hysteresis`, it is fixed per transfer anyway.
+    """
+
+    def __init__(self, estimator: LinkEstimator, chunk_size: int = FIXED_CHUNK, batch_bytes: int = 12288,
+                 frame_time: float = 0.02, hysteresis: float = 0.25):
+        self.estimator = estimator
+        self.chunk_size = chunk_size
+        self.max_batch = batch_bytes
+        self.batch_bytes = batch_bytes
+        self.frame_time = frame_time
+        self.hysteresis = hysteresis
+        self.changes = 0
+
+    def tune(self, version: int) -> bool:
+        """Recomputes both for frames of protocol `version`, returns True if the chunk size changed."""
+        bandwidth = self.estimator.bandwidth
+        budget = bandwidth * self.frame_time if bandwidth else math.inf
+        if budget < math.inf:
+            self.batch_bytes = int(min(max(budget // 512 * 512, 1024), self.max_batch))
+
+        target = min(self._best_for_errors(CHUNK_HEADER + FRAME_OVERHEAD[version]), budget, MAX_CHUNK)
+        target = max(int(target) // CHUNK_ALIGN * CHUNK_ALIGN, MIN_CHUNK)
+        if abs(target - self.chunk_size) <= self.hysteresis * self.chunk_size:
+            return False
+        self.chunk_size = target
+        self.changes += 1
+        return True
+
+    def _best_for_errors(self, overhead: int) -> float:
+        p = self.estimator.byte_error_rate
+        if p <= 0:
+            return math.inf
+        q = -math.log1p(-min(p, 0.5))
+        return (math.sqrt(overhead * overhead + 4 * overhead / q) - overhead) / 2
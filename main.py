@@ -0,0 +1,96 @@
+from dotenv import load_dotenv
+import os
+import sys
+import asyncio
+from art_cache import ArtCache
+from transport import Link, LinkGroup, SerialTransport, TcpTransport
+from media_controller import MediaController
+from tracing import Tracer
+from media_source import WinRtSource, ReplaySource
+
+load_dotenv()
+
+# CONFIGURATION (override in .env)
+TRANSPORT = os.getenv("DESK_THING_TRANSPORT", "serial") # "serial" or "wifi"
+SERIAL_PORT = os.getenv("SERIAL_PORT", "COM3")
+BAUD_RATE = int(os.getenv("BAUD_RATE", "921600"))
+ESP32_IP = os.getenv("ESP32_IP")
+ESP32_PORT = int(os.getenv("ESP32_PORT", "7777"))
+DEVICES = os.getenv("DESK_THING_DEVICES") # Several devices, e.g. "serial:COM3,wifi:192.168.1.50:7777"
+ART_CACHE_BYTES = 16 * 1024 * 1024 # In-memory budget for converted art
+ART_CACHE_DIR = ".art_cache" # Set to None to keep the cache in memory only
+STATS_INTERVAL = float(os.getenv("DESK_THING_STATS_INTERVAL", "0")) # Seconds between link stats logs, 0 = off
+TRACE = os.getenv("DESK_THING_TRACE", "0") == "1" # Per-event latency tracing
+TRACE_FILE = os.getenv("DESK_THING_TRACE_FILE", "trace_stats.json") # Dumped every STATS_INTERVAL (or 10 s)
+TRACE_PORT = int(os.getenv("DESK_THING_TRACE_PORT", "0")) # Serve trace stats on http://127.0.0.1:PORT, 0 = off
+REPLAY = os.getenv("DESK_THING_REPLAY") # Replay this recorded trace instead of listening to Windows
+REPLAY_SPEED = float(os.getenv("DESK_THING_REPLAY_SPEED", "1"))
+
+def make_transport(kind: str):
+    if kind == "serial":
+        return SerialTransport(SERIAL_PORT, BAUD_RATE)
+    if kind == "wifi":
+        return TcpTransport(ESP32_IP, ESP32_PORT)
+    raise ValueError(f"Unknown transport: {kind}")
+
+def make_device_transport(spec: str):
+    """Transport for one DESK_THING_DEVICES entry: "serial:PORT[:BAUD]" or "wifi:HOST[:PORT]"."""
+    kind, _, address = spec.strip().partition(":")
+    if kind == "serial":
+        port, _, baud = address.partition(":")
+        return SerialTransport(port or SERIAL_PORT, int(baud or BAUD_RATE))
+    if kind == "wifi":
+        host, _, port = address.partition(":")
+        return TcpTransport(host or ESP32_IP, int(port or ESP32_PORT))
+    raise ValueError(f"Unknown transport: {kind}")
+
+def make_link(kind: str, loop: asyncio.AbstractEventLoop) -> Link | LinkGroup:
+    if not DEVICES:
+        return Link(make_transport(kind), loop)
+    return LinkGroup([Link(make_device_transport(spec), loop) for spec in DEVICES.split(",")])
+
+def make_source():
+    if REPLAY:
+        return ReplaySource(REPLAY, REPLAY_SPEED)
+    return WinRtSource()
+
+async def log_stats(link: Link | LinkGroup, media_controller: MediaController):
+    while True:
+        await asyncio.sleep(STATS_INTERVAL)
+        print(f"Link stats: {link.stats()}")
+        print(f"Media stats: {media_controller.stats()}")
+
+async def main(kind: str = TRANSPORT):
+    asyncio_loop = asyncio.get_running_loop()
+
+    # Start transport(s)
+    link = make_link(kind, asyncio_loop)
+    link.start()
+
+    tracer = Tracer(enabled=TRACE)
+    if TRACE:
+        asyncio_loop.create_task(tracer.dump_every(TRACE_FILE, STATS_INTERVAL or 10))
+        if TRACE_PORT:
+            await tracer.serve(port=TRACE_PORT)
+
+    # Start Media Session Manager
+    source = make_source()
+    media_controller = MediaController(asyncio_loop, link, ArtCache(ART_CACHE_BYTES, ART_CACHE_DIR), tracer, source)
+    if STATS_INTERVAL > 0:
+        asyncio_loop.create_task(log_stats(link, media_controller))
+    session_manager = await source.open()
+    await media_controller.setup(session_manager)
+
+    # Run once immediately
+    await media_controller.handle_media_properties_changed()
+
+    print("Listening... (Ctrl+C to stop)")
+    while True:
+        await asyncio.sleep(1)
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else TRANSPORT))
+    except KeyboardInterrupt:
+        pass
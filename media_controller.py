@@ -0,0 +1,604 @@
+import asyncio
+import time
+import functools
+from packet_encoder import (
+    encode_meta, encode_timeline, encode_timeline_sync, encode_playback, packetize_art, packetize_art_preview,
+    encode_art_delta, quantize_rgb565, decode_palette8, decode_jpeg, ArtFormat, Dither,
+    CAP_TIMELINE_SYNC, CAP_ART_NAK, CAP_ART_PREVIEW, CAP_ART_PALETTE, CAP_ART_JPEG,
+)
+from art_cache import ArtCache
+from transport import Link, LinkGroup
+from link_tuner import FIXED_CHUNK
+from tracing import Tracer, Trace
+from media_source import MediaSource, WinRtSource
+from coalescer import EventCoalescer
+
+# CONFIGURATION
+ART_SIZE = (240, 200)
+ART_FORMAT = ArtFormat.RGB565_RLE # Wire format for full frames, PALETTE8 halves them and JPEG more, both lossy (RLE if the device can't)
+ART_FORMAT_CAPS = {ArtFormat.PALETTE8: CAP_ART_PALETTE, ArtFormat.JPEG: CAP_ART_JPEG} # What the device must support for them
+ART_DITHER = Dither.DIFFUSION # For PALETTE8
+ART_JPEG_MAX_BYTES = 12288 # For JPEG, the highest quality that fits is used
+ART_DELTA_TOLERANCE = 2 # Per-channel (5/6-bit) difference ignored when diffing art tiles
+ART_PREVIEW = True # Send a low resolution preview before new art, if the device can scale it up
+ART_PREVIEW_SCALE = 8 # 30x25 preview, 1.5 KB
+ART_PREVIEW_MIN_BYTES = 12288 # Smaller updates (e.g. a few changed tiles) go out without a preview
+MEDIA_SETTLE = 0.15 # Seconds without further property events before fetching properties
+MEDIA_MAX_WAIT = 0.5 # Fetch at most this long after the first event of a burst
+TIMELINE_SYNC = True # Device extrapolates the timeline (TIMELINE_SYNC) if it says it can, False for 1 Hz TIMELINE always
+TIMELINE_DRIFT = 0.25 # Seconds the device's extrapolated position may be off before it's corrected
+
+class SessionState:
+    """What we know of one media session, kept up to date from its events even in the background.
+
+    Switching to a session replays this at once instead of fetching and encoding from scratch.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.media_events: EventCoalescer = None # Its media property events, settled
+        self.tokens = [] # (remove, token) of its event subscriptions
+
+        self.track_id = None
+        self.meta_frame = None # Encoded META of track_id
+        self.art_album = None # Album of art_pixels
+        self.art_pixels = None # RGB565 at ART_SIZE
+        self.art_jpeg = None # JPEG of the same art within ART_JPEG_MAX_BYTES, only if ART_FORMAT is JPEG
+        self.art_prefetch: asyncio.Task = None # Converting the art of its latest event while the burst settles
+        self.playback_status = None
+        self.playback_rate = 1.0
+        self.timeline = None # Last timeline properties
+        self.timeline_time = 0 # time.monotonic() when `timeline` was read
+        self.stale = True # Media properties changed since last fetched
+
+    @property
+    def app(self) -> str:
+        return self.session.source_app_user_model_id
+
+class MediaController:
+    def __init__(self, loop: asyncio.AbstractEventLoop, link: Link | LinkGroup, art_cache: ArtCache, tracer: Tracer = None,
+                 source: MediaSource = None):
+        self.loop = loop
+        self.link = link
+        self.art_cache = art_cache
+        self.tracer = tracer or Tracer(enabled=False)
+        self.source = source or WinRtSource()
+        self.media_settle = MEDIA_SETTLE
+        self.media_max_wait = MEDIA_MAX_WAIT
+        self.session_manager = None # GlobalSystemMediaTransportControlsSessionManager, or a replay stand-in
+        self.sessions: dict[str, SessionState] = {} # By app id, every session Windows reports
+        self.current: SessionState = None
+
+        self.session_token = None
+        self.sessions_token = None
+
+        self.timeline_task = None
+        self.timeline_sync = TIMELINE_SYNC
+        self.time_anchor = 0 # time.monotonic() at anchor_position
+        self.timeline_anchor = None # Last timeline properties taken from Windows
+        self.anchor_position = None # Seconds
+        self.anchor_duration = 0
+        self.timeline_seq = 0
+        self.anchor_sync = None # Whether the last anchor went out as TIMELINE_SYNC
+
+        self.current_track_id = None
+        self.last_album_title = None
+        self.album_art_sent = False
+        self.art_task: asyncio.Task = None # Art being prepared for the current album
+
+        self.last_playback_status = None
+        self.is_playing = False
+        self.playback_rate = 1.0
+
+        self.switches_cached = 0 # Session switches replayed from the cache
+        self.switches_fetched = 0 # ... that had to fetch everything
+        self.replays = 0 # Current session sent again to a device that (re)connected
+        link.on_connect = self._on_link_connected
+
+    @property
+    def current_session(self):
+        return self.current.session if self.current else None
+
+    async def setup(self, session_manager):
+        self.session_manager = session_manager
+        session = None
+        while(session is None):
+            print("Finding media session...")
+            session = self.session_manager.get_current_session()
+            await asyncio.sleep(2)
+        print(f"Found session: {session.source_app_user_model_id}")
+        self.sync_sessions()
+        self.current = self._track(session)
+        self.handle_playback_info_changed() # Fire once to sync status
+        self.handle_timeline_changed() # Fire once to sync timeline
+        self.session_token = self.session_manager.add_current_session_changed(
+            lambda sender, args: asyncio.run_coroutine_threadsafe(
+                self.handle_current_session_changed(self.tracer.begin("session")),
+                self.loop
+            )
+        )
+        self.sessions_token = self.session_manager.add_sessions_changed(
+            lambda sender, args: self.loop.call_soon_threadsafe(self.sync_sessions)
+        )
+        if not self.timeline_task:
+            self.timeline_task = self.loop.create_task(self._timeline_worker())
+
+    def sync_sessions(self):
+        """Starts tracking new sessions and forgets closed ones. Must run on the event loop thread."""
+        sessions = self.session_manager.get_sessions()
+        apps = set()
+        for session in sessions:
+            apps.add(session.source_app_user_model_id)
+            self._track(session)
+        for app in list(self.sessions):
+            if app not in apps and self.sessions[app] is not self.current:
+                for remove, token in self.sessions.pop(app).tokens:
+                    remove(token)
+
+    def _track(self, session) -> SessionState:
+        """Returns the state of `session`, subscribing to its events on first sight."""
+        app = session.source_app_user_model_id
+        state = self.sessions.get(app)
+        if state:
+            return state
+        state = self.sessions[app] = SessionState(session)
+        state.media_events = EventCoalescer(
+            self.loop, functools.partial(self._media_changed, state), self.media_settle, self.media_max_wait
+        )
+        state.tokens = [
+            (session.remove_media_properties_changed, session.add_media_properties_changed(
+                lambda sender, args: self._on_media_event(state))),
+            (session.remove_playback_info_changed, session.add_playback_info_changed(
+                lambda sender, args: self.handle_playback_info_changed(state, self.tracer.begin("playback")))),
+            (session.remove_timeline_properties_changed, session.add_timeline_properties_changed(
+                lambda sender, args: self.handle_timeline_changed(state, self.tracer.begin("timeline")))),
+        ]
+        # Fill the cache in the background
+        self.handle_playback_info_changed(state)
+        self.handle_timeline_changed(state)
+        state.media_events.trigger()
+        return state
+
+    def _on_media_event(self, state: SessionState):
+        state.stale = True
+        state.media_events.trigger(self.tracer.begin("media") if state is self.current else None)
+        self.loop.call_soon_threadsafe(self._prefetch_art, state)
+
+    def _prefetch_art(self, state: SessionState):
+        """Starts reading and converting the art of the current session's latest event, while its burst settles.
+
+        Speculative: a newer event restarts it, and _prepare_art waits for it instead of
+        converting the same thumbnail again. A conversion cut short still lands in the ArtCache.
+        """
+        if state is not self.current:
+            return
+        if state.art_prefetch:
+            state.art_prefetch.cancel()
+        state.art_prefetch = self.loop.create_task(self._prefetch_art_task(state))
+
+    async def _prefetch_art_task(self, state: SessionState):
+        try:
+            info = await state.session.try_get_media_properties_async()
+            if not self.metadata_ready(info) or not info.thumbnail:
+                return
+            track_id = make_track_id(info)
+            if state.art_album != track_id[2]:
+                await self._convert_art(state, info.thumbnail, track_id)
+        except Exception as e:
+            print(f"Error prefetching art: {e}")
+
+    def _refresh_timeline_anchor(self, trace: Trace = None):
+        """Snapshots the current Windows timeline state to our local anchor."""
+        try:
+            if not self.current: return
+
+            # Get fresh properties from Windows
+            props = self.current_session.get_timeline_properties()
+            if trace: trace.mark("fetch")
+            self.current.timeline = props
+            self.current.timeline_time = time.monotonic()
+            self._send_timeline(props, self.current.timeline_time, trace)
+        except Exception as e:
+            print(f"Refresh error: {e}")
+
+    def _send_timeline(self, props, read_time: float, trace: Trace = None):
+        """Re-anchors on a new timeline report from Windows.
+
+        With TIMELINE_SYNC, nothing is sent while the device's own extrapolation is within
+        TIMELINE_DRIFT of the report (no seek, just Windows catching up).
+        """
+        if not self.timeline_changed(props):
+            return
+        self.timeline_anchor = props
+        position = props.position.total_seconds()
+        if self.is_playing:
+            position += (time.monotonic() - read_time) * self.playback_rate # Cached from a while ago
+        duration = props.end_time.total_seconds()
+        if self.device_syncs_timeline() and self.anchor_position is not None and duration == self.anchor_duration \
+                and abs(position - self.timeline_position()) < TIMELINE_DRIFT:
+            return
+        self._anchor_timeline(position, duration, trace)
+
+    def _anchor_timeline(self, position: float, duration: float = None, trace: Trace = None):
+        """Restarts extrapolation from `position` (seconds) now, and sends it to the device."""
+        self.anchor_position = position
+        if duration is not None:
+            self.anchor_duration = duration
+        self.time_anchor = time.monotonic() # Reset the clock!
+        self.anchor_sync = self.device_syncs_timeline()
+        if self.anchor_sync:
+            self.timeline_seq = (self.timeline_seq + 1) & 0xFFFF
+            frame = encode_timeline_sync(int(position * 1000), int(self.anchor_duration * 1000),
+                                         self.playback_rate if self.is_playing else 0, self.timeline_seq)
+        else:
+            frame = encode_timeline(int(min(position, self.anchor_duration)), int(self.anchor_duration))
+        self.link.send(frame, trace=trace)
+
+    def device_syncs_timeline(self) -> bool:
+        """True if the timeline goes out as TIMELINE_SYNC, which needs firmware that announced it."""
+        return self.timeline_sync and self.link.supports(CAP_TIMELINE_SYNC)
+
+    def timeline_position(self) -> float:
+        """Extrapolated playback position in seconds, which is what the device shows."""
+        position = self.anchor_position
+        if self.is_playing:
+            position += (time.monotonic() - self.time_anchor) * self.playback_rate
+        # Clamp
+        return min(max(position, 0), self.anchor_duration)
+
+    async def _timeline_worker(self):
+        """Background task to periodically update timeline position.
+
+        With TIMELINE_SYNC the device moves the bar itself, this only checks Windows' timeline
+        for drift (some apps don't raise timeline events for every seek).
+        """
+
+        print("Timeline worker started.")
+        while True:
+            try:
+                sync = self.device_syncs_timeline()
+                if self.current and self.timeline_anchor and sync != self.anchor_sync:
+                    self._anchor_timeline(self.timeline_position()) # Device (re)connected with other capabilities
+                elif self.current and self.timeline_anchor and self.is_playing:
+                    if sync:
+                        self._refresh_timeline_anchor()
+                    else:
+                        # Send time to device
+                        self.link.send(encode_timeline(int(self.timeline_position()), int(self.anchor_duration)))
+
+                await asyncio.sleep(1) # Poll every 1 second
+
+            except asyncio.CancelledError:
+                print("Timeline worker cancelled.")
+                break
+            except Exception as e:
+                print(f"Error in timeline worker: {e}")
+                await asyncio.sleep(1)  # Wait before retrying on error
+
+    def handle_timeline_changed(self, state: SessionState = None, trace: Trace = None):
+        """Handles timeline property changes from Windows. Used for instant updates (seeking/skip/etc.)."""
+        state = state or self.current
+        if state is self.current:
+            self._refresh_timeline_anchor(trace)
+        else:
+            try:
+                state.timeline = state.session.get_timeline_properties()
+                state.timeline_time = time.monotonic()
+            except Exception as e:
+                print(f"Refresh error ({state.app}): {e}")
+        if trace: trace.end()
+
+    def metadata_ready(self, info):
+        """Check if metadata is ready (title or artist present)."""
+        return bool(info.title or info.artist)
+
+    def playback_status_changed(self, status):
+        if status != self.last_playback_status:
+            return True
+        return False
+
+    def timeline_changed(self, timeline):
+        return (not self.timeline_anchor or timeline.position != self.timeline_anchor.position)
+
+
+    async def handle_current_session_changed(self, trace: Trace = None):
+        try:
+            session = self.session_manager.get_current_session() # Get new session
+            self.current = self._track(session) if session else None
+            self.current_track_id = None # Reset track ID on session change
+            self.last_playback_status = None # Reset playback status on session change
+            self.timeline_anchor = None
+            self.anchor_position = None
+
+            if not self.current:
+                print("\nNo active media session.")
+                return
+            print(f"\nCurrent session changed to: {self.current.app}")
+            if self.current.meta_frame:
+                # Seen this session before: show what we have now, catch up in the background if needed
+                self.switches_cached += 1
+                self._show_cached(self.current, trace)
+                trace = None # Ended by the art task, or already
+                if self.current.stale or self.current.art_album != self.current.track_id[2]:
+                    self.current.media_events.trigger()
+            else:
+                self.switches_fetched += 1
+                await self.handle_media_properties_changed(trace)
+                trace = None # Ended by the media handler
+                self.handle_playback_info_changed() # Fire once to sync status
+                self.handle_timeline_changed() # Fire once to sync timeline
+        except Exception as e:
+            print(f"Error handling session change: {e}")
+        finally:
+            if trace: trace.end()
+
+    def _show_cached(self, state: SessionState, trace: Trace = None):
+        """Sends the cached metadata, art, playback state and timeline of `state`."""
+        if trace: trace.mark("dispatch")
+        trace_owner = True
+        try:
+            self.current_track_id = state.track_id
+            print(f"\nNow Playing: {state.track_id[0]} - {state.track_id[1]} (cached)")
+            self.link.send(state.meta_frame, trace=trace)
+            if self._album_changed(state.track_id[2]) or not self.album_art_sent:
+                if state.art_album == state.track_id[2] and not (self.art_task and not self.art_task.done()):
+                    self.art_task = self.loop.create_task(self._prepare_art(state, None, state.track_id, trace))
+                    trace_owner = False # Ended by the art task
+            if state.playback_status is not None:
+                self.last_playback_status = state.playback_status
+                self.is_playing = (state.playback_status.name == 'PLAYING')
+                self.playback_rate = state.playback_rate
+                self.link.send(encode_playback(state.playback_status.value), trace=trace)
+            if state.timeline:
+                self._send_timeline(state.timeline, state.timeline_time, trace)
+        finally:
+            if trace and trace_owner: trace.end()
+
+    def _on_link_connected(self, link: Link):
+        """Shows the current session again on a device that just (re)connected, it may have booted blank.
+
+        The cover goes out in full. Frames are shared within a LinkGroup, so the other devices
+        get it all again too.
+        """
+        state = self.current
+        if not state or not state.meta_frame:
+            return # Nothing known yet, the first media event sends it all
+        print(f"Device {link.transport.name} connected, sending the current session")
+        self.replays += 1
+        self.link.art_frame = None
+        if not (self.art_task and not self.art_task.done()):
+            self.album_art_sent = False
+            self.link.begin_art()
+        # else the art task re-encodes against the reset art_frame before sending
+        self.timeline_anchor = None
+        self.anchor_position = None
+        self._show_cached(state)
+
+    def _album_changed(self, album_id: str) -> bool:
+        """Starts a new art generation if `album_id` isn't the one on the device."""
+        if album_id and album_id == self.last_album_title:
+            return False
+        self.album_art_sent = False
+        self.last_album_title = album_id
+        self.link.begin_art() # Cancel unsent art of the previous album
+        if self.art_task:
+            self.art_task.cancel() # Still preparing art of the previous album
+            self.art_task = None
+        return True
+
+    async def handle_media_properties_changed(self, trace: Trace = None):
+        if self.current:
+            await self._media_changed(self.current, trace)
+        elif trace:
+            trace.end()
+
+    async def _media_changed(self, state: SessionState, trace: Trace = None):
+        """Fetches the media properties of `state`, and updates the device if it's the current session."""
+        if trace: trace.mark("dispatch")
+        trace_owner = True
+        try:
+            state.stale = False
+            info = await state.session.try_get_media_properties_async()
+            if trace: trace.mark("fetch")
+            if not self.metadata_ready(info):
+                return
+
+            track_id = make_track_id(info)
+            if track_id != state.track_id:
+                state.track_id = track_id
+                state.meta_frame = encode_meta(info.title, info.artist, info.album_title)
+
+            if state is not self.current:
+                # Background session: only get its art ready for a switch
+                if info.thumbnail and state.art_album != track_id[2]:
+                    await self._convert_art(state, info.thumbnail, track_id)
+                return
+
+            # Album change
+            self._album_changed(track_id[2])
+
+            # Start on the art first, it takes longest (reading the thumbnail, decoding, encoding)
+            if (info.thumbnail or state.art_album == track_id[2]) and not self.album_art_sent \
+                    and not (self.art_task and not self.art_task.done()):
+                self.art_task = self.loop.create_task(self._prepare_art(state, info.thumbnail, track_id, trace))
+                trace_owner = False # Ended by the art task
+
+            # Any metadata change
+            if track_id != self.current_track_id:
+                self.current_track_id = track_id
+                print(f"\nNow Playing: {info.title} - {info.artist}")
+                self.link.send(state.meta_frame, trace=trace)
+                self._refresh_timeline_anchor()
+        except Exception as e:
+            print(f"Error handling media properties change: {e}")
+        finally:
+            if trace and trace_owner: trace.end()
+
+    async def _convert_art(self, state: SessionState, thumbnail, track_id: tuple, trace: Trace = None) -> bool:
+        """Reads and converts the thumbnail into `state.art_pixels` (and `state.art_jpeg`), returns whether it worked."""
+        image_data = await self.source.read_thumbnail(thumbnail)
+        if trace: trace.mark("artwork")
+        if not image_data:
+            print("Failed to get image data from thumbnail")
+            return False
+        pixels = await self.loop.run_in_executor(
+            None, self.art_cache.get_or_convert, bytes(image_data), ART_SIZE, ArtFormat.RGB565
+        )
+        jpeg = None
+        if ART_FORMAT == ArtFormat.JPEG:
+            jpeg = await self.loop.run_in_executor(
+                None, self.art_cache.get_or_convert, bytes(image_data), ART_SIZE, ArtFormat.JPEG, ART_JPEG_MAX_BYTES
+            )
+        # All at once, a prefetch may be converting into the same state
+        state.art_pixels, state.art_jpeg, state.art_album = pixels, jpeg, track_id[2]
+        return True
+
+    async def _prepare_art(self, state: SessionState, thumbnail, track_id: tuple, trace: Trace = None):
+        """Fetches, converts and sends art for `track_id`. Cancelled when a newer album supersedes it.
+
+        The session's converted art is reused if it is of the same album, also once a running
+        prefetch (see _prefetch_art) converted it. The result is only sent if the album of
+        `track_id` is still playing and no newer art generation was started meanwhile.
+        """
+        try:
+            prefetch = state.art_prefetch
+            if state.art_album != track_id[2] and prefetch and not prefetch.done():
+                await asyncio.wait((prefetch,)) # Most likely converting this thumbnail already
+            if state.art_album != track_id[2]:
+                if not await self._convert_art(state, thumbnail, track_id, trace):
+                    return
+                print("Image data received.")
+            pixels, jpeg = state.art_pixels, state.art_jpeg
+            while True:
+                transfer_id = self.link.art_transfer_id
+                prev_frame = self.link.art_frame
+                art_packets, art_frame = await self.loop.run_in_executor(
+                    None,
+                    functools.partial(encode_art_frame, pixels, prev_frame, transfer_id, self.link.supports(CAP_ART_NAK),
+                                      self.link.art_chunk_size, ART_PREVIEW and self.link.supports(CAP_ART_PREVIEW),
+                                      self.art_format(), jpeg)
+                )
+                if trace: trace.mark("encode")
+                current = self.current_track_id
+                if transfer_id != self.link.art_transfer_id or not current or current[2] != track_id[2]:
+                    print("Art superseded by a newer album, dropping.")
+                    return
+                if self.link.art_frame is prev_frame:
+                    break
+                # The device image changed underneath (e.g. reconnect), the delta is against the wrong frame
+
+            self.link.art_frame = art_frame
+            stats = self.art_cache.stats()
+            print(f"Sending art... ({len(art_packets)} frames, {sum(map(len, art_packets))} bytes, "
+                  f"cache: {stats['hits'] + stats['disk_hits']} hits, "
+                  f"{stats['misses']} misses, {stats['evictions']} evictions, "
+                  f"~{stats['saved_time_s']:.2f}s saved)")
+            for packet in art_packets:
+                self.link.send(packet, trace=trace)
+            print("Art sent to queue.")
+            self.album_art_sent = True # Mark as sent for current song/album
+        except asyncio.CancelledError:
+            pass
+        except Exception as art_err:
+            print(f"Error encoding art: {art_err}")
+        finally:
+            if trace: trace.end()
+
+    def art_format(self) -> int:
+        """ART_FORMAT, unless a device can't decode it."""
+        if ART_FORMAT in ART_FORMAT_CAPS and not self.link.supports(ART_FORMAT_CAPS[ART_FORMAT]):
+            return ArtFormat.RGB565_RLE
+        return ART_FORMAT
+
+    def stats(self) -> dict:
+        media_events = {}
+        for state in self.sessions.values():
+            for k, v in state.media_events.stats().items():
+                media_events[k] = media_events.get(k, 0) + v
+        return {
+            "media_events": media_events,
+            "sessions": len(self.sessions),
+            "switches_cached": self.switches_cached,
+            "switches_fetched": self.switches_fetched,
+            "replays": self.replays,
+        }
+
+    def handle_playback_info_changed(self, state: SessionState = None, trace: Trace = None):
+        state = state or self.current
+        try:
+            if not state:
+                return
+            info = state.session.get_playback_info()
+            status = info.playback_status
+            rate = info.playback_rate or 1.0 # None if the app doesn't report it
+            if trace: trace.mark("fetch")
+            state.playback_status = status
+            state.playback_rate = rate
+            if state is not self.current:
+                return
+            # Where the bar is now, before the old status and rate stop applying
+            position = self.timeline_position() if self.anchor_position is not None else None
+            if self.playback_status_changed(status):
+                self.last_playback_status = status
+                self.is_playing = (status.name == 'PLAYING')
+                self.playback_rate = rate
+                print(f"Playback status: {status.name}")
+                self.link.send(encode_playback(status.value), trace=trace) # Send update (other device decides what to do)
+                if position is not None:
+                    self._anchor_timeline(position) # Stop or restart the bar from here
+
+                # Reset the clock if playback just started.
+                if self.is_playing:
+                    self._refresh_timeline_anchor()
+            elif rate != self.playback_rate:
+                self.playback_rate = rate
+                print(f"Playback rate: {rate}")
+                if position is not None:
+                    self._anchor_timeline(position)
+
+        except Exception as e:
+            print(f"Error handling playback info change: {e}")
+        finally:
+            if trace: trace.end()
+
+
+def encode_art_update(art_cache: ArtCache, image_data: bytes, prev_frame: bytes | None,
+                      transfer_id: int = 0, nak: bool = False, chunk_size: int = FIXED_CHUNK,
+                      preview: bool = False, format: int = ART_FORMAT) -> tuple[list[bytes | memoryview], bytes]:
+    """Encodes art as a full frame, or only the changed tiles if the device already shows a frame.
+
+    `nak` asks the device to report missing chunks of a full frame (see packetize_art), which is
+    split into `chunk_size` chunks (see Link.art_chunk_size). With `preview`, a full frame or a
+    delta of at least ART_PREVIEW_MIN_BYTES goes out as a full frame behind a preview instead
+    (see packetize_art_progressive). Full frames go out in `format`; for PALETTE8 and JPEG the
+    frame returned is the lossy one the device will show.
+    """
+    pixels = art_cache.get_or_convert(image_data, ART_SIZE, ArtFormat.RGB565)
+    jpeg = art_cache.get_or_convert(image_data, ART_SIZE, format, ART_JPEG_MAX_BYTES) if format == ArtFormat.JPEG else None
+    return encode_art_frame(pixels, prev_frame, transfer_id, nak, chunk_size, preview, format, jpeg)
+
+def encode_art_frame(pixels: bytes, prev_frame: bytes | None, transfer_id: int = 0, nak: bool = False,
+                     chunk_size: int = FIXED_CHUNK, preview: bool = False, format: int = ART_FORMAT,
+                     jpeg: bytes = None) -> tuple[list[bytes | memoryview], bytes]:
+    """Same as `encode_art_update`, for already converted RGB565 pixels.
+
+    For JPEG, `jpeg` is the same art as ArtCache converted it from the thumbnail.
+    """
+    if prev_frame is not None:
+        frames, frame = encode_art_delta(prev_frame, pixels, ART_SIZE, tolerance=ART_DELTA_TOLERANCE, transfer_id=transfer_id)
+        if not preview or sum(map(len, frames)) < ART_PREVIEW_MIN_BYTES:
+            return frames, frame
+    frames = packetize_art_preview(pixels, format, ART_SIZE, transfer_id, ART_PREVIEW_SCALE) if preview else []
+    if format == ArtFormat.PALETTE8:
+        palette, indices = quantize_rgb565(pixels, ART_SIZE, ART_DITHER)
+        frames += packetize_art(indices, format, chunk_size, ART_SIZE, transfer_id, nak, palette=palette)
+        return frames, decode_palette8(indices, palette)
+    if format == ArtFormat.JPEG:
+        if jpeg is None:
+            raise ValueError("JPEG art needs the JPEG from ArtCache")
+        return frames + packetize_art(jpeg, format, chunk_size, ART_SIZE, transfer_id, nak), decode_jpeg(jpeg, ART_SIZE)
+    return frames + packetize_art(pixels, format, chunk_size, ART_SIZE, transfer_id, nak), pixels
+
+def make_track_id(info):
+    """Makes unique track identifier."""
+    return (info.title or "", info.artist or "", info.album_title or "")
@@ -0,0 +1,394 @@
+"""Where media sessions come from: live WinRT, or a recorded trace replayed on any OS.
+
+MediaController talks to a session manager and its sessions through the subset of the WinRT
+GlobalSystemMediaTransportControlsSession(Manager) API it uses, so the replay classes here
+mimic those shapes. Thumbnails are read through `MediaSource.read_thumbnail`, because only
+the WinRT ones need a DataReader.
+
+Trace format, one JSON object per line, `t` in seconds from the start of the recording:
+
+    {"t": 0.0, "type": "session", "app": "Spotify.exe"}       # current session changed, app null = none
+    {"t": 0.1, "type": "thumbnail", "id": "ab12..", "data": "<base64>"}  # before its first use
+    {"t": 0.1, "type": "media", "title": "..", "artist": "..", "album": "..", "thumbnail": "ab12.."}
+    {"t": 0.2, "type": "playback", "status": 4, "rate": 1.0}  # PlaybackStatus value, rate optional
+    {"t": 0.3, "type": "timeline", "position": 12.5, "end": 201.0}
+
+media, playback and timeline events apply to the current session, or to the session of `app`
+if given (a background one, created on first use).
+
+Record on Windows with `python media_source.py record trace.jsonl`.
+"""
+import asyncio
+import base64
+import datetime
+import hashlib
+import json
+import sys
+import threading
+import time
+from enum import IntEnum
+
+class MediaSource:
+    """Provides the session manager MediaController listens to."""
+
+    name = "source"
+
+    async def open(self):
+        """Returns a session manager (GlobalSystemMediaTransportControlsSessionManager-like)."""
+        raise NotImplementedError
+
+    async def read_thumbnail(self, thumbnail) -> bytes | None:
+        """Returns the encoded image bytes of a media properties `thumbnail`, None on failure."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class WinRtSource(MediaSource):
+    """The live Windows media session manager. winrt is only imported when opened."""
+
+    name = "winrt"
+
+    async def open(self):
+        from winrt.windows.media.control import \
+            GlobalSystemMediaTransportControlsSessionManager as SessionManager
+        return await SessionManager.request_async()
+
+    async def read_thumbnail(self, thumbnail) -> bytes | None:
+        if not thumbnail: return None
+        from winrt.windows.storage.streams import DataReader
+        try:
+            stream = await thumbnail.open_read_async()
+            reader = DataReader(stream)
+            await reader.load_async(stream.size)
+            image_data = bytearray(stream.size)
+            reader.read_bytes(image_data)
+            return bytes(image_data)
+        except Exception:
+            return None
+
+# Replay
+
+class PlaybackStatus(IntEnum):
+    """Same names and values as the WinRT enum (MediaController uses both)."""
+    CLOSED = 0
+    OPENED = 1
+    CHANGING = 2
+    STOPPED = 3
+    PLAYING = 4
+    PAUSED = 5
+
+class _Event:
+    """Handler registry with WinRT-style add/remove tokens."""
+
+    def __init__(self):
+        self._handlers = {}
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def add(self, handler) -> int:
+        with self._lock:
+            self._next += 1
+            self._handlers[self._next] = handler
+            return self._next
+
+    def remove(self, token: int):
+        with self._lock:
+            self._handlers.pop(token, None)
+
+    def fire(self, sender):
+        with self._lock:
+            handlers = list(self._handlers.values())
+        for handler in handlers:
+            handler(sender, None)
+
+class ReplayThumbnail:
+    def __init__(self, data: bytes):
+        self.data = data
+
+class ReplayMediaProperties:
+    def __init__(self, title: str = "", artist: str = "", album_title: str = "", thumbnail: ReplayThumbnail = None):
+        self.title = title
+        self.artist = artist
+        self.album_title = album_title
+        self.thumbnail = thumbnail
+
+class ReplayPlaybackInfo:
+    def __init__(self, playback_status: PlaybackStatus, playback_rate: float = 1.0):
+        self.playback_status = playback_status
+        self.playback_rate = playback_rate
+
+class ReplayTimelineProperties:
+    def __init__(self, position: float, end: float):
+        self.position = datetime.timedelta(seconds=position)
+        self.end_time = datetime.timedelta(seconds=end)
+
+class ReplaySession:
+    """One app's media session, state set by the replayer."""
+
+    def __init__(self, app: str):
+        self.source_app_user_model_id = app
+        self.media_properties = ReplayMediaProperties()
+        self.playback_info = ReplayPlaybackInfo(PlaybackStatus.CLOSED)
+        self.timeline_properties = ReplayTimelineProperties(0, 0)
+        self._media = _Event()
+        self._playback = _Event()
+        self._timeline = _Event()
+
+    async def try_get_media_properties_async(self) -> ReplayMediaProperties:
+        return self.media_properties
+
+    def get_playback_info(self) -> ReplayPlaybackInfo:
+        return self.playback_info
+
+    def get_timeline_properties(self) -> ReplayTimelineProperties:
+        return self.timeline_properties
+
+    def add_media_properties_changed(self, handler) -> int:
+        return self._media.add(handler)
+
+    def remove_media_properties_changed(self, token: int):
+        self._media.remove(token)
+
+    def add_playback_info_changed(self, handler) -> int:
+        return self._playback.add(handler)
+
+    def remove_playback_info_changed(self, token: int):
+        self._playback.remove(token)
+
+    def add_timeline_properties_changed(self, handler) -> int:
+        return self._timeline.add(handler)
+
+    def remove_timeline_properties_changed(self, token: int):
+        self._timeline.remove(token)
+
+class ReplaySessionManager:
+    def __init__(self):
+        self.sessions: dict[str, ReplaySession] = {}
+        self.current: ReplaySession = None
+        self._session_changed = _Event()
+        self._sessions_changed = _Event()
+
+    def get_current_session(self) -> ReplaySession | None:
+        return self.current
+
+    def get_sessions(self) -> list[ReplaySession]:
+        return list(self.sessions.values())
+
+    def add_current_session_changed(self, handler) -> int:
+        return self._session_changed.add(handler)
+
+    def remove_current_session_changed(self, token: int):
+        self._session_changed.remove(token)
+
+    def add_sessions_changed(self, handler) -> int:
+        return self._sessions_changed.add(handler)
+
+    def remove_sessions_changed(self, token: int):
+        self._sessions_changed.remove(token)
+
+    def _session(self, app: str) -> ReplaySession:
+        session = self.sessions.get(app)
+        if session is None:
+            session = self.sessions[app] = ReplaySession(app)
+            self._sessions_changed.fire(self)
+        return session
+
+    def apply(self, event: dict, thumbnails: dict):
+        """Updates state for one trace event and fires the matching WinRT-style event."""
+        kind = event["type"]
+        if kind == "session":
+            app = event.get("app")
+            self.current = None if app is None else self._session(app)
+            self._session_changed.fire(self)
+            return
+
+        session = self._session(event["app"]) if "app" in event else self.current
+        if session is None:
+            return
+        if kind == "media":
+            thumb = thumbnails.get(event.get("thumbnail"))
+            session.media_properties = ReplayMediaProperties(
+                event.get("title", ""), event.get("artist", ""), event.get("album", ""),
+                ReplayThumbnail(thumb) if thumb is not None else None,
+            )
+            session._media.fire(session)
+        elif kind == "playback":
+            session.playback_info = ReplayPlaybackInfo(PlaybackStatus(event["status"]), event.get("rate", 1.0))
+            session._playback.fire(session)
+        elif kind == "timeline":
+            session.timeline_properties = ReplayTimelineProperties(event["position"], event["end"])
+            session._timeline.fire(session)
+
+class ReplaySource(MediaSource):
+    """Replays a recorded trace with its original timing, or `speed` times faster.
+
+    Events fire on a dedicated thread, like WinRT callbacks do. `done` is set after the last one.
+    `thumbnail_delay` emulates the time WinRT takes to open and read a thumbnail stream.
+    """
+
+    name = "replay"
+
+    def __init__(self, path: str, speed: float = 1.0, loop_count: int = 1, thumbnail_delay: float = 0.0):
+        self.path = path
+        self.speed = speed
+        self.loop_count = loop_count
+        self.thumbnail_delay = thumbnail_delay
+        self.done = threading.Event()
+        self.events_replayed = 0
+        self.start_time = None # perf_counter() at t=0 of the trace
+        self._stop = threading.Event()
+        self._events = load_trace(path)
+
+    async def open(self) -> ReplaySessionManager:
+        manager = ReplaySessionManager()
+        threading.Thread(target=self._run, args=(manager,), name="replay", daemon=True).start()
+        return manager
+
+    async def read_thumbnail(self, thumbnail: ReplayThumbnail) -> bytes | None:
+        if not thumbnail:
+            return None
+        if self.thumbnail_delay:
+            await asyncio.sleep(self.thumbnail_delay / self.speed)
+        return thumbnail.data
+
+    def close(self):
+        self._stop.set()
+
+    def _run(self, manager: ReplaySessionManager):
+        thumbnails = {}
+        duration = self._events[-1]["t"] if self._events else 0
+        start = self.start_time = time.perf_counter()
+        for n in range(self.loop_count):
+            offset = n * duration
+            for event in self._events:
+                delay = (event["t"] + offset) / self.speed - (time.perf_counter() - start)
+                if delay > 0 and self._stop.wait(delay):
+                    return
+                if event["type"] == "thumbnail":
+                    thumbnails[event["id"]] = base64.b64decode(event["data"])
+                    continue
+                try:
+                    manager.apply(event, thumbnails)
+                except Exception as e:
+                    print(f"Replay error at t={event['t']}: {e}")
+                self.events_replayed += 1
+        self.done.set()
+
+def load_trace(path: str) -> list[dict]:
+    with open(path) as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    events.sort(key=lambda e: e["t"])
+    return events
+
+# Recording
+
+class TraceWriter:
+    """Writes trace events, storing each distinct thumbnail only once."""
+
+    def __init__(self, path: str):
+        self._file = open(path, "w")
+        self._start = time.perf_counter()
+        self._thumbnails = set()
+        self._lock = threading.Lock()
+
+    def write(self, event: dict, thumbnail: bytes = None):
+        with self._lock:
+            t = round(time.perf_counter() - self._start, 4)
+            if thumbnail is not None:
+                thumb_id = hashlib.blake2b(thumbnail, digest_size=8).hexdigest()
+                if thumb_id not in self._thumbnails:
+                    self._thumbnails.add(thumb_id)
+                    self._line({"t": t, "type": "thumbnail", "id": thumb_id, "data": base64.b64encode(thumbnail).decode()})
+                event["thumbnail"] = thumb_id
+            self._line({"t": t, **event})
+
+    def _line(self, event: dict):
+        self._file.write(json.dumps(event, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+class Recorder:
+    """Records every event of a source's session manager to a trace file."""
+
+    def __init__(self, source: MediaSource, writer: TraceWriter, loop: asyncio.AbstractEventLoop):
+        self.source = source
+        self.writer = writer
+        self.loop = loop
+        self.manager = None
+        self.session = None
+        self._tokens = []
+
+    async def start(self):
+        self.manager = await self.source.open()
+        self.manager.add_current_session_changed(lambda sender, args: self.loop.call_soon_threadsafe(self._session_changed))
+        self._session_changed()
+
+    def _session_changed(self):
+        if self.session:
+            for remove, token in self._tokens:
+                remove(token)
+        self._tokens = []
+        self.session = session = self.manager.get_current_session()
+        self.writer.write({"type": "session", "app": session.source_app_user_model_id if session else None})
+        if not session:
+            return
+        self._tokens = [
+            (session.remove_media_properties_changed, session.add_media_properties_changed(
+                lambda sender, args: asyncio.run_coroutine_threadsafe(self._media(sender), self.loop))),
+            (session.remove_playback_info_changed, session.add_playback_info_changed(
+                lambda sender, args: self._playback(sender))),
+            (session.remove_timeline_properties_changed, session.add_timeline_properties_changed(
+                lambda sender, args: self._timeline(sender))),
+        ]
+        asyncio.run_coroutine_threadsafe(self._media(session), self.loop)
+        self._playback(session)
+        self._timeline(session)
+
+    async def _media(self, session):
+        try:
+            info = await session.try_get_media_properties_async()
+            thumbnail = await self.source.read_thumbnail(info.thumbnail) if info.thumbnail else None
+            self.writer.write({"type": "media", "title": info.title, "artist": info.artist, "album": info.album_title,
+                               "thumbnail": None}, thumbnail)
+            print(f"media: {info.title} - {info.artist}")
+        except Exception as e:
+            print(f"Record error (media): {e}")
+
+    def _playback(self, session):
+        try:
+            info = session.get_playback_info()
+            self.writer.write({"type": "playback", "status": int(info.playback_status.value),
+                               "rate": info.playback_rate or 1.0})
+        except Exception as e:
+            print(f"Record error (playback): {e}")
+
+    def _timeline(self, session):
+        try:
+            props = session.get_timeline_properties()
+            self.writer.write({"type": "timeline", "position": props.position.total_seconds(),
+                               "end": props.end_time.total_seconds()})
+        except Exception as e:
+            print(f"Record error (timeline): {e}")
+
+async def record(path: str):
+    writer = TraceWriter(path)
+    recorder = Recorder(WinRtSource(), writer, asyncio.get_running_loop())
+    await recorder.start()
+    print(f"Recording to {path}... (Ctrl+C to stop)")
+    try:
+        while True:
+            await asyncio.sleep(1)
+    finally:
+        writer.close()
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] != "record":
+        print("Usage: python media_source.py record trace.jsonl")
+        sys.exit(1)
+    try:
+        asyncio.run(record(sys.argv[2]))
+    except KeyboardInterrupt:
+        pass
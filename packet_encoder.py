@@ -1,35 +1,131 @@
 from PIL import Image
+import binascii
 import io
+import re
 from enum import IntEnum
 import numpy as np
 
 SOF = 0x7E
+SOF_V2 = 0x7D
 META = 0x01
 PLAYBACK_STATE = 0x02
 TIMELINE = 0x03
+TIMELINE_SYNC = 0x04
+HELLO = 0x05 # Host -> device, first frame of every connection
 ART_BEGIN = 0x10
 ART_CHUNK = 0x11
 ART_END = 0x12
+ART_TILE = 0x13
+CREDIT = 0x20 # Device -> host
+CAPS = 0x21 # Device -> host
+ART_NAK = 0x22 # Device -> host
+
+PROTOCOL_VERSION = 2 # Highest frame format this host speaks
+CAP_TIMELINE_SYNC = 0x0001 # Device extrapolates TIMELINE_SYNC
+CAP_ART_NAK = 0x0002 # Device answers ART_END with ART_NAK if ART_BEGIN has a chunk size
+CAP_ART_PREVIEW = 0x0004 # Device scales art up by the scale in ART_BEGIN
+CAP_ART_PALETTE = 0x0008 # Device decodes ArtFormat.PALETTE8
+CAP_ART_JPEG = 0x0010 # Device decodes baseline ArtFormat.JPEG
+FRAME_OVERHEAD = {1: 5, 2: 8} # Header and checksum bytes per frame version
+
+_CRC_VECTOR_MIN = 64 # Below this, NumPy call overhead costs more than the loop
 
 def _crc(data: bytes) -> int:
-    c = 0
-    for b in data:
-        c ^= b
-    return c
+    if len(data) < _CRC_VECTOR_MIN:
+        c = 0
+        for b in data:
+            c ^= b
+        return c
+    return int(np.bitwise_xor.reduce(np.frombuffer(data, dtype=np.uint8)))
+
+def crc16(data: bytes, crc: int = 0xFFFF) -> int:
+    """CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF), table-driven in C by binascii."""
+    return binascii.crc_hqx(data, crc)
 
 def encode(msg_type: int, payload: bytes) -> bytes:
     length = len(payload)
-    frame = bytearray()
-    frame.append(SOF)
-    frame.append(msg_type)
-    frame.append(length & 0xFF)        # LEN_L
-    frame.append((length >> 8) & 0xFF) # LEN_H
-    frame.extend(payload)
-    crc_value = _crc(frame)
-    frame.append(crc_value)
+    frame = bytearray((
+        SOF,
+        msg_type,
+        length & 0xFF,        # LEN_L
+        (length >> 8) & 0xFF, # LEN_H
+    ))
+    frame += payload
+    frame.append(_crc(frame))
 
     return bytes(frame)
 
+# Frame formats:
+# v1: [SOF 0x7E][TYPE][LEN:2][payload][CRC:1], CRC = XOR of all bytes before it
+# v2: [SOF 0x7D][TYPE][SEQ:2][LEN:2][payload][CRC:2], CRC = crc16 of all bytes before it
+# SEQ counts the frames of one connection, so receivers can tell lost and reordered frames.
+# Everything is built as v1 and a Link re-frames it with `to_v2` once the device has sent
+# CAPS with version >= 2; old firmware never does and keeps getting v1. CAPS and CREDIT
+# (device -> host) stay v1, so any host can read them.
+
+def encode_v2(msg_type: int, payload: bytes, seq: int) -> bytes:
+    length = len(payload)
+    header = bytes((
+        SOF_V2,
+        msg_type,
+        seq & 0xFF,           # SEQ_L
+        (seq >> 8) & 0xFF,    # SEQ_H
+        length & 0xFF,        # LEN_L
+        (length >> 8) & 0xFF, # LEN_H
+    ))
+    crc = crc16(payload, crc16(header))
+    return b"".join((header, payload, crc.to_bytes(2, 'little'))) # Payload is copied once
+
+def to_v2(frame: bytes | memoryview, seq: int) -> bytes:
+    """Re-frames a v1 frame as v2 with sequence number `seq`."""
+    return encode_v2(frame[1], frame[4:-1], seq)
+
+def encode_chunk_frames(msg_type: int, data: bytes, chunk_size: int, tag: bytes = b"") -> list[memoryview]:
+    """Builds one [offset:4][tag][chunk] frame per `chunk_size` bytes of `data`.
+
+    All frames are laid out in a single preallocated buffer, headers and checksums
+    are computed vectorized and the frames are returned as memoryview slices of it.
+    """
+    src = np.frombuffer(data, dtype=np.uint8)
+    total = len(src)
+    if total == 0:
+        return []
+
+    n_full, last = divmod(total, chunk_size)
+    chunk_lens = np.full(n_full + (1 if last else 0), chunk_size, dtype=np.int64)
+    if last:
+        chunk_lens[-1] = last
+    chunk_offsets = np.arange(len(chunk_lens), dtype=np.int64) * chunk_size
+    header = 8 + len(tag) # SOF, TYPE, LEN x2, offset x4, tag
+    frame_sizes = chunk_lens + header + 1 # ..., CRC
+    frame_offsets = np.cumsum(frame_sizes) - frame_sizes
+    payload_lens = chunk_lens + header - 4
+
+    buf = np.empty(int(frame_sizes.sum()), dtype=np.uint8)
+    buf[frame_offsets] = SOF
+    buf[frame_offsets + 1] = msg_type
+    buf[frame_offsets + 2] = payload_lens & 0xFF
+    buf[frame_offsets + 3] = (payload_lens >> 8) & 0xFF
+    for i in range(4):
+        buf[frame_offsets + 4 + i] = (chunk_offsets >> (8 * i)) & 0xFF
+    for i, b in enumerate(tag):
+        buf[frame_offsets + 8 + i] = b
+
+    # Full chunks share a stride, so they can be copied in one go
+    if n_full:
+        frames = buf[:n_full * (chunk_size + header + 1)].reshape(n_full, chunk_size + header + 1)
+        frames[:, header:header + chunk_size] = src[:n_full * chunk_size].reshape(n_full, chunk_size)
+    if last:
+        start = int(frame_offsets[-1]) + header
+        buf[start:start + last] = src[n_full * chunk_size:]
+
+    crc_slots = frame_offsets + frame_sizes - 1
+    buf[crc_slots] = 0
+    buf[crc_slots] = np.bitwise_xor.reduceat(buf, frame_offsets)
+
+    view = memoryview(buf)
+    return [view[o:o + n] for o, n in zip(frame_offsets.tolist(), frame_sizes.tolist())]
+
 def encode_meta(title: str, artist: str, album: str) -> bytes:
     t = title.encode('utf-8')[:255]
     a = artist.encode('utf-8')[:255]
@@ -58,13 +154,18 @@ def encode_meta(title: str, artist: str, album: str) -> bytes:
 # 'track_number': 4
 
 class ArtFormat(IntEnum):
-    JPEG = 0
+    JPEG = 0 # Baseline JPEG of the whole image, see encode_jpeg
     PNG = 1
     RGB565 = 2
+    RGB565_RLE = 3 # PackBits-style run-length coding over 16-bit pixels, see encode_rle565
+    PALETTE8 = 4 # One byte per pixel, indices into an RGB565 palette sent in ART_BEGIN, see quantize_rgb565
 
-def convert_image_to_rgb565(image_data: bytes, size: tuple) -> bytes:
-    image = Image.open(io.BytesIO(image_data)).convert("RGB")
-    
+class Dither(IntEnum):
+    NONE = 0
+    ORDERED = 1 # 4x4 Bayer matrix
+    DIFFUSION = 2 # Floyd-Steinberg
+
+def _fit_image(image: Image.Image, size: tuple) -> Image.Image:
     # Crop to match target aspect ratio
     target_aspect = size[0] / size[1]
     current_aspect = image.width / image.height
@@ -81,7 +182,13 @@ def convert_image_to_rgb565(image_data: bytes, size: tuple) -> bytes:
         image = image.crop((0, top, image.width, top + new_height))
     
     # Now resize to exact target size
-    image = image.resize(size)
+    return image.resize(size)
+
+def convert_image_to_rgb565(image_data: bytes, size: tuple) -> bytes:
+    image = _fit_image(Image.open(io.BytesIO(image_data)).convert("RGB"), size)
+    return _image_to_rgb565(image)
+
+def _image_to_rgb565(image: Image.Image) -> bytes:
     arr = np.asarray(image, dtype=np.uint8)
     r = (arr[:,:,0] >> 3).astype(np.uint16)
     g = (arr[:,:,1] >> 2).astype(np.uint16)
@@ -89,14 +196,197 @@ def convert_image_to_rgb565(image_data: bytes, size: tuple) -> bytes:
     rgb565 = (r << 11) | (g << 5) | b
     return rgb565.tobytes()
 
-def encode_art(image_data: bytes, format: int, chunk_size: int = 3072, size: tuple = (240,200)) -> list[bytes]:
-    # FORMAT NOT IMPLEMENTED YET!!!
+def rgb565_to_image(image_data_rgb565: bytes, size: tuple) -> Image.Image:
+    """Expands RGB565 pixels back to an 8-bit RGB image (low bits filled from the high ones)."""
+    width, height = size
+    channels = _rgb565_channels(np.frombuffer(image_data_rgb565, dtype='<u2').reshape(height, width))
+    rgb = np.stack(((channels[..., 0] << 3) | (channels[..., 0] >> 2),
+                    (channels[..., 1] << 2) | (channels[..., 1] >> 4),
+                    (channels[..., 2] << 3) | (channels[..., 2] >> 2)), axis=-1).astype(np.uint8)
+    return Image.fromarray(rgb, "RGB")
+
+# JPEG format:
+# A baseline (sequential, Huffman) JPEG of the whole image with 4:2:0 chroma and no metadata,
+# which is what microcontroller decoders such as TJpg_Decoder accept.
+
+JPEG_MAX_BYTES = 12288 # Default budget, a 240x200 cover fits at about quality 90
+JPEG_QUALITY = (10, 95) # Range searched by encode_jpeg
+
+def _save_jpeg(image: Image.Image, quality: int) -> bytes:
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=quality, optimize=True, progressive=False, subsampling="4:2:0")
+    return out.getvalue()
+
+def encode_jpeg(image: Image.Image, max_bytes: int = JPEG_MAX_BYTES) -> tuple[bytes, int]:
+    """Encodes `image` at the highest quality that fits in `max_bytes`, returns (JPEG data, quality).
+
+    Binary search over JPEG_QUALITY, about 7 encodes. If not even the lowest quality fits, that
+    one is returned anyway.
+    """
+    lo, hi = JPEG_QUALITY
+    best = None
+    while lo <= hi:
+        quality = (lo + hi) // 2
+        data = _save_jpeg(image, quality)
+        if len(data) <= max_bytes:
+            best = (data, quality)
+            lo = quality + 1
+        else:
+            hi = quality - 1
+    return best or (data, quality) # The last try was the lowest quality
+
+def convert_image_to_jpeg(image_data: bytes, size: tuple, max_bytes: int = JPEG_MAX_BYTES) -> bytes:
+    """Crops and resizes like convert_image_to_rgb565, then encodes with encode_jpeg."""
+    image = _fit_image(Image.open(io.BytesIO(image_data)).convert("RGB"), size)
+    return encode_jpeg(image, max_bytes)[0]
+
+def decode_jpeg(data: bytes, size: tuple) -> bytes | None:
+    """Reference decoder for JPEG art: RGB565 pixels, None unless it is a baseline JPEG of `size`.
+
+    The firmware's decoder rounds differently, its pixels can be off by a level here and there.
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.format != "JPEG" or image.info.get("progressive") or image.size != tuple(size):
+            return None
+        return _image_to_rgb565(image.convert("RGB"))
+    except (OSError, ValueError):
+        return None
+
+# RGB565_RLE format:
+# Sequence of packets, each starting with a header byte n
+# n < 0x80:  literal, followed by n+1 raw pixels (2 bytes each, little endian)
+# n >= 0x80: repeat, followed by one pixel that is repeated (n & 0x7F)+1 times
+
+RLE_MAX_RUN = 128
+
+def encode_rle565(image_data_rgb565: bytes) -> bytes:
+    """Run-length encodes RGB565 pixels (vectorized, no per-pixel Python loop)."""
+    pixels = np.frombuffer(image_data_rgb565, dtype='<u2')
+    n = len(pixels)
+    if n == 0:
+        return b""
+
+    # Runs of identical pixels
+    run_starts = np.flatnonzero(np.concatenate(([True], pixels[1:] != pixels[:-1])))
+    run_lens = np.diff(np.append(run_starts, n))
+    is_repeat = run_lens >= 2
+
+    # Consecutive single pixels are merged into one literal segment
+    seg_first = is_repeat.copy()
+    seg_first[0] = True
+    seg_first[1:] |= is_repeat[:-1]
+    seg_idx = np.flatnonzero(seg_first)
+    seg_starts = run_starts[seg_idx]
+    seg_lens = np.add.reduceat(run_lens, seg_idx)
+    seg_repeat = is_repeat[seg_idx]
+
+    # Split segments into packets of at most RLE_MAX_RUN pixels
+    pkt_counts = (seg_lens + RLE_MAX_RUN - 1) // RLE_MAX_RUN
+    pkt_seg = np.repeat(np.arange(len(seg_starts)), pkt_counts)
+    pkt_index = np.arange(len(pkt_seg)) - np.repeat(np.cumsum(pkt_counts) - pkt_counts, pkt_counts)
+    pkt_starts = seg_starts[pkt_seg] + pkt_index * RLE_MAX_RUN
+    pkt_lens = np.minimum(seg_lens[pkt_seg] - pkt_index * RLE_MAX_RUN, RLE_MAX_RUN)
+    pkt_repeat = seg_repeat[pkt_seg]
+
+    pkt_sizes = 1 + np.where(pkt_repeat, 2, 2 * pkt_lens)
+    pkt_offsets = np.cumsum(pkt_sizes) - pkt_sizes
+    out = np.empty(int(pkt_sizes.sum()), dtype=np.uint8)
+    out[pkt_offsets] = np.where(pkt_repeat, 0x80, 0) | (pkt_lens - 1)
+
+    pixel_bytes = pixels.view(np.uint8)
+    rep_offsets = pkt_offsets[pkt_repeat]
+    rep_starts = pkt_starts[pkt_repeat]
+    out[rep_offsets + 1] = pixel_bytes[2 * rep_starts]
+    out[rep_offsets + 2] = pixel_bytes[2 * rep_starts + 1]
+
+    lit = ~pkt_repeat
+    lit_lens = pkt_lens[lit]
+    lit_pkt = np.repeat(np.arange(len(lit_lens)), lit_lens)
+    lit_pixels = np.repeat(pkt_starts[lit], lit_lens) + (np.arange(len(lit_pkt)) - np.repeat(np.cumsum(lit_lens) - lit_lens, lit_lens))
+    lit_dest = pkt_offsets[lit][lit_pkt] + 1 + 2 * (lit_pixels - pkt_starts[lit][lit_pkt])
+    out[lit_dest] = pixel_bytes[2 * lit_pixels]
+    out[lit_dest + 1] = pixel_bytes[2 * lit_pixels + 1]
+    return out.tobytes()
+
+# PALETTE8 format:
+# ART_BEGIN always has chunk_size and scale, followed by the palette: [n RGB565 entries:2 each], n <= 256
+# Chunks carry one palette index per pixel.
+
+BAYER_4X4 = np.array([[0, 8, 2, 10], [12, 4, 14, 6], [3, 11, 1, 9], [15, 7, 13, 5]])
+
+def quantize_rgb565(image_data_rgb565: bytes, size: tuple, dither: int = Dither.NONE,
+                    colors: int = 256) -> tuple[bytes, bytes]:
+    """Reduces RGB565 pixels to a palette, returns (RGB565 palette, one index byte per pixel).
+
+    The palette comes from PIL's fast octree quantizer. ORDERED offsets each pixel by a Bayer
+    threshold of up to half the average distance between palette levels before mapping it to the
+    nearest entry, DIFFUSION spreads the mapping error Floyd-Steinberg style (both in PIL's C code).
+    """
+    width, height = size
+    image = rgb565_to_image(image_data_rgb565, size)
+    rgb = np.asarray(image)
+    indexed = image.quantize(colors, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+    if dither == Dither.DIFFUSION:
+        indexed = image.quantize(palette=indexed, dither=Image.Dither.FLOYDSTEINBERG)
+    elif dither == Dither.ORDERED:
+        spread = 256 / round(colors ** (1 / 3))
+        threshold = (BAYER_4X4 + 0.5) / 16 - 0.5
+        offset = np.tile(threshold, (-(-height // 4), -(-width // 4)))[:height, :width, None] * spread
+        jittered = Image.fromarray(np.clip(rgb + offset, 0, 255).astype(np.uint8), "RGB")
+        indexed = jittered.quantize(palette=indexed, dither=Image.Dither.NONE)
+    indices = np.asarray(indexed, dtype=np.uint8)
+    palette = np.array(indexed.getpalette()[:3 * (int(indices.max()) + 1)], dtype=np.uint16).reshape(-1, 3)
+    palette565 = ((palette[:, 0] >> 3) << 11) | ((palette[:, 1] >> 2) << 5) | (palette[:, 2] >> 3)
+    return palette565.astype('<u2').tobytes(), indices.tobytes()
+
+def decode_palette8(indices: bytes, palette: bytes) -> bytes:
+    """Reference decoder for PALETTE8: looks every index up in the RGB565 palette."""
+    return np.frombuffer(palette, dtype='<u2')[np.frombuffer(indices, dtype=np.uint8)].tobytes()
+
+def decode_rle565(data: bytes) -> bytes:
+    """Reference decoder for RGB565_RLE, mirrors the firmware."""
+    out = bytearray()
+    i = 0
+    while i < len(data):
+        header = data[i]
+        i += 1
+        count = (header & 0x7F) + 1
+        if header & 0x80:
+            out.extend(data[i:i+2] * count)
+            i += 2
+        else:
+            out.extend(data[i:i + 2 * count])
+            i += 2 * count
+    return bytes(out)
+
+def encode_art(image_data: bytes, format: int, chunk_size: int = 3072, size: tuple = (240,200),
+               transfer_id: int = 0) -> list[bytes | memoryview]:
+    if format == ArtFormat.JPEG:
+        return packetize_art(convert_image_to_jpeg(image_data, size), format, chunk_size, size, transfer_id)
+    if format == ArtFormat.PNG:
+        raise ValueError("PNG art isn't supported, no firmware decodes it")
     image_data_rgb565 = convert_image_to_rgb565(image_data, size)
+    if format == ArtFormat.PALETTE8:
+        palette, indices = quantize_rgb565(image_data_rgb565, size)
+        return packetize_art(indices, format, chunk_size, size, transfer_id, palette=palette)
+    return packetize_art(image_data_rgb565, format, chunk_size, size, transfer_id)
 
-    packets: list[bytes] = []
-    total_size = len(image_data_rgb565)
+def packetize_art(image_data_rgb565: bytes, format: int, chunk_size: int = 3072, size: tuple = (240,200),
+                  transfer_id: int = 0, nak: bool = False, scale: int = 1, palette: bytes = None) -> list[bytes | memoryview]:
+    """Splits already converted pixel data into ART_BEGIN/ART_CHUNK/ART_END frames tagged with `transfer_id`.
 
-    
+    `nak` adds the chunk size to ART_BEGIN, which asks the device to report missing chunks
+    (only for devices with CAP_ART_NAK, older firmware rejects the longer ART_BEGIN).
+    `scale` > 1 has the device draw every pixel as a scale x scale block (CAP_ART_PREVIEW).
+    For PALETTE8, the data are the indices and `palette` the palette from quantize_rgb565,
+    for JPEG the encoded image.
+    """
+    if format == ArtFormat.RGB565_RLE:
+        image_data_rgb565 = encode_rle565(image_data_rgb565)
+
+    packets: list[bytes | memoryview] = []
+    total_size = len(image_data_rgb565)
 
     begin_payload = bytearray()
     begin_payload.extend(total_size.to_bytes(4, 'little'))
@@ -104,28 +394,202 @@ def encode_art(image_data: bytes, format: int, chunk_size: int = 3072, size: tup
     begin_payload.extend(size[0].to_bytes(2, 'little'))
     begin_payload.extend(size[1].to_bytes(2, 'little'))
     begin_payload.append(format)
+    begin_payload.append(transfer_id & 0xFF)
+    if nak or scale > 1 or format == ArtFormat.PALETTE8:
+        begin_payload.extend((chunk_size if nak else 0).to_bytes(2, 'little'))
+    if scale > 1 or format == ArtFormat.PALETTE8:
+        begin_payload.append(scale)
+    if format == ArtFormat.PALETTE8:
+        begin_payload.extend(palette)
 
     packets.append(
         encode(ART_BEGIN, bytes(begin_payload))
     )
 
-    chunk_payload = bytearray()
-    offset = 0
-    while offset < total_size:
-        chunk = image_data_rgb565[offset:offset+chunk_size]
-        chunk_payload = bytearray()
-        chunk_payload.extend(offset.to_bytes(4, 'little'))
-        chunk_payload.extend(chunk)
-        packets.append(
-            encode(ART_CHUNK, bytes(chunk_payload))
-        )
-        offset += len(chunk)
-    
+    packets.extend(
+        encode_chunk_frames(ART_CHUNK, image_data_rgb565, chunk_size, bytes((transfer_id & 0xFF,)))
+    )
+
     packets.append(
-        encode(ART_END, b"")
+        encode(ART_END, bytes((transfer_id & 0xFF,)))
     )
     return packets
 
+def packetize_art_progressive(image_data_rgb565: bytes, format: int, chunk_size: int = 3072, size: tuple = (240,200),
+                              transfer_id: int = 0, nak: bool = False, scale: int = 8) -> list[bytes | memoryview]:
+    """Same as `packetize_art`, preceded by a preview downscaled by `scale` that the device scales back up.
+
+    Both go out as the same transfer, so a newer one pre-empts the full frame behind the preview.
+    For PALETTE8 and JPEG, combine packetize_art_preview with an encoded full frame instead.
+    """
+    return (packetize_art_preview(image_data_rgb565, format, size, transfer_id, scale)
+            + packetize_art(image_data_rgb565, format, chunk_size, size, transfer_id, nak))
+
+def packetize_art_preview(image_data_rgb565: bytes, format: int, size: tuple = (240,200), transfer_id: int = 0,
+                          scale: int = 8) -> list[bytes | memoryview]:
+    """Just the preview of `packetize_art_progressive`, for a full frame encoded separately.
+
+    A preview is never PALETTE8 or JPEG, those go out as RGB565_RLE.
+    """
+    preview, preview_size = downscale_rgb565(image_data_rgb565, size, scale)
+    if format in (ArtFormat.PALETTE8, ArtFormat.JPEG):
+        format = ArtFormat.RGB565_RLE
+    return packetize_art(preview, format, size=preview_size, transfer_id=transfer_id, scale=scale)
+
+# Art transfer format:
+# ART_BEGIN: [total_size:4][width:2][height:2][format:1][transfer_id:1]([chunk_size:2]([scale:1]))
+# ART_CHUNK: [offset:4][transfer_id:1][data]
+# ART_END:   [transfer_id:1]
+# Receivers drop chunks whose transfer_id isn't the one from the last ART_BEGIN, so a
+# superseded transfer can never draw into a newer one.
+# With chunk_size, the device answers every ART_END with ART_NAK (device -> host):
+# [transfer_id:1][chunk_count:2][bitmap], bit i (byte i // 8, LSB first) set = chunk i missing.
+# No bit set: complete and drawn. It doesn't draw while chunks are missing; the host resends
+# them followed by ART_END. chunk_count 0: the device never saw this transfer's ART_BEGIN
+# (or only the preview's, the last ART_BEGIN of that id didn't ask for ART_NAK).
+# With scale, width x height are the pixels sent; the device draws them scale times as large.
+# A preview (see packetize_art_progressive) is followed by a full ART_BEGIN of the same id.
+# PALETTE8 appends its palette, see quantize_rgb565.
+
+def decode_art_begin(payload: bytes) -> tuple[int, int, int, int, int, int, int, bytes] | None:
+    """Returns (total_size, width, height, format, transfer_id, chunk_size, scale, palette), None if malformed.
+
+    chunk_size is 0 if ART_BEGIN doesn't ask for ART_NAK, scale is 1 if it has none, palette
+    is empty unless the format is PALETTE8.
+    """
+    if len(payload) >= 10 and payload[8] == ArtFormat.PALETTE8:
+        if len(payload) < 15 or len(payload) > 13 + 512 or len(payload) % 2 == 0:
+            return None
+    elif len(payload) not in (10, 12, 13):
+        return None
+    return (
+        int.from_bytes(payload[0:4], 'little'),
+        int.from_bytes(payload[4:6], 'little'),
+        int.from_bytes(payload[6:8], 'little'),
+        payload[8],
+        payload[9],
+        int.from_bytes(payload[10:12], 'little') if len(payload) >= 12 else 0,
+        max(payload[12], 1) if len(payload) >= 13 else 1,
+        bytes(payload[13:]),
+    )
+
+def encode_art_nak(transfer_id: int, chunk_count: int, missing=()) -> bytes:
+    bitmap = bytearray((chunk_count + 7) // 8)
+    for i in missing:
+        bitmap[i >> 3] |= 1 << (i & 7)
+    return encode(ART_NAK, bytes((transfer_id & 0xFF,)) + chunk_count.to_bytes(2, 'little') + bytes(bitmap))
+
+def decode_art_nak(payload: bytes) -> tuple[int, int, list[int]] | None:
+    """Returns (transfer_id, chunk_count, missing chunk indices), None if malformed."""
+    if len(payload) < 3:
+        return None
+    count = int.from_bytes(payload[1:3], 'little')
+    bitmap = payload[3:]
+    if len(bitmap) != (count + 7) // 8:
+        return None
+    return payload[0], count, [i for i in range(count) if bitmap[i >> 3] >> (i & 7) & 1]
+
+ART_FRAME_TYPES = (ART_BEGIN, ART_CHUNK, ART_END, ART_TILE)
+
+def is_art_frame(frame: bytes) -> bool:
+    return frame[1] in ART_FRAME_TYPES
+
+def _rgb565_channels(pixels: np.ndarray) -> np.ndarray:
+    """Splits an (h, w) RGB565 array into an (h, w, 3) array of 5/6/5-bit channels."""
+    p = pixels.astype(np.int16)
+    return np.stack(((p >> 11) & 0x1F, (p >> 5) & 0x3F, p & 0x1F), axis=-1)
+
+def downscale_rgb565(pixels_rgb565: bytes, size: tuple, scale: int) -> tuple[bytes, tuple]:
+    """Averages `scale` x `scale` blocks of an RGB565 image, returns the pixels and their size.
+
+    Edge pixels that don't fill a whole block are dropped.
+    """
+    width, height = size
+    w, h = width // scale, height // scale
+    pixels = np.frombuffer(pixels_rgb565, dtype='<u2').reshape(height, width)[:h * scale, :w * scale]
+    channels = _rgb565_channels(pixels).reshape(h, scale, w, scale, 3).mean(axis=(1, 3)).round().astype(np.uint16)
+    out = (channels[..., 0] << 11) | (channels[..., 1] << 5) | channels[..., 2]
+    return out.astype('<u2').tobytes(), (w, h)
+
+def upscale_rgb565(pixels_rgb565: bytes, size: tuple, scale: int) -> bytes:
+    """Repeats every pixel of an RGB565 image as a `scale` x `scale` block, like the firmware draws a preview."""
+    width, height = size
+    pixels = np.frombuffer(pixels_rgb565, dtype='<u2').reshape(height, width)
+    return pixels.repeat(scale, axis=0).repeat(scale, axis=1).tobytes()
+
+def encode_art_delta(prev_rgb565: bytes, new_rgb565: bytes, size: tuple = (240,200), tile: tuple = (20,20),
+                     tolerance: int = 0, max_payload: int = 4096, transfer_id: int = 0) -> tuple[list[bytes], bytes]:
+    """Encodes only the tiles of `new_rgb565` that differ from `prev_rgb565` as ART_TILE frames.
+
+    A tile is dirty if any pixel differs by more than `tolerance` in any 5/6/5-bit channel.
+    Horizontally adjacent dirty tiles are merged into one frame while it fits in `max_payload`.
+    Returns the frames and the frame the device will hold afterwards (not always `new_rgb565`
+    when tolerance > 0), which should be passed as `prev_rgb565` next time.
+    """
+    width, height = size
+    tile_w, tile_h = tile
+    prev = np.frombuffer(prev_rgb565, dtype=np.uint16).reshape(height, width)
+    new = np.frombuffer(new_rgb565, dtype=np.uint16).reshape(height, width)
+
+    if tolerance > 0:
+        changed = (np.abs(_rgb565_channels(prev) - _rgb565_channels(new)) > tolerance).any(axis=-1)
+    else:
+        changed = prev != new
+
+    # Reduce the per-pixel mask to one flag per tile (edge tiles may be smaller)
+    row_starts = np.arange(0, height, tile_h)
+    col_starts = np.arange(0, width, tile_w)
+    dirty = np.logical_or.reduceat(changed, row_starts, axis=0)
+    dirty = np.logical_or.reduceat(dirty, col_starts, axis=1)
+
+    max_run = max(1, (max_payload - 9) // (tile_w * tile_h * 2))
+    result = prev.copy()
+    packets: list[bytes] = []
+    for ty in range(len(row_starts)):
+        tx = 0
+        while tx < len(col_starts):
+            if not dirty[ty, tx]:
+                tx += 1
+                continue
+            run = 1
+            while tx + run < len(col_starts) and dirty[ty, tx + run] and run < max_run:
+                run += 1
+            x = int(col_starts[tx])
+            y = int(row_starts[ty])
+            w = min(run * tile_w, width - x)
+            h = min(tile_h, height - y)
+            block = new[y:y+h, x:x+w]
+            result[y:y+h, x:x+w] = block
+
+            payload = bytearray()
+            payload.extend(x.to_bytes(2, 'little'))
+            payload.extend(y.to_bytes(2, 'little'))
+            payload.extend(w.to_bytes(2, 'little'))
+            payload.extend(h.to_bytes(2, 'little'))
+            payload.append(transfer_id & 0xFF)
+            payload.extend(block.astype('<u2').tobytes())
+            packets.append(encode(ART_TILE, bytes(payload)))
+            tx += run
+
+    return packets, result.tobytes()
+
+# ART_TILE format:
+# [x:2][y:2][w:2][h:2][transfer_id:1][w*h RGB565 pixels], x/y relative to the top left of the last ART_BEGIN image
+
+def apply_art_tile(frame: bytearray, size: tuple, payload: bytes):
+    """Reference decoder for ART_TILE: writes the tile into an RGB565 `frame` of `size`."""
+    width, height = size
+    x = int.from_bytes(payload[0:2], 'little')
+    y = int.from_bytes(payload[2:4], 'little')
+    w = int.from_bytes(payload[4:6], 'little')
+    h = int.from_bytes(payload[6:8], 'little')
+    if len(payload) - 9 != w * h * 2 or x + w > width or y + h > height:
+        raise ValueError("Malformed ART_TILE payload")
+    for row in range(h):
+        src = 9 + row * w * 2
+        dst = ((y + row) * width + x) * 2
+        frame[dst:dst + w * 2] = payload[src:src + w * 2]
+
 def encode_timeline(position_s: int, duration_s: int) -> bytes:
     payload = bytearray()
     pos = min(position_s, 4294967295) # 4 bytes max
@@ -134,6 +598,31 @@ def encode_timeline(position_s: int, duration_s: int) -> bytes:
     payload.extend(dur.to_bytes(4, 'little'))
     return encode(TIMELINE, bytes(payload))
 
+# TIMELINE_SYNC format:
+# [position_ms:4][duration_ms:4][rate:2][seq:2]
+# rate is the playback rate in thousandths (1000 = normal speed, 0 = paused). The device moves
+# the bar on its own from the time it received the frame, and ignores frames older than the
+# last `seq` it applied (wrapping 16-bit comparison).
+
+def encode_timeline_sync(position_ms: int, duration_ms: int, rate: float, seq: int) -> bytes:
+    payload = bytearray()
+    payload.extend(max(0, min(position_ms, 4294967295)).to_bytes(4, 'little'))
+    payload.extend(max(0, min(duration_ms, 4294967295)).to_bytes(4, 'little'))
+    payload.extend(max(0, min(round(rate * 1000), 65535)).to_bytes(2, 'little'))
+    payload.extend((seq & 0xFFFF).to_bytes(2, 'little'))
+    return encode(TIMELINE_SYNC, bytes(payload))
+
+def decode_timeline_sync(payload: bytes) -> tuple[int, int, float, int] | None:
+    """Returns (position_ms, duration_ms, rate, seq), None if malformed."""
+    if len(payload) != 12:
+        return None
+    return (
+        int.from_bytes(payload[0:4], 'little'),
+        int.from_bytes(payload[4:8], 'little'),
+        int.from_bytes(payload[8:10], 'little') / 1000,
+        int.from_bytes(payload[10:12], 'little'),
+    )
+
 # From winrt:
 # Closed 	0
 # Opened 	1
@@ -147,5 +636,309 @@ def encode_playback(state: int) -> bytes:
     payload.append(state & 0xFF) # 1 byte
     return encode(PLAYBACK_STATE, bytes(payload))
 
+_SOF_ANY = re.compile(b"[%c%c]" % (SOF_V2, SOF))
+
+class FrameDecoder:
+    """Incremental decoder for v1 and v2 frames (see encode_v2), mirrors the firmware `parseByte`.
+
+    Feed it arbitrary chunks of bytes and iterate the result for `(msg_type, payload)` tuples:
+
+        decoder = FrameDecoder()
+        for msg_type, payload in decoder.feed(data):
+            ...
+
+    Frames are located with a regex search for either SOF, and a frame with a bad checksum or an
+    oversized length resyncs from the byte after its SOF. Partial frames stay in the buffer
+    and are only parsed again once enough bytes have arrived to complete them.
+    Bytes that are not part of a valid frame (e.g. firmware debug prints) are passed
+    to `on_skipped` if given. `max_version=1` parses v1 frames only, like old firmware.
+
+    `version` is the version of the last frame. v2 sequence numbers are checked as frames
+    arrive: a gap adds to `seq_lost`, a frame older than the last one counts in `seq_late`
+    (both are still yielded, the handlers decide what to do with them).
+    """
+
+    def __init__(self, max_payload: int = 4096, on_skipped=None, max_version: int = PROTOCOL_VERSION):
+        self.max_payload = max_payload
+        self.on_skipped = on_skipped
+        self._sof = _SOF_ANY if max_version >= 2 else re.compile(b"%c" % SOF)
+        self._buf = bytearray()
+        self._pos = 0
+        self._need = 0 # Bytes needed at _pos before parsing can continue, 0 while looking for SOF
+
+        self.version = None
+        self.seq = None # Of the last v2 frame
+        self.frames = 0
+        self.crc_errors = 0
+        self.oversized = 0
+        self.skipped = 0 # Bytes discarded while searching for SOF
+        self.seq_lost = 0
+        self.seq_late = 0
+
+    def feed(self, data: bytes):
+        """Buffers `data` and returns an iterator over the frames completed so far."""
+        self._buf += data
+        return self._drain()
+
+    def _drain(self):
+        buf = self._buf
+        while True:
+            if not self._need:
+                match = self._sof.search(buf, self._pos)
+                if match is None:
+                    self._skip(len(buf))
+                    break
+                self._skip(match.start())
+                self._need = 6 if buf[self._pos] == SOF_V2 else 4 # Header up to LEN
+            pos = self._pos
+            if len(buf) - pos < self._need:
+                break
+
+            v2 = buf[pos] == SOF_V2
+            header = 6 if v2 else 4
+            length = buf[pos + header - 2] | (buf[pos + header - 1] << 8)
+            if length > self.max_payload:
+                self.oversized += 1
+                self._need = 0
+                self._skip(pos + 1)
+                continue
+            size = header + length + (2 if v2 else 1)
+            if len(buf) - pos < size:
+                self._need = size # Don't look at this frame again until it is complete
+                break
+
+            msg_type = buf[pos + 1]
+            payload = bytes(buf[pos + header:pos + header + length])
+            if v2:
+                valid = crc16(buf[pos:pos + header + length]) == buf[pos + size - 2] | (buf[pos + size - 1] << 8)
+            else:
+                valid = SOF ^ msg_type ^ buf[pos + 2] ^ buf[pos + 3] ^ _crc(payload) == buf[pos + size - 1]
+            if not valid:
+                self.crc_errors += 1
+                self._need = 0
+                self._skip(pos + 1)
+                continue
+
+            self._pos = pos + size
+            self._need = 0
+            self.frames += 1
+            self.version = 2 if v2 else 1
+            if v2:
+                self._sequence(buf[pos + 2] | (buf[pos + 3] << 8))
+            yield msg_type, payload
+
+        # Drop consumed bytes, only moving the tail once it is worth it
+        if self._pos == len(buf):
+            buf.clear()
+            self._pos = 0
+        elif self._pos > 65536 or self._pos > len(buf) // 2:
+            del buf[:self._pos]
+            self._pos = 0
+
+    def _sequence(self, seq: int):
+        if self.seq is not None:
+            gap = (seq - self.seq - 1) & 0xFFFF
+            if gap >= 0x8000:
+                self.seq_late += 1
+                return
+            self.seq_lost += gap
+        self.seq = seq
+
+    def _skip(self, to: int):
+        if to > self._pos:
+            self.skipped += to - self._pos
+            if self.on_skipped:
+                self.on_skipped(bytes(self._buf[self._pos:to]))
+        self._pos = to
+
+def _id_newer(a: int, b: int) -> bool:
+    """True if 8-bit transfer id `a` is newer than `b` (wraps around)."""
+    return 0 < ((a - b) & 0xFF) < 128
+
+class ArtReceiver:
+    """Reference receiver for art messages, mirrors the firmware handleArt* functions.
+
+    Holds the RGB565 image currently on screen in `frame`. Chunks and ART_END for any transfer
+    other than the last ART_BEGIN are counted in `stale` and ignored; a tile with a newer id
+    starts a new generation. `on_draw(transfer_id)` is called whenever the screen changes.
+
+    If ART_BEGIN carries a chunk size, every ART_END is answered with an ART_NAK frame passed
+    to `send`, and the image is only drawn once no chunk is missing. With a scale, the image is
+    scaled up before it is drawn, `frame` and `size` are always what is on screen.
+    """
+
+    MAX_TOTAL = 1024 * 300 # Same limits as the firmware
+    MAX_NAK_CHUNKS = 4096
+
+    def __init__(self, on_draw=None, send=None):
+        self.on_draw = on_draw
+        self.send = send
+        self.frame: bytearray = None
+        self.size: tuple = None
+        self._scale = 1 # From ART_BEGIN
+        self._palette = b"" # From ART_BEGIN, PALETTE8 only
+        self.transfer_id: int = None
+        self.format: int = None
+        self._buf: bytearray = None
+        self._active = False
+        self._chunk_size = 0 # From ART_BEGIN, 0 = no ART_NAK
+        self._chunk_count = 0
+        self._missing: set[int] = None # Chunk indices not received yet
+        self._done = False # The current transfer was drawn
+
+        self.draws = 0
+        self.stale = 0
+        self.naks = 0 # ART_NAK replies with missing chunks
+
+    def handle(self, msg_type: int, payload: bytes) -> bool:
+        """Processes one message, returns False if it isn't an art message."""
+        if msg_type == ART_BEGIN:
+            self._begin(payload)
+        elif msg_type == ART_CHUNK:
+            self._chunk(payload)
+        elif msg_type == ART_END:
+            self._end(payload)
+        elif msg_type == ART_TILE:
+            self._tile(payload)
+        else:
+            return False
+        return True
+
+    def _begin(self, payload: bytes):
+        self._buf = None
+        self._active = False
+        self._done = False
+        self._missing = None
+        begin = decode_art_begin(payload)
+        if begin is None:
+            return
+        total, width, height, self.format, self.transfer_id, self._chunk_size, self._scale, self._palette = begin
+        if total > self.MAX_TOTAL:
+            return
+        self.size = (width * self._scale, height * self._scale)
+        self._buf = bytearray(total)
+        self._active = True
+        if self._chunk_size:
+            self._chunk_count = -(-total // self._chunk_size)
+            if self._chunk_count <= self.MAX_NAK_CHUNKS:
+                self._missing = set(range(self._chunk_count))
+
+    def _chunk(self, payload: bytes):
+        if len(payload) < 6:
+            return
+        if payload[4] != self.transfer_id:
+            self.stale += 1
+            return
+        if not self._active:
+            return
+        offset = int.from_bytes(payload[0:4], 'little')
+        data = payload[5:]
+        if offset + len(data) <= len(self._buf):
+            self._buf[offset:offset + len(data)] = data
+            if self._missing is not None and offset % self._chunk_size == 0:
+                self._missing.discard(offset // self._chunk_size)
+
+    def _end(self, payload: bytes):
+        if len(payload) != 1:
+            return
+        transfer_id = payload[0]
+        if transfer_id != self.transfer_id:
+            self.stale += 1
+            if self.transfer_id is None or _id_newer(transfer_id, self.transfer_id):
+                self._reply(encode_art_nak(transfer_id, 0)) # Its ART_BEGIN never arrived
+            return
+        if not self._active:
+            if self._done and self._missing is not None:
+                self._reply(encode_art_nak(transfer_id, self._chunk_count)) # Our answer got lost
+            elif not self._chunk_size:
+                self._reply(encode_art_nak(transfer_id, 0)) # Only its preview arrived, not the full ART_BEGIN
+            return
+        if self._missing:
+            self.naks += 1
+            self._reply(encode_art_nak(transfer_id, self._chunk_count, self._missing))
+            return # Keep the buffer, the host resends the missing chunks
+        self._active = False
+        self._done = True
+        pixels = self._decode(bytes(self._buf))
+        self._buf = None
+        width, height = self.size[0] // self._scale, self.size[1] // self._scale
+        if pixels is not None and len(pixels) == width * height * 2:
+            if self._scale > 1:
+                pixels = upscale_rgb565(pixels, (width, height), self._scale)
+            self._draw(bytearray(pixels))
+        if self._missing is not None:
+            self._reply(encode_art_nak(transfer_id, self._chunk_count))
+
+    def _reply(self, frame: bytes):
+        if self.send:
+            self.send(frame)
+
+    def _decode(self, data: bytes) -> bytes | None:
+        if self.format == ArtFormat.RGB565:
+            return data
+        if self.format == ArtFormat.RGB565_RLE:
+            return decode_rle565(data)
+        if self.format == ArtFormat.JPEG:
+            return decode_jpeg(data, (self.size[0] // self._scale, self.size[1] // self._scale))
+        if self.format == ArtFormat.PALETTE8 and self._palette:
+            if data and np.frombuffer(data, dtype=np.uint8).max() >= len(self._palette) // 2:
+                return None # Index outside the palette, the firmware draws nothing either
+            return decode_palette8(data, self._palette)
+        return None
+
+    def _tile(self, payload: bytes):
+        if len(payload) < 9 or self.frame is None:
+            return
+        tile_id = payload[8]
+        if tile_id != self.transfer_id:
+            if not _id_newer(tile_id, self.transfer_id):
+                self.stale += 1
+                return
+            # A newer delta generation supersedes any transfer still in progress
+            self.transfer_id = tile_id
+            self._buf = None
+            self._active = False
+            self._done = False
+            self._missing = None
+        apply_art_tile(self.frame, self.size, payload)
+        self.draws += 1
+        if self.on_draw:
+            self.on_draw(self.transfer_id)
+
+    def _draw(self, pixels: bytearray):
+        self.frame = pixels
+        self.draws += 1
+        if self.on_draw:
+            self.on_draw(self.transfer_id)
+
+# CREDIT format (device -> host):
+# [credit_bytes:4], bytes the host may send on top of its current window
+
+def encode_credit(credit_bytes: int) -> bytes:
+    return encode(CREDIT, credit_bytes.to_bytes(4, 'little'))
+
+def decode_credit(payload: bytes) -> int:
+    return int.from_bytes(payload[:4], 'little')
+
+# CAPS format (device -> host, sent on connect before the first CREDIT):
+# [version:1][flags:2], the highest frame version the device parses and its CAP_* flags.
+# Receivers ignore any bytes after these, for later fields.
+# The host opens every connection with HELLO (no payload, always v1). Over serial the port can
+# reopen without the board resetting, so the firmware answers HELLO like a boot: it forgets the
+# sequence numbers and credit of the old host and sends CAPS and a full CREDIT window. The WiFi
+# firmware already does that for every new client and ignores HELLO, as does older firmware.
+
+def encode_hello() -> bytes:
+    return encode(HELLO, b"")
+
+def encode_caps(version: int, flags: int) -> bytes:
+    return encode(CAPS, bytes((version,)) + flags.to_bytes(2, 'little'))
+
+def decode_caps(payload: bytes) -> tuple[int, int] | None:
+    """Returns (version, flags), None if malformed."""
+    if len(payload) < 3:
+        return None
+    return payload[0], int.from_bytes(payload[1:3], 'little')
+
 if __name__ == '__main__':
     pass
\ No newline at end of file
@@ -0,0 +1,171 @@
+import asyncio
+import time
+from collections import deque
+
+from packet_encoder import META, PLAYBACK_STATE, TIMELINE, TIMELINE_SYNC
+
+# Priority classes, lower value goes first
+PRIO_PLAYBACK = 0
+PRIO_META = 1
+PRIO_TIMELINE = 2
+PRIO_ART = 3
+PRIO_NAMES = ("playback", "meta", "timeline", "art")
+
+def priority_of(frame: bytes) -> int:
+    """Classifies a frame by its TYPE byte. Anything unknown is treated as bulk (art)."""
+    msg_type = frame[1]
+    if msg_type == PLAYBACK_STATE:
+        return PRIO_PLAYBACK
+    if msg_type == META:
+        return PRIO_META
+    if msg_type == TIMELINE or msg_type == TIMELINE_SYNC:
+        return PRIO_TIMELINE
+    return PRIO_ART
+
+class TxScheduler:
+    """Priority queue of outgoing frames: playback state > metadata > timeline > art.
+
+    Each frame is its own unit, so art chunks are interleaved with higher priority frames at
+    chunk boundaries. Only the newest pending timeline frame is kept (older positions are stale).
+    Per-class depth and enqueue-to-wire latency are tracked; with `prioritize=False` it degrades
+    to a plain FIFO, for comparison.
+    """
+
+    def __init__(self, prioritize: bool = True, max_samples: int = 4096):
+        self.prioritize = prioritize
+        self._queues = [deque() for _ in PRIO_NAMES]
+        self._ready = asyncio.Event()
+        self.queued_bytes = 0
+
+        self.enqueued = [0] * len(PRIO_NAMES)
+        self.sent = [0] * len(PRIO_NAMES)
+        self.coalesced = [0] * len(PRIO_NAMES)
+        self.latencies = [deque(maxlen=max_samples) for _ in PRIO_NAMES] # Seconds, enqueue to wire
+
+    def put(self, frame: bytes, priority: int = None, trace=None):
+        """Queues `frame`. Must be called on the event loop thread."""
+        if priority is None:
+            priority = priority_of(frame)
+        queue = self._queues[priority if self.prioritize else PRIO_ART]
+        item = (time.perf_counter(), priority, frame, trace)
+        self.enqueued[priority] += 1
+        self.queued_bytes += len(frame)
+
+        if priority == PRIO_TIMELINE and self.prioritize:
+            # Coalesce: replace the pending timeline frame instead of queueing another
+            if queue:
+                _, _, replaced_frame, replaced = queue[-1]
+                queue[-1] = item
+                self.queued_bytes -= len(replaced_frame)
+                self.coalesced[priority] += 1
+                if replaced:
+                    replaced.dropped()
+                return
+        queue.append(item)
+        self._ready.set()
+
+    async def get(self) -> tuple[float, int, bytes, object]:
+        """Waits for and returns the next `(enqueued, priority, frame, trace)` to send."""
+        while True:
+            for queue in self._queues:
+                if queue:
+                    item = queue.popleft()
+                    self.queued_bytes -= len(item[2])
+                    return item
+            self._ready.clear()
+            await self._ready.wait()
+
+    async def wait(self, timeout: float) -> bool:
+        """Waits up to `timeout` seconds for a frame to be queued, returns whether one is."""
+        if self.qsize():
+            return True
+        self._ready.clear()
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def urgent(self) -> bool:
+        """True if a frame of a class ahead of art is queued, never as a FIFO."""
+        return any(self._queues[:PRIO_ART])
+
+    def peek(self) -> tuple[float, int, bytes, object] | None:
+        """The item `get_nowait` would return next, without removing it."""
+        for queue in self._queues:
+            if queue:
+                return queue[0]
+        return None
+
+    def get_nowait(self, max_bytes: int = None) -> tuple[float, int, bytes, object] | None:
+        """Returns the next item if one is queued (and fits in `max_bytes`), else None."""
+        for queue in self._queues:
+            if queue:
+                if max_bytes is not None and len(queue[0][2]) > max_bytes:
+                    return None
+                item = queue.popleft()
+                self.queued_bytes -= len(item[2])
+                return item
+        return None
+
+    def record_sent(self, enqueued: float, priority: int):
+        self.sent[priority] += 1
+        self.latencies[priority].append(time.perf_counter() - enqueued)
+
+    def clear(self):
+        for queue in self._queues:
+            for item in queue:
+                if item[3]:
+                    item[3].dropped()
+            queue.clear()
+        self.queued_bytes = 0
+
+    def drop(self, predicate) -> int:
+        """Removes pending frames for which `predicate(frame)` is true, returns how many."""
+        dropped = 0
+        for i, queue in enumerate(self._queues):
+            kept = deque()
+            for item in queue:
+                if not predicate(item[2]):
+                    kept.append(item)
+                    continue
+                self.queued_bytes -= len(item[2])
+                if item[3]:
+                    item[3].dropped()
+            dropped += len(queue) - len(kept)
+            self._queues[i] = kept
+        return dropped
+
+    def qsize(self) -> int:
+        return sum(len(q) for q in self._queues)
+
+    def oldest(self) -> float | None:
+        """perf_counter() time the oldest pending frame was queued, None if nothing is."""
+        heads = [queue[0][0] for queue in self._queues if queue]
+        return min(heads) if heads else None
+
+    def depths(self) -> dict:
+        depth = {name: 0 for name in PRIO_NAMES}
+        for queue in self._queues:
+            for _, priority, _, _ in queue:
+                depth[PRIO_NAMES[priority]] += 1
+        return depth
+
+    def stats(self) -> dict:
+        depths = self.depths()
+        result = {}
+        for i, name in enumerate(PRIO_NAMES):
+            lat = sorted(self.latencies[i])
+            def pct(p):
+                return lat[min(len(lat) - 1, int(p * len(lat)))] * 1000 if lat else 0.0
+            result[name] = {
+                "depth": depths[name],
+                "enqueued": self.enqueued[i],
+                "sent": self.sent[i],
+                "coalesced": self.coalesced[i],
+                "latency_ms_p50": pct(0.50),
+                "latency_ms_p95": pct(0.95),
+                "latency_ms_p99": pct(0.99),
+                "latency_ms_max": lat[-1] * 1000 if lat else 0.0,
+            }
+        return result
@@ -0,0 +1,115 @@
+"""Full art transfers over a link that corrupts bytes, with and without ART_NAK retransmission.
+
+The firmware simulator's input is corrupted before parsing: each byte has its bit flipped with
+the given probability, so frames fail their checksum and get dropped (or, hit in the length,
+take their neighbours with them). Without ART_NAK the device draws whatever arrived; with it,
+it reports the missing chunks at ART_END and the Link resends only those.
+Reports intact / damaged / missing covers, time from queueing to an intact cover, and the
+bytes resent.
+
+Run from the repo root: python test_codes/bench_art_nak.py [--error-rates 0,1e-5,1e-4,3e-4]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from device_sim import DeviceSimulator
+from packet_encoder import packetize_art, convert_image_to_rgb565, ArtFormat, CAP_TIMELINE_SYNC, CAP_ART_NAK
+from transport import Link, TcpTransport
+from bench_device_latency import start_simulator, pct
+from bench_suite import make_thumbnail, ART_SIZE
+
+def corrupting(feed, error_rate: float, seed: int = 0):
+    """Wraps `DeviceSimulator.feed` to flip one random bit in a share `error_rate` of the bytes."""
+    rng = np.random.default_rng(seed)
+    counts = {"bytes": 0, "corrupted": 0}
+
+    def corrupted_feed(data: bytes) -> bytes:
+        buf = np.frombuffer(data, dtype=np.uint8).copy()
+        hits = np.flatnonzero(rng.random(len(buf)) < error_rate)
+        buf[hits] ^= (1 << rng.integers(0, 8, len(hits))).astype(np.uint8)
+        counts["bytes"] += len(buf)
+        counts["corrupted"] += len(hits)
+        return feed(buf.tobytes())
+
+    return corrupted_feed, counts
+
+async def run(nak: bool, error_rate: float, transfers: int, rate: float, timeout: float) -> dict:
+    pixels = convert_image_to_rgb565(make_thumbnail(600, "JPEG"), ART_SIZE)
+    drawn = {} # transfer id -> (time, intact) of its first draw
+
+    def on_visible(event):
+        if event.kind == "art" and event.detail not in drawn:
+            drawn[event.detail] = (event.time, bytes(sim.art.frame) == pixels)
+
+    caps = CAP_TIMELINE_SYNC | (CAP_ART_NAK if nak else 0)
+    sim = DeviceSimulator(consume_rate=rate, on_visible=on_visible, caps=caps)
+    sim.feed, corruption = corrupting(sim.feed, error_rate)
+    loop = asyncio.get_running_loop()
+    link = Link(TcpTransport(*start_simulator(sim, "tcp")), loop, max_queue_bytes=None)
+    link.start()
+    await link.connected.wait()
+    await link.credit_window.acquire(0)
+
+    latency, art_bytes = [], 0
+    for _ in range(transfers):
+        transfer_id = link.begin_art()
+        frames = packetize_art(pixels, ArtFormat.RGB565, size=ART_SIZE, transfer_id=transfer_id,
+                               nak=link.supports(CAP_ART_NAK))
+        start = time.perf_counter()
+        for frame in frames:
+            link.send(frame)
+        art_bytes += sum(map(len, frames))
+        while transfer_id not in drawn and time.perf_counter() - start < timeout:
+            await asyncio.sleep(0.005)
+        if transfer_id in drawn and drawn[transfer_id][1]:
+            latency.append((drawn[transfer_id][0] - start) * 1000)
+    await asyncio.sleep(0.2)
+    link.task.cancel()
+
+    intact = sum(1 for _, ok in drawn.values() if ok)
+    device = sim.stats()
+    return {
+        "nak": nak, "error_rate": error_rate, "transfers": transfers,
+        "bytes_corrupted": corruption["corrupted"],
+        "intact": intact, "damaged": len(drawn) - intact, "missing": transfers - len(drawn),
+        "ms_p50": pct(latency, 0.50), "ms_p95": pct(latency, 0.95), "ms_max": max(latency, default=0.0),
+        "art_bytes": art_bytes, "bytes_resent": link.art_bytes_resent,
+        "chunks_resent": link.art_chunks_resent, "naks": link.art_naks, "gave_up": link.art_resends_failed,
+        "device_crc_errors": device["crc_errors"], "device_seq_lost": device["seq_lost"],
+    }
+
+async def main(args) -> list[dict]:
+    results = []
+    for error_rate in args.error_rates:
+        for nak in (False, True):
+            results.append(await run(nak, error_rate, args.transfers, args.rate, args.timeout))
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--error-rates", type=lambda s: [float(x) for x in s.split(",")], default=[0, 1e-5, 1e-4, 3e-4],
+                        help="share of received bytes with a flipped bit")
+    parser.add_argument("--transfers", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=1000000, help="simulated device consume rate, bytes/s")
+    parser.add_argument("--timeout", type=float, default=5.0, help="seconds to wait for each cover")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args))
+    print(f"\n{'error rate':>10} {'NAK':>4} {'intact':>7} {'damaged':>7} {'missing':>7} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'max ms':>7} {'resent':>9} {'of art':>7} {'gave up':>7}")
+    for r in results:
+        print(f"{r['error_rate']:>10g} {'on' if r['nak'] else 'off':>4} {r['intact']:>7} {r['damaged']:>7} {r['missing']:>7} "
+              f"{r['ms_p50']:>7.0f} {r['ms_p95']:>7.0f} {r['ms_max']:>7.0f} {r['bytes_resent']:>9} "
+              f"{r['bytes_resent'] / r['art_bytes']:>7.1%} {r['gave_up']:>7}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
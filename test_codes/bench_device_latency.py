@@ -0,0 +1,127 @@
+"""Host-event-to-pixels latency and bytes per update, against the firmware simulator.
+
+device_sim runs on its own thread and event loop (it blocks while "drawing", like the board),
+serving TCP on loopback or a pty. The host side is a regular Link: each update is timestamped
+when it is queued and matched to the simulator's visible event for it.
+
+Run from the repo root: python test_codes/bench_device_latency.py [--transport tcp|pty] [--rate BYTES_PER_S]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from device_sim import DeviceSimulator, serve_tcp, open_pty, WIDTH
+from packet_encoder import encode_meta, encode_playback, encode_timeline, convert_image_to_rgb565, packetize_art, encode_art_delta, ArtFormat
+from transport import Link, SerialTransport, TcpTransport
+
+ART_SIZE = (240, 200)
+
+def start_simulator(sim: DeviceSimulator, transport: str) -> str | tuple:
+    """Runs the simulator on a background loop, returns where to connect."""
+    ready = threading.Event()
+    where = []
+
+    async def run():
+        if transport == "tcp":
+            server = await serve_tcp(sim, "127.0.0.1", 0)
+            where.append(server.sockets[0].getsockname()[:2])
+        else:
+            where.append(open_pty(sim))
+        ready.set()
+        await asyncio.Event().wait()
+
+    threading.Thread(target=asyncio.run, args=(run(),), daemon=True).start()
+    ready.wait()
+    return where[0]
+
+def pct(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+async def run(transport: str, rate: float, tracks: int) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, "images", "readme_demo.jpg"), "rb") as f:
+        base = convert_image_to_rgb565(f.read(), ART_SIZE)
+
+    visible = {} # (kind, detail) -> times seen, oldest first
+    sim = DeviceSimulator(consume_rate=rate, on_visible=lambda e: visible.setdefault((e.kind, e.detail), deque()).append(e.time))
+    where = start_simulator(sim, transport)
+    loop = asyncio.get_running_loop()
+    link = Link(TcpTransport(*where) if transport == "tcp" else SerialTransport(where), loop)
+    link.start()
+    await link.connected.wait()
+    await link.credit_window.acquire(0)
+
+    sent = [] # (kind, detail, host time)
+    async def update(kind, detail, frames):
+        sent.append((kind, detail, time.perf_counter()))
+        for frame in frames:
+            link.send(frame)
+
+    prev = None
+    for i in range(tracks):
+        # A new track: metadata, full art (every other track reuses the image with a small change,
+        # which goes out as tiles), then a few seconds of timeline ticks
+        await update("meta", f"Track {i}", [encode_meta(f"Track {i}", "Artist", "Album")])
+        transfer_id = link.begin_art()
+        pixels = bytearray(base)
+        pixels[i * 480:(i + 1) * 480] = bytes(480) # Unique per track
+        if prev is None or i % 2 == 0:
+            frames = packetize_art(bytes(pixels), ArtFormat.RGB565_RLE, size=ART_SIZE, transfer_id=transfer_id)
+        else:
+            frames, _ = encode_art_delta(prev, bytes(pixels), ART_SIZE, transfer_id=transfer_id)
+        prev = bytes(pixels)
+        await update("art", transfer_id, [bytes(f) for f in frames])
+        for s in range(1, 5):
+            await asyncio.sleep(0.1)
+            await update("timeline", s * WIDTH // 200, [encode_timeline(s, 200)])
+        await update("playback", 5, [encode_playback(5)])
+        await asyncio.sleep(0.1)
+        await update("playback", 4, [encode_playback(4)])
+        await asyncio.sleep(0.2)
+
+    await asyncio.sleep(1.0)
+    link.task.cancel()
+
+    latency = {}
+    for kind, detail, t in sent:
+        seen = visible.get((kind, detail))
+        if seen:
+            latency.setdefault(kind, []).append((seen.popleft() - t) * 1000)
+    stats = sim.stats()
+    result = {"transport": transport, "device_rate_Bps": rate, "kinds": {}}
+    for kind, values in latency.items():
+        result["kinds"][kind] = {
+            "updates": len(values),
+            "latency_ms_p50": pct(values, 0.50),
+            "latency_ms_p95": pct(values, 0.95),
+            "latency_ms_max": max(values),
+            "bytes_per_update": stats["updates"][kind]["bytes_per_update"],
+        }
+    result["device"] = {k: v for k, v in stats.items() if k != "updates"}
+    return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transport", choices=["tcp", "pty"], default="tcp")
+    parser.add_argument("--rate", type=float, default=92160, help="simulated device consume rate, bytes/s")
+    parser.add_argument("--tracks", type=int, default=10)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    r = asyncio.run(run(args.transport, args.rate, args.tracks))
+    print(f"\n{r['transport']}, device rate {args.rate / 1000:.1f} kB/s")
+    print(f"{'update':<10} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'bytes/update':>13}")
+    for kind, k in r["kinds"].items():
+        print(f"{kind:<10} {k['updates']:>6} {k['latency_ms_p50']:>8.1f} {k['latency_ms_p95']:>8.1f} "
+              f"{k['latency_ms_max']:>8.1f} {k['bytes_per_update']:>13.0f}")
+    print(f"device: {r['device']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(r, f, indent=2)
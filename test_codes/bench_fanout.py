@@ -0,0 +1,128 @@
+"""How far one host process scales across many desk-things.
+
+Starts N firmware simulators on loopback TCP, plus one slow device (a low consume rate, so
+its queue overflows) and one that never accepts the connection. A LinkGroup fans out one
+encode per track to all of them. Reports the host thread's CPU time, art latency on the
+healthy devices (queued to drawn), and the queue lag and discarded frames of the bad ones.
+
+Run from the repo root: python test_codes/bench_fanout.py [--devices 1,4,16,32] [--tracks 20]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from art_cache import ArtCache
+from device_sim import DeviceSimulator
+from media_controller import encode_art_update
+from packet_encoder import encode_meta, encode_timeline
+from transport import Link, LinkGroup, TcpTransport
+from bench_device_latency import start_simulator, pct
+from bench_replay import make_thumbnails
+
+def closed_port() -> tuple[str, int]:
+    """A loopback address nothing listens on."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()
+
+async def run(devices: int, tracks: int, interval: float, rate: float, slow_rate: float) -> dict:
+    loop = asyncio.get_running_loop()
+    drawn = {} # (device, transfer id) -> time the art was drawn
+
+    def on_visible(device):
+        def record(event):
+            if event.kind == "art":
+                drawn[(device, event.detail)] = event.time
+        return record
+
+    sims = [DeviceSimulator(consume_rate=rate, on_visible=on_visible(i)) for i in range(devices)]
+    sims.append(DeviceSimulator(consume_rate=slow_rate, on_visible=on_visible(devices)))
+    links = [Link(TcpTransport(*start_simulator(sim, "tcp")), loop) for sim in sims]
+    links.append(Link(TcpTransport(*closed_port()), loop))
+    group = LinkGroup(links)
+    group.start()
+    await asyncio.gather(*(link.connected.wait() for link in links[:-1]))
+
+    thumbs = make_thumbnails(tracks)
+    art_cache = ArtCache()
+    sent = {} # transfer id -> time queued
+    lag = {"slow": 0.0, "dead": 0.0}
+    encode_s = 0.0
+    cpu = time.thread_time()
+    start = time.perf_counter()
+    for i in range(tracks):
+        group.send(encode_meta(f"Track {i}", "Artist", f"Album {i}"))
+        transfer_id = group.begin_art()
+        t = time.perf_counter()
+        frames, art_frame = encode_art_update(art_cache, thumbs[i], group.art_frame, transfer_id)
+        encode_s += time.perf_counter() - t
+        group.art_frame = art_frame
+        sent[transfer_id] = time.perf_counter()
+        for frame in frames:
+            group.send(bytes(frame))
+        for s in range(int(interval / 0.1)):
+            await asyncio.sleep(0.1)
+            group.send(encode_timeline(s, 200))
+            stats = group.stats()["devices"]
+            lag["slow"] = max(lag["slow"], stats[devices]["lag_ms"])
+            lag["dead"] = max(lag["dead"], stats[devices + 1]["lag_ms"])
+    wall = time.perf_counter() - start
+    cpu = time.thread_time() - cpu
+    await asyncio.sleep(1.0)
+    for link in links:
+        link.task.cancel()
+
+    latency = [(drawn[(d, tid)] - t) * 1000 for d in range(devices) for tid, t in sent.items() if (d, tid) in drawn]
+    stats = group.stats()["devices"]
+    healthy = stats[:devices]
+    return {
+        "devices": devices,
+        "tracks": tracks,
+        "encodes": tracks,
+        "encode_ms": encode_s * 1000,
+        "host_cpu_percent": cpu / wall * 100,
+        "art_drawn": len(latency),
+        "art_expected": devices * tracks,
+        "art_latency_ms_p50": pct(latency, 0.50),
+        "art_latency_ms_p95": pct(latency, 0.95),
+        "art_latency_ms_max": max(latency, default=0.0),
+        "bytes_sent_per_device": sum(s["bytes_sent"] for s in healthy) / devices,
+        "slow": {"lag_ms_max": lag["slow"], "art_drawn": sum(1 for tid in sent if (devices, tid) in drawn),
+                 **{k: stats[devices][k] for k in ("bytes_sent", "overflows", "frames_discarded")}},
+        "dead": {"lag_ms_max": lag["dead"], **{k: stats[devices + 1][k] for k in ("connected", "frames_discarded")}},
+    }
+
+async def main(args) -> list[dict]:
+    results = []
+    for n in args.devices:
+        results.append(await run(n, args.tracks, args.interval, args.rate, args.slow_rate))
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=lambda s: [int(n) for n in s.split(",")], default=[1, 4, 16, 32])
+    parser.add_argument("--tracks", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between tracks")
+    parser.add_argument("--rate", type=float, default=400000, help="consume rate of the healthy devices, bytes/s")
+    parser.add_argument("--slow-rate", type=float, default=20000, help="consume rate of the slow device, bytes/s")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args))
+    print(f"\n{'devices':>7} {'encode ms':>9} {'host CPU':>8} {'art drawn':>10} {'p50 ms':>7} {'p95 ms':>7} {'max ms':>7}"
+          f" | {'slow lag ms':>11} {'overflows':>9} {'discarded':>9} | {'dead discarded':>14}")
+    for r in results:
+        slow, dead = r["slow"], r["dead"]
+        print(f"{r['devices']:>7} {r['encode_ms']:>9.0f} {r['host_cpu_percent']:>7.0f}% "
+              f"{r['art_drawn']:>4}/{r['art_expected']:<5} {r['art_latency_ms_p50']:>7.0f} {r['art_latency_ms_p95']:>7.0f} "
+              f"{r['art_latency_ms_max']:>7.0f} | {slow['lag_ms_max']:>11.0f} {slow['overflows']:>9} "
+              f"{slow['frames_discarded']:>9} | {dead['frames_discarded']:>14}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,152 @@
+"""Throughput of credit-based flow control vs. the old fixed sleep pacing.
+
+A device stand-in consumes bytes at a limited rate (like the ESP32 parsing and drawing),
+grants a receive window on connect and returns credit as it consumes. The host pushes a
+burst of control frames plus one full art transfer through a transport Link.
+
+Run from the repo root: python test_codes/bench_flow_control.py [--transport tcp|pty]
+"""
+import argparse
+import asyncio
+import os
+import select
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from packet_encoder import encode_meta, encode_playback, encode_timeline, encode_art, encode_credit, ArtFormat, FrameDecoder, ART_END
+from transport import Link, SerialTransport, TcpTransport
+
+RX_WINDOW = 16384
+CREDIT_BATCH = 2048
+
+def make_workload() -> list[bytes]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, "images", "readme_demo.jpg"), "rb") as f:
+        image = f.read()
+    frames = []
+    for i in range(20):
+        frames.append(encode_meta(f"Track {i}", "Artist", "Album"))
+        frames.append(encode_playback(4))
+        frames.append(encode_timeline(i, 180))
+    frames.extend(bytes(p) for p in encode_art(image, ArtFormat.RGB565))
+    return frames
+
+def device_standin(read, write, total: int, rate: float, grant: bool, done: threading.Event, boot_delay: float = 0.0,
+                   art_ends: int = 1):
+    """Consumes bytes at `rate` bytes/s, returning credit like the firmware.
+
+    Stops after `total` bytes or `art_ends` ART_END frames, whichever comes first (the scheduler
+    coalesces timeline frames, so fewer bytes than were queued may arrive). `art_ends` is the
+    number of art transfers the bench queues.
+    """
+    time.sleep(boot_delay)
+    if grant:
+        write(encode_credit(RX_WINDOW))
+    decoder = FrameDecoder()
+    consumed = 0
+    received = 0
+    ends = 0
+    while received < total:
+        data = read()
+        if not data:
+            continue
+        received += len(data)
+        # Processing time, the reason pacing exists at all
+        time.sleep(len(data) / rate)
+        consumed += len(data)
+        if grant and consumed >= CREDIT_BATCH:
+            write(encode_credit(consumed))
+            consumed = 0
+        ends += sum(1 for msg_type, _ in decoder.feed(data) if msg_type == ART_END)
+        if ends >= art_ends:
+            break
+    done.set()
+
+def tcp_device(total: int, rate: float, grant: bool, done: threading.Event, art_ends: int = 1) -> tuple[str, int]:
+    """Starts the stand-in on a loopback TCP port, returns the address to connect to."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+
+    def serve():
+        device, _ = server.accept()
+        server.close()
+        # Keep kernel buffering small, like the ESP32's receive window
+        device.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8192)
+
+        def read():
+            readable, _, _ = select.select([device], [], [], 0.1)
+            return device.recv(4096) if readable else b""
+
+        device_standin(read, device.sendall, total, rate, grant, done, art_ends=art_ends)
+        device.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server.getsockname()
+
+def pty_device(total: int, rate: float, grant: bool, done: threading.Event, art_ends: int = 1) -> str:
+    """Starts the stand-in on the master side of a pty, returns the slave's path."""
+    import pty
+    import tty
+    master, slave = pty.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+
+    def read():
+        readable, _, _ = select.select([master], [], [], 0.1)
+        return os.read(master, 4096) if readable else b""
+
+    def write(data):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(master, view):]
+
+    # Opening the port flushes its input (and resets a real ESP32), so grant only after that
+    threading.Thread(target=device_standin, args=(read, write, total, rate, grant, done, 0.2, art_ends), daemon=True).start()
+    return os.ttyname(slave)
+
+async def run(transport: str, use_credits: bool, rate: float) -> dict:
+    frames = make_workload()
+    total = sum(len(f) for f in frames)
+    done = threading.Event()
+    if transport == "tcp":
+        host, port = tcp_device(total, rate, use_credits, done)
+        link = Link(TcpTransport(host, port), asyncio.get_running_loop())
+    else:
+        link = Link(SerialTransport(pty_device(total, rate, use_credits, done)), asyncio.get_running_loop())
+    link.start()
+    await link.connected.wait()
+
+    start = time.perf_counter()
+    for frame in frames:
+        link.send(frame)
+    await asyncio.get_running_loop().run_in_executor(None, done.wait, 60)
+    elapsed = time.perf_counter() - start
+    link.task.cancel()
+    stats = link.stats()
+    return {
+        "mode": "credits" if use_credits else "sleep",
+        "frames": stats["frames_sent"],
+        "bytes": stats["bytes_sent"],
+        "total_s": elapsed,
+        "throughput_kBps": stats["bytes_sent"] / elapsed / 1000,
+        "latency_ms_p99": max(c["latency_ms_p99"] for c in stats["classes"].values()),
+        "waits": stats["credit_waits"],
+        "stalls": stats["credit_stalls"],
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transport", choices=["tcp", "pty"], default="tcp")
+    parser.add_argument("--rate", type=float, default=92160, help="device consume rate in bytes/s (921600 baud = 92160)")
+    args = parser.parse_args()
+
+    print(f"transport={args.transport} device rate={args.rate / 1000:.1f} kB/s")
+    for use_credits in (False, True):
+        r = asyncio.run(run(args.transport, use_credits, args.rate))
+        print(f"{r['mode']:<8} {r['frames']} frames, {r['bytes']} bytes: "
+              f"{r['total_s'] * 1000:8.1f} ms total, {r['throughput_kBps']:6.1f} kB/s "
+              f"p99 enqueue-to-wire {r['latency_ms_p99']:7.1f} ms (waits={r['waits']}, stalls={r['stalls']})")
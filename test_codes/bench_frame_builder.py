@@ -0,0 +1,72 @@
+"""Micro-benchmark: vectorized frame builder vs. the original per-frame encoder.
+
+Run from the repo root: python test_codes/bench_frame_builder.py
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from packet_encoder import _crc, encode, encode_chunk_frames, ART_CHUNK, SOF
+
+# Original implementation, kept here as the baseline
+def legacy_crc(data: bytes) -> int:
+    c = 0
+    for b in data:
+        c ^= b
+    return c
+
+def legacy_encode(msg_type: int, payload: bytes) -> bytes:
+    length = len(payload)
+    frame = bytearray()
+    frame.append(SOF)
+    frame.append(msg_type)
+    frame.append(length & 0xFF)
+    frame.append((length >> 8) & 0xFF)
+    frame.extend(payload)
+    frame.append(legacy_crc(frame))
+    return bytes(frame)
+
+def legacy_chunks(data: bytes, chunk_size: int) -> list[bytes]:
+    packets = []
+    offset = 0
+    while offset < len(data):
+        chunk = data[offset:offset+chunk_size]
+        chunk_payload = bytearray()
+        chunk_payload.extend(offset.to_bytes(4, 'little'))
+        chunk_payload.extend(chunk)
+        packets.append(legacy_encode(ART_CHUNK, bytes(chunk_payload)))
+        offset += len(chunk)
+    return packets
+
+def bench(label: str, fn, number: int):
+    t = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"{label:<40} {t * 1e6:10.1f} us")
+    return t
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, 240 * 200 * 2, dtype=np.uint8).tobytes()
+    small = b"x" * 24
+
+    # Sanity check: both produce identical bytes
+    assert [bytes(f) for f in encode_chunk_frames(ART_CHUNK, image, 3072)] == legacy_chunks(image, 3072)
+    assert encode(ART_CHUNK, small) == legacy_encode(ART_CHUNK, small)
+
+    print("96 KB RGB565 frame, 3072 byte chunks")
+    old = bench("legacy chunk loop", lambda: legacy_chunks(image, 3072), 20)
+    new = bench("encode_chunk_frames", lambda: encode_chunk_frames(ART_CHUNK, image, 3072), 20)
+    print(f"{'speedup':<40} {old / new:10.1f} x\n")
+
+    print("3 KB checksum")
+    chunk = image[:3072]
+    old = bench("legacy _crc", lambda: legacy_crc(chunk), 200)
+    new = bench("_crc", lambda: _crc(chunk), 200)
+    print(f"{'speedup':<40} {old / new:10.1f} x\n")
+
+    print("24 byte control frame")
+    old = bench("legacy encode", lambda: legacy_encode(ART_CHUNK, small), 2000)
+    new = bench("encode", lambda: encode(ART_CHUNK, small), 2000)
+    print(f"{'speedup':<40} {old / new:10.1f} x")
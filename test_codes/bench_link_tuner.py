@@ -0,0 +1,163 @@
+"""Link estimator and tuner: what they measure, what they pick, and what that buys, fixed vs adaptive.
+
+1. Convergence: back-to-back art transfers into the firmware simulator over a pty (serial,
+   921600 baud nominal) and TCP (WiFi, no nominal rate), the estimated throughput, chunk size
+   and write size after each.
+2. Playback latency during art: PLAYBACK frames every 50 ms while covers stream, host queue to
+   device screen, with 3072-byte chunks and 12 KB writes vs whatever the tuner picks.
+3. Errors: covers over a link flipping bits (see bench_art_nak.py), with ART_NAK, fixed vs
+   adaptive chunk size.
+
+Run from the repo root: python test_codes/bench_link_tuner.py [--quick]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from device_sim import DeviceSimulator
+from packet_encoder import packetize_art, encode_playback, convert_image_to_rgb565, ArtFormat, CAP_ART_NAK
+from transport import Link, TcpTransport, SerialTransport
+from bench_device_latency import start_simulator, pct
+from bench_art_nak import corrupting
+from bench_suite import make_thumbnail, ART_SIZE
+
+SERIAL_RATE = 92160 # 921600 baud, 8N1
+WIFI_RATE = 1000000
+
+async def open_link(sim: DeviceSimulator, transport: str, adaptive: bool) -> Link:
+    where = start_simulator(sim, transport)
+    link = Link(TcpTransport(*where) if transport == "tcp" else SerialTransport(where), asyncio.get_running_loop(),
+                max_queue_bytes=None, adaptive=adaptive)
+    link.start()
+    await link.connected.wait()
+    await link.credit_window.acquire(0)
+    return link
+
+def send_art(link: Link, pixels: bytes, format: int = ArtFormat.RGB565) -> int:
+    transfer_id = link.begin_art()
+    for frame in packetize_art(pixels, format, link.art_chunk_size, ART_SIZE, transfer_id, link.supports(CAP_ART_NAK)):
+        link.send(bytes(frame))
+    return transfer_id
+
+async def wait_for(drawn: dict, transfer_id: int, timeout: float) -> bool:
+    start = time.perf_counter()
+    while transfer_id not in drawn and time.perf_counter() - start < timeout:
+        await asyncio.sleep(0.005)
+    return transfer_id in drawn
+
+async def convergence(transport: str, rate: float, transfers: int) -> dict:
+    pixels = convert_image_to_rgb565(make_thumbnail(600, "JPEG"), ART_SIZE)
+    drawn = {}
+    sim = DeviceSimulator(consume_rate=rate, on_visible=lambda e: e.kind == "art" and drawn.setdefault(e.detail, e.time))
+    link = await open_link(sim, transport, True)
+    steps = [{"transfer": 0, "Bps": link.estimator.bandwidth or 0.0, "chunk": link.art_chunk_size, "batch": link.batch_bytes}]
+    for i in range(1, transfers + 1):
+        await wait_for(drawn, send_art(link, pixels), 10.0)
+        steps.append({"transfer": i, "Bps": link.estimator.bandwidth or 0.0, "chunk": link.art_chunk_size, "batch": link.batch_bytes})
+    link.task.cancel()
+    return {"transport": transport, "rate": rate, "steps": steps}
+
+async def playback_latency(transport: str, rate: float, adaptive: bool, transfers: int) -> dict:
+    pixels = convert_image_to_rgb565(make_thumbnail(600, "JPEG"), ART_SIZE)
+    drawn, shown = {}, []
+
+    def on_visible(event):
+        if event.kind == "art":
+            drawn.setdefault(event.detail, event.time)
+        elif event.kind == "playback":
+            shown.append(event.time)
+
+    sim = DeviceSimulator(consume_rate=rate, on_visible=on_visible)
+    link = await open_link(sim, transport, adaptive)
+    for _ in range(2): # Let the tuner measure first
+        await wait_for(drawn, send_art(link, pixels), 10.0)
+    await asyncio.sleep(0.1)
+    shown.clear()
+
+    sent, art_ms = [], []
+    for _ in range(transfers):
+        start = time.perf_counter()
+        transfer_id = send_art(link, pixels)
+        while transfer_id not in drawn and time.perf_counter() - start < 10.0:
+            sent.append(time.perf_counter())
+            link.send(encode_playback(4 + len(sent) % 2))
+            await asyncio.sleep(0.05)
+        if transfer_id in drawn:
+            art_ms.append((drawn[transfer_id] - start) * 1000)
+    await asyncio.sleep(0.5)
+    link.task.cancel()
+    latency = [(seen - queued) * 1000 for queued, seen in zip(sent, shown)]
+    return {
+        "transport": transport, "rate": rate, "adaptive": adaptive, "chunk": link.art_chunk_size, "batch": link.batch_bytes,
+        "playback_ms_p50": pct(latency, 0.50), "playback_ms_p95": pct(latency, 0.95), "art_ms_p50": pct(art_ms, 0.50),
+        "writes_per_transfer": link.writes / (transfers + 2),
+    }
+
+async def errors(error_rate: float, adaptive: bool, transfers: int) -> dict:
+    pixels = convert_image_to_rgb565(make_thumbnail(600, "JPEG"), ART_SIZE)
+    drawn = {}
+
+    def on_visible(event):
+        if event.kind == "art" and event.detail not in drawn:
+            drawn[event.detail] = (event.time, bytes(sim.art.frame) == pixels)
+
+    sim = DeviceSimulator(consume_rate=WIFI_RATE, on_visible=on_visible)
+    sim.feed, _ = corrupting(sim.feed, error_rate)
+    link = await open_link(sim, "tcp", adaptive)
+    latency, art_bytes, chunks = [], 0, []
+    for _ in range(transfers):
+        chunks.append(link.art_chunk_size)
+        art_bytes += sum(map(len, packetize_art(pixels, ArtFormat.RGB565, link.art_chunk_size, ART_SIZE, nak=True)))
+        start = time.perf_counter()
+        transfer_id = send_art(link, pixels)
+        if await wait_for(drawn, transfer_id, 5.0) and drawn[transfer_id][1]:
+            latency.append((drawn[transfer_id][0] - start) * 1000)
+    await asyncio.sleep(0.2)
+    link.task.cancel()
+    return {
+        "error_rate": error_rate, "adaptive": adaptive, "intact": len(latency), "transfers": transfers,
+        "chunk_first": chunks[0], "chunk_last": chunks[-1], "ms_p50": pct(latency, 0.50), "ms_p95": pct(latency, 0.95),
+        "bytes_resent": link.art_bytes_resent, "resent_share": link.art_bytes_resent / art_bytes,
+        "gave_up": link.art_resends_failed, "estimated_byte_error_rate": link.estimator.byte_error_rate,
+    }
+
+async def main(args) -> dict:
+    transfers = 4 if args.quick else 10
+    results = {"convergence": [await convergence("pty", SERIAL_RATE, transfers), await convergence("tcp", WIFI_RATE, transfers)]}
+    results["playback"] = [await playback_latency(transport, rate, adaptive, 2 if args.quick else 5)
+                           for transport, rate in (("pty", SERIAL_RATE), ("tcp", WIFI_RATE)) for adaptive in (False, True)]
+    results["errors"] = [await errors(error_rate, adaptive, transfers * 2)
+                         for error_rate in (1e-5, 1e-4, 3e-4) for adaptive in (False, True)]
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quick", action="store_true", help="fewer transfers")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    results = asyncio.run(main(args))
+
+    for c in results["convergence"]:
+        print(f"\n{c['transport']}, device rate {c['rate'] / 1000:.1f} kB/s")
+        print(f"{'transfer':>8} {'estimate kB/s':>13} {'chunk':>6} {'write':>6}")
+        for s in c["steps"]:
+            print(f"{s['transfer']:>8} {s['Bps'] / 1000:>13.1f} {s['chunk']:>6} {s['batch']:>6}")
+
+    print(f"\n{'link':<5} {'chunks':<8} {'chunk':>6} {'write':>6} {'playback p50':>12} {'p95':>6} {'art p50 ms':>10} {'writes/art':>10}")
+    for r in results["playback"]:
+        print(f"{r['transport']:<5} {'adaptive' if r['adaptive'] else 'fixed':<8} {r['chunk']:>6} {r['batch']:>6} "
+              f"{r['playback_ms_p50']:>12.1f} {r['playback_ms_p95']:>6.1f} {r['art_ms_p50']:>10.0f} {r['writes_per_transfer']:>10.1f}")
+
+    print(f"\n{'error rate':>10} {'chunks':<8} {'chunk':>11} {'intact':>7} {'p50 ms':>7} {'p95 ms':>7} {'resent':>7} {'gave up':>7}")
+    for r in results["errors"]:
+        chunk = f"{r['chunk_first']}->{r['chunk_last']}" if r["chunk_first"] != r["chunk_last"] else str(r["chunk_first"])
+        print(f"{r['error_rate']:>10g} {'adaptive' if r['adaptive'] else 'fixed':<8} {chunk:>11} "
+              f"{r['intact']:>3}/{r['transfers']:<3} {r['ms_p50']:>7.0f} {r['ms_p95']:>7.0f} {r['resent_share']:>7.1%} {r['gave_up']:>7}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,139 @@
+"""PALETTE8 and JPEG art against RGB565 and RGB565_RLE: bytes on the wire, quality, encode time, transfer time.
+
+Quality is the PSNR against the RGB565 frame (what the device shows today), over the covers of
+bench_progressive.py. Encode time is quantization or the JPEG quality search plus framing, next to convert_image_to_rgb565
+(JPEG decode and resize) which runs for every new cover anyway. Transfer time is one cover at
+a time through a Link into the firmware simulator at serial speed. Before any of that, PALETTE8
+from encode_art and ArtCache.encode_art is checked to draw as quantize_rgb565 + decode_palette8.
+
+Run from the repo root: python test_codes/bench_palette.py [--quick]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from device_sim import DeviceSimulator
+from art_cache import ArtCache
+from packet_encoder import (
+    encode_art, FrameDecoder, ArtReceiver, packetize_art, quantize_rgb565, decode_palette8, encode_jpeg, decode_jpeg, rgb565_to_image, convert_image_to_rgb565,
+    _rgb565_channels, ArtFormat, Dither, JPEG_MAX_BYTES,
+)
+from transport import Link, SerialTransport
+from bench_device_latency import start_simulator, pct
+from bench_suite import measure, make_thumbnail, ART_SIZE
+from bench_progressive import make_covers
+from bench_link_tuner import SERIAL_RATE
+
+FORMATS = [("RGB565", ArtFormat.RGB565, None), ("RGB565_RLE", ArtFormat.RGB565_RLE, None),
+           ("PALETTE8", ArtFormat.PALETTE8, Dither.NONE), ("PALETTE8 ordered", ArtFormat.PALETTE8, Dither.ORDERED),
+           ("PALETTE8 diffusion", ArtFormat.PALETTE8, Dither.DIFFUSION), ("JPEG 12 KB", ArtFormat.JPEG, JPEG_MAX_BYTES),
+           ("JPEG 8 KB", ArtFormat.JPEG, 8192)]
+
+def to_rgb888(pixels_rgb565: bytes) -> np.ndarray:
+    c = _rgb565_channels(np.frombuffer(pixels_rgb565, dtype='<u2').reshape(ART_SIZE[1], ART_SIZE[0])).astype(np.float64)
+    return c * (255 / np.array([31, 63, 31]))
+
+def psnr(reference: bytes, shown: bytes) -> float:
+    mse = np.mean((to_rgb888(reference) - to_rgb888(shown)) ** 2)
+    return 10 * np.log10(255 ** 2 / mse) if mse else float("inf")
+
+def encode(pixels: bytes, format: int, option: int, transfer_id: int = 0) -> tuple[list, bytes]:
+    """Frames and the frame the device shows afterwards. `option` is the dither or the JPEG budget."""
+    if format == ArtFormat.JPEG:
+        data, _ = encode_jpeg(rgb565_to_image(pixels, ART_SIZE), option)
+        return packetize_art(data, format, size=ART_SIZE, transfer_id=transfer_id), decode_jpeg(data, ART_SIZE)
+    if format == ArtFormat.PALETTE8:
+        palette, indices = quantize_rgb565(pixels, ART_SIZE, option)
+        return (packetize_art(indices, format, size=ART_SIZE, transfer_id=transfer_id, palette=palette),
+                decode_palette8(indices, palette))
+    return packetize_art(pixels, format, size=ART_SIZE, transfer_id=transfer_id), pixels
+
+def check_encode_art():
+    """Both encode_art entry points send PALETTE8 that the receiver draws as the reference decoder does, and reject PNG."""
+    thumb = make_thumbnail(600, "JPEG")
+    palette, indices = quantize_rgb565(convert_image_to_rgb565(thumb, ART_SIZE), ART_SIZE)
+    expected = decode_palette8(indices, palette)
+    for name, frames in (("encode_art", encode_art(thumb, ArtFormat.PALETTE8, size=ART_SIZE)),
+                         ("ArtCache.encode_art", ArtCache().encode_art(thumb, ArtFormat.PALETTE8, size=ART_SIZE))):
+        receiver, decoder = ArtReceiver(), FrameDecoder()
+        for frame in frames:
+            for msg_type, payload in decoder.feed(bytes(frame)):
+                receiver.handle(msg_type, payload)
+        assert receiver.draws == 1 and bytes(receiver.frame) == expected, f"{name}: PALETTE8 didn't round-trip"
+    for name, encoder in (("encode_art", encode_art), ("ArtCache.encode_art", ArtCache().encode_art)):
+        try:
+            encoder(thumb, ArtFormat.PNG, size=ART_SIZE)
+        except ValueError:
+            continue
+        raise AssertionError(f"{name}: PNG wasn't rejected")
+    print("encode_art PALETTE8 round trip and PNG: ok")
+
+def static_cases(covers: list[bytes], min_time: float) -> list[dict]:
+    thumb = make_thumbnail(600, "JPEG")
+    results = [{"name": "convert_image_to_rgb565", "encode_us": measure(lambda: convert_image_to_rgb565(thumb, ART_SIZE), min_time)["mean_us"]}]
+    for name, format, option in FORMATS:
+        sizes, quality = [], []
+        for pixels in covers:
+            frames, shown = encode(pixels, format, option)
+            sizes.append(sum(map(len, frames)))
+            quality.append(psnr(pixels, shown))
+        results.append({"name": name, "bytes": sum(sizes) / len(sizes), "psnr_db": min(quality),
+                        "psnr_db_mean": sum(quality) / len(quality),
+                        "encode_us": measure(lambda: encode(covers[0], format, option), min_time)["mean_us"]})
+    return results
+
+async def transfer(name: str, format: int, option: int, covers: list[bytes]) -> dict:
+    drawn = {}
+    sim = DeviceSimulator(consume_rate=SERIAL_RATE, on_visible=lambda e: e.kind == "art" and drawn.setdefault(e.detail, e.time))
+    link = Link(SerialTransport(start_simulator(sim, "pty")), asyncio.get_running_loop())
+    link.start()
+    await link.connected.wait()
+    await link.credit_window.acquire(0)
+    latency = []
+    for pixels in covers:
+        transfer_id = link.begin_art()
+        frames, _ = encode(pixels, format, option, transfer_id)
+        start = time.perf_counter()
+        for frame in frames:
+            link.send(bytes(frame))
+        while transfer_id not in drawn and time.perf_counter() - start < 10.0:
+            await asyncio.sleep(0.002)
+        if transfer_id in drawn:
+            latency.append((drawn[transfer_id] - start) * 1000)
+    link.task.cancel()
+    return {"name": name, "drawn": len(latency), "covers": len(covers), "ms_p50": pct(latency, 0.5),
+            "ms_max": max(latency, default=0.0)}
+
+async def transfer_cases(covers: list[bytes]) -> list[dict]:
+    return [await transfer(name, format, option, covers) for name, format, option in FORMATS]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quick", action="store_true", help="shorter timings, fewer covers")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    check_encode_art()
+    covers = make_covers(4 if args.quick else 8)
+
+    results = {"static": static_cases(covers, 0.05 if args.quick else 0.25)}
+    print(f"\n{'format':<24} {'bytes':>7} {'PSNR dB min':>11} {'mean':>6} {'encode us':>10}")
+    for r in results["static"]:
+        if "bytes" in r:
+            print(f"{r['name']:<24} {r['bytes']:>7.0f} {r['psnr_db']:>11.1f} {r['psnr_db_mean']:>6.1f} {r['encode_us']:>10.0f}")
+        else:
+            print(f"{r['name']:<24} {'':>7} {'':>11} {'':>6} {r['encode_us']:>10.0f}")
+
+    results["transfer"] = asyncio.run(transfer_cases(covers))
+    print(f"\n{'serial 92 kB/s':<24} {'drawn':>7} {'ms p50':>7} {'max':>7}")
+    for r in results["transfer"]:
+        print(f"{r['name']:<24} {r['drawn']:>3}/{r['covers']:<3} {r['ms_p50']:>7.0f} {r['ms_max']:>7.0f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,150 @@
+"""Progressive art: time to the first art on screen (preview) and to the full cover, with and without.
+
+Covers are variants of the demo image (flipped, rotated, channels swapped), so every new one is
+a different picture to the delta encoder too. They are encoded and queued the way
+MediaController._prepare_art does, into the firmware simulator over a pty (serial) and TCP.
+
+1. One cover at a time on an idle link.
+2. Rapid skips: a new cover every 150 ms, times from the last skip.
+
+Run from the repo root: python test_codes/bench_progressive.py [--covers 8]
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from device_sim import DeviceSimulator
+from media_controller import encode_art_frame, ART_SIZE
+from packet_encoder import convert_image_to_rgb565, CAP_ART_NAK, CAP_ART_PREVIEW
+from transport import Link, TcpTransport, SerialTransport
+from bench_device_latency import start_simulator, pct
+from bench_link_tuner import SERIAL_RATE, WIFI_RATE
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VARIANTS = [None, Image.Transpose.FLIP_LEFT_RIGHT, Image.Transpose.FLIP_TOP_BOTTOM, Image.Transpose.ROTATE_90,
+            Image.Transpose.ROTATE_180, Image.Transpose.ROTATE_270, Image.Transpose.TRANSPOSE, Image.Transpose.TRANSVERSE]
+
+def make_covers(n: int) -> list[bytes]:
+    covers = []
+    with Image.open(os.path.join(ROOT, "images", "readme_demo.jpg")) as base:
+        base = base.convert("RGB").resize((600, 600))
+    for i in range(n):
+        img = base.transpose(VARIANTS[i % len(VARIANTS)]) if VARIANTS[i % len(VARIANTS)] is not None else base
+        if i // len(VARIANTS) % 2:
+            img = Image.merge("RGB", img.split()[::-1])
+        out = io.BytesIO()
+        img.save(out, format="JPEG")
+        covers.append(convert_image_to_rgb565(out.getvalue(), ART_SIZE))
+    return covers
+
+class Screen:
+    """Times every cover's first paint and the paint where the screen shows it in full."""
+
+    def __init__(self):
+        self.sim: DeviceSimulator = None
+        self.expected = {} # Transfer id -> pixels
+        self.first = {}
+        self.full = {}
+
+    def on_visible(self, event):
+        if event.kind != "art" or event.detail not in self.expected:
+            return
+        self.first.setdefault(event.detail, event.time)
+        if event.detail not in self.full and bytes(self.sim.art.frame) == self.expected[event.detail]:
+            self.full[event.detail] = event.time
+
+async def open_link(transport: str, rate: float) -> tuple[Link, Screen]:
+    screen = Screen()
+    screen.sim = DeviceSimulator(consume_rate=rate, on_visible=screen.on_visible)
+    where = start_simulator(screen.sim, transport)
+    link = Link(TcpTransport(*where) if transport == "tcp" else SerialTransport(where), asyncio.get_running_loop())
+    link.start()
+    await link.connected.wait()
+    await link.credit_window.acquire(0)
+    return link, screen
+
+def queue_cover(link: Link, screen: Screen, pixels: bytes, preview: bool) -> tuple[int, int]:
+    """Returns (transfer id, bytes queued)."""
+    transfer_id = link.begin_art()
+    frames, frame = encode_art_frame(pixels, link.art_frame, transfer_id, link.supports(CAP_ART_NAK),
+                                     link.art_chunk_size, preview and link.supports(CAP_ART_PREVIEW))
+    link.art_frame = frame
+    screen.expected[transfer_id] = pixels
+    for f in frames:
+        link.send(bytes(f))
+    return transfer_id, sum(map(len, frames))
+
+async def one_at_a_time(transport: str, rate: float, preview: bool, covers: list[bytes]) -> dict:
+    link, screen = await open_link(transport, rate)
+    first, full, sizes = [], [], []
+    for pixels in covers:
+        start = time.perf_counter()
+        transfer_id, size = queue_cover(link, screen, pixels, preview)
+        sizes.append(size)
+        while transfer_id not in screen.full and time.perf_counter() - start < 10.0:
+            await asyncio.sleep(0.002)
+        if transfer_id in screen.full:
+            first.append((screen.first[transfer_id] - start) * 1000)
+            full.append((screen.full[transfer_id] - start) * 1000)
+        await asyncio.sleep(0.1)
+    link.task.cancel()
+    return {"scenario": "one at a time", "transport": transport, "preview": preview, "covers": len(covers),
+            "shown": len(full), "first_ms_p50": pct(first, 0.5), "first_ms_p95": pct(first, 0.95),
+            "full_ms_p50": pct(full, 0.5), "full_ms_p95": pct(full, 0.95), "bytes_per_cover": sum(sizes) / len(sizes)}
+
+async def rapid_skips(transport: str, rate: float, preview: bool, covers: list[bytes], interval: float = 0.15) -> dict:
+    link, screen = await open_link(transport, rate)
+    queue_cover(link, screen, covers[-1], False) # Something on screen to start from
+    while not screen.full:
+        await asyncio.sleep(0.01)
+    for pixels in covers[:-1]:
+        start = time.perf_counter()
+        transfer_id, _ = queue_cover(link, screen, pixels, preview)
+        await asyncio.sleep(interval)
+    while transfer_id not in screen.full and time.perf_counter() - start < 10.0:
+        await asyncio.sleep(0.002)
+    link.task.cancel()
+    return {"scenario": "rapid skips", "transport": transport, "preview": preview, "covers": len(covers) - 1,
+            "skipped_covers_painted": len(screen.first) - 2, # Not the first or the last
+            "first_ms": (screen.first.get(transfer_id, float("nan")) - start) * 1000,
+            "full_ms": (screen.full.get(transfer_id, float("nan")) - start) * 1000,
+            "stale_frames": screen.sim.art.stale}
+
+async def main(n: int) -> list[dict]:
+    covers = make_covers(n)
+    results = []
+    for transport, rate in (("pty", SERIAL_RATE), ("tcp", WIFI_RATE)):
+        for preview in (False, True):
+            results.append(await one_at_a_time(transport, rate, preview, covers))
+    for preview in (False, True):
+        results.append(await rapid_skips("pty", SERIAL_RATE, preview, covers[:7]))
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--covers", type=int, default=8)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    results = asyncio.run(main(args.covers))
+
+    print(f"\n{'one at a time':<14} {'preview':<7} {'first p50':>9} {'p95':>6} {'full p50':>9} {'p95':>6} {'bytes/cover':>11}")
+    for r in results:
+        if r["scenario"] == "one at a time":
+            print(f"{r['transport']:<14} {'on' if r['preview'] else 'off':<7} {r['first_ms_p50']:>9.1f} {r['first_ms_p95']:>6.1f} "
+                  f"{r['full_ms_p50']:>9.1f} {r['full_ms_p95']:>6.1f} {r['bytes_per_cover']:>11.0f}")
+    print(f"\n{'rapid skips':<14} {'preview':<7} {'first ms':>9} {'full ms':>9} {'skipped covers painted':>22}")
+    for r in results:
+        if r["scenario"] == "rapid skips":
+            print(f"{r['transport']:<14} {'on' if r['preview'] else 'off':<7} {r['first_ms']:>9.1f} {r['full_ms']:>9.1f} "
+                  f"{r['skipped_covers_painted']:>22}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
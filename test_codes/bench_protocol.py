@@ -0,0 +1,182 @@
+"""Protocol v1 (XOR checksum) vs v2 (CRC-16, sequence numbers): encode cost, error detection, links.
+
+1. Checksum throughput: the current `_crc`, a pure Python CRC-16 table loop (what the firmware
+   does, for reference) and `crc16` (binascii's C table loop), per frame size.
+2. Encode cost per message: v1 frames as built today, and the same frames re-framed as v2
+   the way a Link does on the way out.
+3. Error detection: random bit flips and bursts in the payload and checksum of a frame, the
+   share each checksum fails to catch.
+4. Art transfers through a Link into the firmware simulator: v2 firmware, old v1 firmware
+   (no CAPS, so the host falls back), and a v2 host told to stay on v1.
+
+Run from the repo root: python test_codes/bench_protocol.py [--quick]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from device_sim import DeviceSimulator
+from packet_encoder import (
+    _crc, crc16, encode, to_v2, encode_meta, encode_timeline_sync, packetize_art, convert_image_to_rgb565,
+    ArtFormat, ART_CHUNK, PROTOCOL_VERSION,
+)
+from transport import Link, TcpTransport
+from bench_device_latency import start_simulator
+from bench_suite import measure, make_thumbnail, ART_SIZE
+
+def _table():
+    table = []
+    for i in range(256):
+        c = i << 8
+        for _ in range(8):
+            c = ((c << 1) ^ 0x1021) if c & 0x8000 else c << 1
+        table.append(c & 0xFFFF)
+    return table
+
+_TABLE = _table()
+
+def crc16_py(data: bytes) -> int:
+    """Same CRC-16/CCITT-FALSE as `crc16`, as a Python loop over the firmware's table."""
+    c = 0xFFFF
+    for b in data:
+        c = ((c << 8) & 0xFFFF) ^ _TABLE[((c >> 8) ^ b) & 0xFF]
+    return c
+
+def checksum_cases(min_time: float) -> list[dict]:
+    rng = np.random.default_rng(0)
+    results = []
+    for n in (9, 64, 1024, 3077, 96000):
+        data = rng.integers(0, 256, n, dtype=np.uint8).tobytes()
+        for name, fn in (("_crc", _crc), ("crc16_py", crc16_py), ("crc16", crc16)):
+            if name == "crc16_py" and n > 3077:
+                continue # Seconds per call, not worth the wait
+            r = measure(lambda d=data, f=fn: f(d), min_time)
+            results.append({"name": name, "bytes": n, "us": r["mean_us"], "MBps": n / r["mean_us"]})
+    return results
+
+def encode_cases(min_time: float) -> list[dict]:
+    pixels = convert_image_to_rgb565(make_thumbnail(600, "JPEG"), ART_SIZE)
+    messages = {
+        "meta": lambda: [encode_meta("Blinding Lights", "The Weeknd", "After Hours")],
+        "timeline_sync": lambda: [encode_timeline_sync(61000, 200000, 1.0, 7)],
+        "art chunk 3 KB": lambda: [encode(ART_CHUNK, pixels[:3077])],
+        "art RGB565": lambda: packetize_art(pixels, ArtFormat.RGB565, size=ART_SIZE),
+        "art RLE": lambda: packetize_art(pixels, ArtFormat.RGB565_RLE, size=ART_SIZE),
+    }
+    results = []
+    for name, build in messages.items():
+        v1 = measure(build, min_time)
+        v2 = measure(lambda b=build: [to_v2(f, seq) for seq, f in enumerate(b())], min_time)
+        frames = build()
+        results.append({"name": name, "frames": len(frames), "bytes_v1": sum(map(len, frames)),
+                        "bytes_v2": sum(len(to_v2(f, 0)) for f in frames), "v1_us": v1["mean_us"], "v2_us": v2["mean_us"]})
+    return results
+
+def detection_cases(trials: int) -> list[dict]:
+    """Corrupts frames at random (payload and checksum only, the length stays intact)."""
+    rng = random.Random(0)
+    payload = bytes(rng.randrange(256) for _ in range(256))
+    v1 = encode(ART_CHUNK, payload)
+    v2 = to_v2(v1, 0)
+
+    def corrupt(frame: bytes, header: int, flips: list[int]) -> bytearray:
+        out = bytearray(frame)
+        for bit in flips:
+            out[header + bit // 8] ^= 1 << (bit % 8)
+        return out
+
+    def v1_ok(f):
+        return _crc(f[:-1]) == f[-1]
+
+    def v2_ok(f):
+        return crc16(f[:-2]) == f[-2] | (f[-1] << 8)
+
+    results = []
+    for kind in ("1 bit", "2 bits", "3 bits", "4 bits", "8 bits", "burst 16", "burst 32"):
+        missed = {"v1": 0, "v2": 0}
+        for _ in range(trials):
+            for name, frame, header, ok in (("v1", v1, 4, v1_ok), ("v2", v2, 6, v2_ok)):
+                bits = (len(frame) - header) * 8
+                if kind.startswith("burst"):
+                    span = int(kind.split()[1])
+                    start = rng.randrange(bits - span + 1)
+                    # First and last bit of the burst flipped, the ones in between at random
+                    flips = [start, start + span - 1] + [b for b in range(start + 1, start + span - 1) if rng.random() < 0.5]
+                else:
+                    flips = rng.sample(range(bits), int(kind.split()[0]))
+                if ok(corrupt(frame, header, flips)):
+                    missed[name] += 1
+        results.append({"errors": kind, "trials": trials, "v1_undetected": missed["v1"] / trials,
+                        "v2_undetected": missed["v2"] / trials})
+    return results
+
+async def transfer(protocol_host: int, protocol_device: int, transfers: int) -> dict:
+    thumb = make_thumbnail(600, "JPEG")
+    pixels = convert_image_to_rgb565(thumb, ART_SIZE)
+    drawn = []
+    sim = DeviceSimulator(protocol_version=protocol_device, on_visible=lambda e: e.kind == "art" and drawn.append(e.time))
+    loop = asyncio.get_running_loop()
+    link = Link(TcpTransport(*start_simulator(sim, "tcp")), loop, max_queue_bytes=None, protocol_version=protocol_host)
+    link.start()
+    await link.connected.wait()
+    await link.credit_window.acquire(0)
+
+    start = time.perf_counter()
+    for i in range(transfers):
+        for frame in packetize_art(pixels, ArtFormat.RGB565, size=ART_SIZE, transfer_id=i):
+            link.send(bytes(frame))
+    while len(drawn) < transfers and time.perf_counter() - start < 30:
+        await asyncio.sleep(0.005)
+    elapsed = drawn[-1] - start if drawn else float("nan")
+    link.task.cancel()
+    device = sim.stats()
+    return {
+        "host": protocol_host, "device": protocol_device, "negotiated": link.version,
+        "drawn": len(drawn), "transfers": transfers, "ms_per_transfer": elapsed / transfers * 1000,
+        "MBps": link.bytes_sent / elapsed / 1e6, "bytes_sent": link.bytes_sent,
+        "crc_errors": device["crc_errors"], "seq_lost": device["seq_lost"],
+    }
+
+async def link_cases(transfers: int) -> list[dict]:
+    return [await transfer(host, device, transfers)
+            for host, device in ((PROTOCOL_VERSION, PROTOCOL_VERSION), (PROTOCOL_VERSION, 1), (1, PROTOCOL_VERSION))]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quick", action="store_true", help="shorter timings, fewer trials")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    min_time = 0.05 if args.quick else 0.25
+
+    results = {"checksum": checksum_cases(min_time)}
+    print(f"\n{'checksum':<9} {'bytes':>6} {'us':>10} {'MB/s':>8}")
+    for r in results["checksum"]:
+        print(f"{r['name']:<9} {r['bytes']:>6} {r['us']:>10.2f} {r['MBps']:>8.1f}")
+
+    results["encode"] = encode_cases(min_time)
+    print(f"\n{'message':<15} {'frames':>6} {'v1 bytes':>9} {'v2 bytes':>9} {'v1 us':>9} {'v2 us':>9} {'v2/v1':>6}")
+    for r in results["encode"]:
+        print(f"{r['name']:<15} {r['frames']:>6} {r['bytes_v1']:>9} {r['bytes_v2']:>9} {r['v1_us']:>9.1f} "
+              f"{r['v2_us']:>9.1f} {r['v2_us'] / r['v1_us']:>6.2f}")
+
+    results["detection"] = detection_cases(2000 if args.quick else 20000)
+    print(f"\n{'errors (262 B frame)':<20} {'v1 undetected':>13} {'v2 undetected':>13}")
+    for r in results["detection"]:
+        print(f"{r['errors']:<20} {r['v1_undetected']:>13.2%} {r['v2_undetected']:>13.2%}")
+
+    results["link"] = asyncio.run(link_cases(5 if args.quick else 20))
+    print(f"\n{'host':>4} {'device':>6} {'using':>5} {'drawn':>7} {'ms/transfer':>11} {'MB/s':>6} {'crc errors':>10} {'seq lost':>8}")
+    for r in results["link"]:
+        print(f"{'v%d' % r['host']:>4} {'v%d' % r['device']:>6} {'v%d' % r['negotiated']:>5} {r['drawn']:>3}/{r['transfers']:<3} "
+              f"{r['ms_per_transfer']:>11.1f} {r['MBps']:>6.1f} {r['crc_errors']:>10} {r['seq_lost']:>8}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
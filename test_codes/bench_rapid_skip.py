@@ -0,0 +1,106 @@
+"""Time-to-correct-art when skipping quickly through albums, with and without cancellation.
+
+The host queues art for a new album every 150 ms (raw RGB565, ~96 KB each). A device stand-in
+decodes frames with ArtReceiver at a limited rate. With cancellation, Link.begin_art drops
+unsent frames of superseded transfers and the receiver ignores stale chunks.
+
+Run from the repo root: python test_codes/bench_rapid_skip.py
+"""
+import asyncio
+import os
+import select
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from packet_encoder import FrameDecoder, ArtReceiver, packetize_art, encode_meta, encode_credit, ArtFormat
+from transport import Link, TcpTransport
+
+RX_WINDOW = 16384
+CREDIT_BATCH = 2048
+SIZE = (240, 200)
+
+def make_images(n: int) -> list[bytes]:
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 65536, SIZE[0] * SIZE[1], dtype=np.uint16).tobytes() for _ in range(n)]
+
+def start_device(rate: float, expected: bytes, result: dict) -> tuple[str, int]:
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+
+    def serve():
+        conn, _ = server.accept()
+        server.close()
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8192)
+        decoder = FrameDecoder()
+
+        def on_draw(transfer_id):
+            result["draws"] += 1
+            if bytes(receiver.frame) == expected:
+                result["correct_at"] = time.perf_counter()
+
+        receiver = ArtReceiver(on_draw)
+        conn.sendall(encode_credit(RX_WINDOW))
+        consumed = 0
+        while "correct_at" not in result:
+            readable, _, _ = select.select([conn], [], [], 0.1)
+            if not readable:
+                continue
+            data = conn.recv(4096)
+            if not data:
+                break
+            time.sleep(len(data) / rate)
+            for msg_type, payload in decoder.feed(data):
+                receiver.handle(msg_type, payload)
+            consumed += len(data)
+            if consumed >= CREDIT_BATCH:
+                conn.sendall(encode_credit(consumed))
+                consumed = 0
+        result["stale"] = receiver.stale
+        conn.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server.getsockname()
+
+async def run(cancel: bool, rate: float, skips: int = 6, interval: float = 0.15) -> dict:
+    images = make_images(skips)
+    result = {"draws": 0}
+    host, port = start_device(rate, images[-1], result)
+    link = Link(TcpTransport(host, port), asyncio.get_running_loop(), max_queue_bytes=None)
+    link.start()
+    await link.connected.wait()
+
+    for i, image in enumerate(images):
+        link.send(encode_meta(f"Track {i}", "Artist", f"Album {i}"))
+        transfer_id = link.begin_art() if cancel else i
+        for frame in packetize_art(image, ArtFormat.RGB565, size=SIZE, transfer_id=transfer_id):
+            link.send(frame)
+        last_skip = time.perf_counter()
+        if i < skips - 1:
+            await asyncio.sleep(interval)
+
+    while "correct_at" not in result:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.1)
+    link.task.cancel()
+    return {
+        "time_to_correct_ms": (result["correct_at"] - last_skip) * 1000,
+        "draws": result["draws"],
+        "bytes_sent": link.bytes_sent,
+        "dropped": link.art_frames_dropped,
+        "stale": result.get("stale", 0),
+    }
+
+if __name__ == '__main__':
+    rate = 92160
+    print(f"6 albums, one skip every 150 ms, device rate {rate / 1000:.1f} kB/s")
+    for cancel in (False, True):
+        r = asyncio.run(run(cancel, rate))
+        print(f"{'cancel' if cancel else 'no cancel':<10} time-to-correct-art {r['time_to_correct_ms']:8.1f} ms, "
+              f"{r['draws']} covers drawn, {r['bytes_sent']} bytes sent, "
+              f"{r['dropped']} frames dropped on host, {r['stale']} stale frames ignored on device")
@@ -0,0 +1,174 @@
+"""Replays a pathological hour of media events at 100x through the full host pipeline.
+
+Generates a synthetic trace (rapid skipping, skip bursts, session switching between three
+apps, play/pause toggles, seeks, properties events that arrive first without and then with
+a thumbnail), or replays a recorded one. A MediaController driven by ReplaySource sends to
+the firmware simulator over loopback TCP. Reports queue depth, CPU use and per-stage latency.
+
+Run from the repo root: python test_codes/bench_replay.py [--trace recorded.jsonl] [--speed 100]
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+import time
+
+from PIL import Image, ImageOps
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from art_cache import ArtCache
+from device_sim import DeviceSimulator
+from media_controller import MediaController
+from media_source import ReplaySource, PlaybackStatus
+from tracing import Tracer
+from transport import Link, TcpTransport
+from bench_device_latency import start_simulator
+
+APPS = ("Spotify.exe", "Chrome", "foobar2000.exe")
+
+def make_thumbnails(n: int) -> list[bytes]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with Image.open(os.path.join(root, "images", "readme_demo.jpg")) as img:
+        base = img.convert("RGB").resize((300, 300))
+    thumbs = []
+    for i in range(n):
+        variant = ImageOps.posterize(base.rotate(i * 360 / n), 2 + i % 6)
+        out = io.BytesIO()
+        variant.save(out, format="JPEG", quality=85)
+        thumbs.append(out.getvalue())
+    return thumbs
+
+def make_pathological_trace(path: str, duration: float = 3600, seed: int = 0):
+    rng = random.Random(seed)
+    thumbs = make_thumbnails(40)
+    thumb_ids = [hashlib.blake2b(t, digest_size=8).hexdigest() for t in thumbs]
+    written = set()
+    lines = []
+
+    def emit(t, event, thumb=None):
+        if thumb is not None:
+            if thumb_ids[thumb] not in written:
+                written.add(thumb_ids[thumb])
+                lines.append({"t": t, "type": "thumbnail", "id": thumb_ids[thumb], "data": base64.b64encode(thumbs[thumb]).decode()})
+            event["thumbnail"] = thumb_ids[thumb]
+        lines.append({"t": round(t, 4), **event})
+
+    t = 0.0
+    track = 0
+    app = 0
+    emit(t, {"type": "session", "app": APPS[app]})
+    next_switch = rng.uniform(20, 60)
+    while t < duration:
+        track += 1
+        album = rng.randrange(40) # Albums share art across tracks
+        length = rng.uniform(120, 300)
+        meta = {"type": "media", "title": f"Track {track}", "artist": f"Artist {album % 13}", "album": f"Album {album}"}
+        # WinRT often fires once without the thumbnail, then again with it
+        emit(t, {**meta, "thumbnail": None})
+        emit(t + rng.uniform(0.02, 0.3), dict(meta), album)
+        emit(t + 0.01, {"type": "playback", "status": int(PlaybackStatus.PLAYING)})
+        emit(t + 0.02, {"type": "timeline", "position": 0.0, "end": length})
+
+        # Mostly skipping: bursts of sub-second skips, otherwise a few seconds per track
+        dwell = rng.uniform(0.1, 0.6) if rng.random() < 0.4 else rng.uniform(2, 15)
+        if rng.random() < 0.2:
+            emit(t + dwell / 2, {"type": "timeline", "position": rng.uniform(0, length), "end": length}) # Seek
+        if rng.random() < 0.1:
+            emit(t + dwell / 3, {"type": "playback", "status": int(PlaybackStatus.PAUSED)})
+            emit(t + dwell / 2, {"type": "playback", "status": int(PlaybackStatus.PLAYING)})
+        t += dwell
+
+        if t >= next_switch:
+            app = (app + rng.randrange(1, len(APPS))) % len(APPS)
+            emit(t, {"type": "session", "app": APPS[app]})
+            next_switch = t + rng.uniform(20, 60)
+            t += 0.05
+
+    lines.sort(key=lambda e: e["t"])
+    with open(path, "w") as f:
+        for line in lines:
+            f.write(json.dumps(line) + "\n")
+    return sum(1 for line in lines if line["type"] != "thumbnail")
+
+async def run(trace: str, speed: float, rate: float) -> dict:
+    loop = asyncio.get_running_loop()
+    sim = DeviceSimulator(consume_rate=rate)
+    link = Link(TcpTransport(*start_simulator(sim, "tcp")), loop)
+    link.start()
+    await link.connected.wait()
+
+    tracer = Tracer(enabled=True)
+    source = ReplaySource(trace, speed)
+    controller = MediaController(loop, link, ArtCache(), tracer, source)
+    # Keep the settle window the same length in trace time
+    controller.media_settle /= speed
+    controller.media_max_wait /= speed
+    manager = await source.open()
+    await controller.setup(manager)
+
+    depths = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    while not source.done.is_set():
+        depths.append(link.scheduler.qsize())
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(1.0) # Let the tail drain
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    link.task.cancel()
+    controller.timeline_task.cancel()
+    source.close()
+
+    depths.sort()
+    link_stats = link.stats()
+    return {
+        "events": source.events_replayed,
+        "speed": speed,
+        "wall_s": wall,
+        "cpu_s": cpu,
+        "cpu_percent": cpu / wall * 100,
+        "queue_depth_p50": depths[len(depths) // 2] if depths else 0,
+        "queue_depth_p99": depths[min(len(depths) - 1, int(len(depths) * 0.99))] if depths else 0,
+        "queue_depth_max": depths[-1] if depths else 0,
+        "frames_sent": link_stats["frames_sent"],
+        "bytes_sent": link_stats["bytes_sent"],
+        "art_frames_dropped": link_stats["art_frames_dropped"],
+        "art_cache": controller.art_cache.stats(),
+        "media_events": controller.stats()["media_events"],
+        "device": {k: v for k, v in sim.stats().items() if k != "updates"},
+        "trace": tracer.stats()["kinds"],
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trace", help="recorded trace to replay, default: generate a pathological hour")
+    parser.add_argument("--speed", type=float, default=100)
+    parser.add_argument("--rate", type=float, default=None, help="simulated device consume rate in bytes/s, default unlimited")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    trace = args.trace
+    if not trace:
+        trace = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pathological_hour.jsonl")
+        n = make_pathological_trace(trace)
+        print(f"Generated {trace} ({n} events)")
+
+    r = asyncio.run(run(trace, args.speed, args.rate))
+    print(f"\n{r['events']} events at {r['speed']:.0f}x in {r['wall_s']:.1f} s, CPU {r['cpu_percent']:.0f}%")
+    print(f"queue depth p50 {r['queue_depth_p50']}, p99 {r['queue_depth_p99']}, max {r['queue_depth_max']}")
+    m = r["media_events"]
+    print(f"media property events {m['events']}, fetches {m['runs']} ({m['max_wait_runs']} forced by max wait)")
+    print(f"sent {r['frames_sent']} frames, {r['bytes_sent'] / 1e6:.1f} MB, dropped {r['art_frames_dropped']} stale art frames")
+    print(f"{'event':<10} {'stage':<10} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for kind, k in r["trace"].items():
+        for stage, h in k["stages"].items():
+            print(f"{kind:<10} {stage:<10} {h['count']:>6} {h['p50_ms']:>8.2f} {h['p95_ms']:>8.2f} {h['p99_ms']:>8.2f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(r, f, indent=2)
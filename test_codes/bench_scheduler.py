@@ -0,0 +1,59 @@
+"""Latency of control frames under art load, priority scheduler vs. plain FIFO.
+
+Pushes a stream of full art transfers through a Link into the rate-limited device stand-in
+from bench_flow_control, while playback/meta/timeline frames arrive every 20 ms.
+
+Run from the repo root: python test_codes/bench_scheduler.py
+"""
+import asyncio
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from packet_encoder import encode_meta, encode_playback, encode_timeline, encode_art, ArtFormat
+from scheduler import TxScheduler, PRIO_NAMES
+from transport import Link, TcpTransport
+from bench_flow_control import tcp_device
+
+async def run(prioritize: bool, rate: float, arts: int = 3) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, "images", "readme_demo.jpg"), "rb") as f:
+        art = [bytes(p) for p in encode_art(f.read(), ArtFormat.RGB565)]
+
+    controls = []
+    duration = arts * sum(map(len, art)) / rate
+    for i in range(int(duration / 0.02)):
+        controls.append(encode_timeline(i, 600) if i % 3 == 0 else encode_playback(4 + i % 2) if i % 3 == 1 else encode_meta(f"T{i}", "A", "B"))
+    total = arts * sum(map(len, art)) + sum(map(len, controls))
+
+    done = threading.Event()
+    host, port = tcp_device(total, rate, True, done, art_ends=arts)
+    link = Link(TcpTransport(host, port), asyncio.get_running_loop(), TxScheduler(prioritize), max_queue_bytes=None)
+    link.start()
+    await link.connected.wait()
+
+    for _ in range(arts):
+        for frame in art:
+            link.send(frame)
+    for frame in controls:
+        link.send(frame)
+        await asyncio.sleep(0.02)
+    # Coalesced timeline frames never reach the device, so only wait for the queue to drain
+    while link.scheduler.qsize():
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.2)
+    link.task.cancel()
+    return link.scheduler.stats()
+
+if __name__ == '__main__':
+    rate = 92160
+    for prioritize in (False, True):
+        stats = asyncio.run(run(prioritize, rate))
+        print(f"\n{'priority' if prioritize else 'fifo'} scheduler, device rate {rate / 1000:.1f} kB/s")
+        print(f"{'class':<10} {'sent':>6} {'coalesced':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        for name in PRIO_NAMES:
+            c = stats[name]
+            print(f"{name:<10} {c['sent']:>6} {c['coalesced']:>10} {c['latency_ms_p50']:>9.1f} "
+                  f"{c['latency_ms_p95']:>9.1f} {c['latency_ms_p99']:>9.1f} {c['latency_ms_max']:>9.1f}")
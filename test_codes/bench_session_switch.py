@@ -0,0 +1,135 @@
+"""Time from Windows switching the current media session to the device showing it.
+
+Replays two sessions (a playing Spotify and a paused YouTube tab) with the current session
+flipping between them every two seconds, and the background one changing track now and then.
+Thumbnail reads are delayed like WinRT's stream round trip. The firmware simulator times
+when the title and the art (classified by the nearest known image) of each switch land.
+
+Run from the repo root: python test_codes/bench_session_switch.py
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from art_cache import ArtCache
+from device_sim import DeviceSimulator
+from media_controller import MediaController, ART_SIZE
+from media_source import ReplaySource, PlaybackStatus
+from packet_encoder import convert_image_to_rgb565
+from transport import Link, TcpTransport
+from bench_device_latency import start_simulator, pct
+from bench_replay import make_thumbnails
+
+APPS = ("Spotify.exe", "Chrome")
+
+def make_trace(path: str, switches: int) -> tuple[list[tuple[float, str, int]], list[bytes]]:
+    """Writes the trace, returns (time, title, album) the device should show after each switch."""
+    thumbs = make_thumbnails(8)
+    ids = [hashlib.blake2b(t, digest_size=8).hexdigest() for t in thumbs]
+    lines = [{"t": 0.0, "type": "session", "app": APPS[0]}]
+    lines += [{"t": 0.0, "type": "thumbnail", "id": i, "data": base64.b64encode(t).decode()} for i, t in zip(ids, thumbs)]
+    showing = {} # app -> (title, album)
+    next_album = 0
+
+    def track(t, app):
+        nonlocal next_album
+        album = next_album % len(thumbs)
+        next_album += 1
+        title = f"{app} track {next_album}"
+        showing[app] = (title, album)
+        lines.append({"t": t, "type": "media", "app": app, "title": title, "artist": "Artist",
+                      "album": f"Album {album}", "thumbnail": ids[album]})
+
+    for app, status in zip(APPS, (PlaybackStatus.PLAYING, PlaybackStatus.PAUSED)):
+        track(0.1, app)
+        lines.append({"t": 0.1, "type": "playback", "app": app, "status": int(status)})
+        lines.append({"t": 0.1, "type": "timeline", "app": app, "position": 30.0, "end": 200.0})
+
+    expected = []
+    t = 4.5 # MediaController.setup polls for a session every 2 s, then the first art goes out
+    current = 0
+    for n in range(switches):
+        if n % 3 == 2:
+            track(t - 1.0, APPS[1 - current]) # Background session moves on
+        current = 1 - current
+        lines.append({"t": t, "type": "session", "app": APPS[current]})
+        expected.append((t, *showing[APPS[current]]))
+        t += 2.0
+    lines.sort(key=lambda e: e["t"])
+    with open(path, "w") as f:
+        for line in lines:
+            f.write(json.dumps(line) + "\n")
+    return expected, thumbs
+
+async def run(switches: int, rate: float, thumbnail_delay: float) -> dict:
+    path = os.path.join(tempfile.gettempdir(), "session_switch.jsonl")
+    expected, thumbs = make_trace(path, switches)
+    images = np.stack([np.frombuffer(convert_image_to_rgb565(t, ART_SIZE), dtype='<u2').astype(np.int32) for t in thumbs])
+
+    draws = [] # (time, kind, title or album)
+    def on_visible(event):
+        if event.kind == "meta":
+            draws.append((event.time, "meta", event.detail))
+        elif event.kind == "art" and sim.art.frame is not None:
+            frame = np.frombuffer(bytes(sim.art.frame), dtype='<u2').astype(np.int32)
+            draws.append((event.time, "art", int(np.abs(images - frame).mean(axis=1).argmin())))
+
+    sim = DeviceSimulator(consume_rate=rate, on_visible=on_visible)
+    loop = asyncio.get_running_loop()
+    link = Link(TcpTransport(*start_simulator(sim, "tcp")), loop)
+    link.start()
+    await link.connected.wait()
+    source = ReplaySource(path, thumbnail_delay=thumbnail_delay)
+    controller = MediaController(loop, link, ArtCache(), source=source)
+    manager = await source.open()
+    await controller.setup(manager)
+    bytes_before = link.bytes_sent
+    await loop.run_in_executor(None, source.done.wait)
+    await asyncio.sleep(2.0)
+    link.task.cancel()
+    controller.timeline_task.cancel()
+
+    latency = {"meta": [], "art": []}
+    missed = {"meta": 0, "art": 0}
+    for i, (t, title, album) in enumerate(expected):
+        start = source.start_time + t
+        until = source.start_time + expected[i + 1][0] if i + 1 < len(expected) else float("inf")
+        for kind, want in (("meta", title), ("art", album)):
+            shown = [dt for dt, k, d in draws if k == kind and d == want and start <= dt < until]
+            if shown:
+                latency[kind].append((shown[0] - start) * 1000)
+            else:
+                missed[kind] += 1
+    result = {"switches": len(expected), "bytes_per_switch": (link.bytes_sent - bytes_before) / len(expected)}
+    for kind, values in latency.items():
+        result[kind] = {"missed": missed[kind], "p50_ms": pct(values, 0.5), "p95_ms": pct(values, 0.95),
+                        "max_ms": max(values, default=0.0)}
+    if hasattr(controller, "stats"):
+        result["controller"] = controller.stats()
+    return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--switches", type=int, default=15)
+    parser.add_argument("--rate", type=float, default=92160, help="simulated device consume rate, bytes/s")
+    parser.add_argument("--thumbnail-delay", type=float, default=0.08)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    r = asyncio.run(run(args.switches, args.rate, args.thumbnail_delay))
+    print(f"\n{r['switches']} session switches, {r['bytes_per_switch'] / 1000:.1f} kB sent per switch")
+    for kind in ("meta", "art"):
+        k = r[kind]
+        print(f"{kind:<5} missing for {k['missed']}; time to screen p50 {k['p50_ms']:.0f} ms, "
+              f"p95 {k['p95_ms']:.0f} ms, max {k['max_ms']:.0f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(r, f, indent=2)
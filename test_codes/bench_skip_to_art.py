@@ -0,0 +1,111 @@
+"""Time from settling on a track after a burst of skips to its art being on screen.
+
+Replays bursts of skips across albums (each properties event first without, then with the
+thumbnail, like WinRT), with a delay on thumbnail reads standing in for WinRT's stream round
+trip. The firmware simulator classifies every art draw by the nearest known album image.
+
+Run from the repo root: python test_codes/bench_skip_to_art.py
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import base64
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from art_cache import ArtCache
+from device_sim import DeviceSimulator
+from media_controller import MediaController, ART_SIZE
+from media_source import ReplaySource, PlaybackStatus
+from packet_encoder import convert_image_to_rgb565
+from transport import Link, TcpTransport
+from bench_device_latency import start_simulator
+from bench_replay import make_thumbnails
+
+def make_trace(path: str, rounds: int, burst: int, seed: int = 0) -> list[tuple[float, int]]:
+    """Writes the trace, returns (time, album) of each settled-on track."""
+    rng = random.Random(seed)
+    thumbs = make_thumbnails(12)
+    ids = [hashlib.blake2b(t, digest_size=8).hexdigest() for t in thumbs]
+    lines = [{"t": 0.0, "type": "session", "app": "Spotify.exe"}]
+    lines += [{"t": 0.0, "type": "thumbnail", "id": i, "data": base64.b64encode(t).decode()} for i, t in zip(ids, thumbs)]
+    settled = []
+    t = 2.5 # MediaController.setup polls for a session every 2 s
+    track = 0
+    album = 0
+    for _ in range(rounds):
+        for k in range(burst):
+            track += 1
+            album = (album + rng.randrange(1, len(thumbs))) % len(thumbs)
+            meta = {"type": "media", "title": f"Track {track}", "artist": "Artist", "album": f"Album {album}"}
+            lines.append({"t": t, **meta, "thumbnail": None})
+            lines.append({"t": t + 0.05, **meta, "thumbnail": ids[album]})
+            lines.append({"t": t + 0.01, "type": "playback", "status": int(PlaybackStatus.PLAYING)})
+            if k < burst - 1:
+                t += rng.uniform(0.04, 0.15)
+        settled.append((t, album))
+        t += 2.0
+    lines.sort(key=lambda e: e["t"])
+    with open(path, "w") as f:
+        for line in lines:
+            f.write(json.dumps(line) + "\n")
+    return settled, thumbs
+
+async def run(rounds: int, burst: int, rate: float, thumbnail_delay: float) -> dict:
+    path = os.path.join(tempfile.gettempdir(), "skip_to_art.jsonl")
+    settled, thumbs = make_trace(path, rounds, burst)
+    expected = np.stack([np.frombuffer(convert_image_to_rgb565(t, ART_SIZE), dtype='<u2').astype(np.int32) for t in thumbs])
+
+    draws = [] # (time, album)
+    def on_visible(event):
+        if event.kind != "art" or sim.art.frame is None:
+            return
+        frame = np.frombuffer(bytes(sim.art.frame), dtype='<u2').astype(np.int32)
+        distance = np.abs(expected - frame).mean(axis=1)
+        draws.append((event.time, int(distance.argmin())))
+
+    sim = DeviceSimulator(consume_rate=rate, on_visible=on_visible)
+    loop = asyncio.get_running_loop()
+    link = Link(TcpTransport(*start_simulator(sim, "tcp")), loop)
+    link.start()
+    await link.connected.wait()
+    source = ReplaySource(path, thumbnail_delay=thumbnail_delay)
+    controller = MediaController(loop, link, ArtCache(), source=source)
+    manager = await source.open()
+    await controller.setup(manager)
+    await loop.run_in_executor(None, source.done.wait)
+    await asyncio.sleep(2.0)
+    link.task.cancel()
+    controller.timeline_task.cancel()
+
+    latencies = []
+    missed = 0
+    for i, (t, album) in enumerate(settled):
+        event_time = source.start_time + t
+        until = source.start_time + settled[i + 1][0] if i + 1 < len(settled) else float("inf")
+        shown = [dt for dt, a in draws if a == album and event_time <= dt < until]
+        if shown:
+            latencies.append((shown[0] - event_time) * 1000)
+        else:
+            missed += 1
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+    return {"settled": len(settled), "missed": missed, "p50_ms": pct(0.5), "p95_ms": pct(0.95), "max_ms": latencies[-1] if latencies else 0.0}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--burst", type=int, default=3, help="skips per burst")
+    parser.add_argument("--rate", type=float, default=92160, help="simulated device consume rate, bytes/s")
+    parser.add_argument("--thumbnail-delay", type=float, default=0.08)
+    args = parser.parse_args()
+    r = asyncio.run(run(args.rounds, args.burst, args.rate, args.thumbnail_delay))
+    print(f"\n{r['settled']} settled tracks, art missing for {r['missed']}; "
+          f"time to art p50 {r['p50_ms']:.0f} ms, p95 {r['p95_ms']:.0f} ms, max {r['max_ms']:.0f} ms")
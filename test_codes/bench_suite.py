@@ -0,0 +1,216 @@
+"""Benchmark suite for the encoder and TX hot paths, with machine-readable results.
+
+Each case reports ops/s (best of several timed repeats), the traced peak memory of one call
+and the number of allocation blocks still alive after it (tracemalloc). End-to-end cases push
+full art transfers through a Link into a local TCP sink and into a pty pair.
+
+Run from the repo root:
+    python test_codes/bench_suite.py --out before.json
+    python test_codes/bench_suite.py --out after.json --compare before.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import PIL
+from packet_encoder import _crc, crc16, encode, encode_v2, encode_meta, encode_art, convert_image_to_rgb565, ArtFormat, ART_CHUNK
+from transport import Link, SerialTransport, TcpTransport
+from bench_flow_control import pty_device
+from bench_tcp_batching import tcp_sink
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ART_SIZE = (240, 200)
+
+def make_thumbnail(px: int, fmt: str) -> bytes:
+    """The demo image scaled to a `px` square and re-encoded, like a WinRT thumbnail stream."""
+    with Image.open(os.path.join(ROOT, "images", "readme_demo.jpg")) as img:
+        img = img.convert("RGB").resize((px, px), Image.Resampling.BICUBIC)
+    out = io.BytesIO()
+    img.save(out, format=fmt)
+    return out.getvalue()
+
+def traced_call(fn) -> tuple[int, int]:
+    """Returns (peak traced bytes, allocation blocks still alive) for one call of `fn`."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    before = tracemalloc.take_snapshot()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(max(s.count_diff, 0) for s in after.compare_to(before, "filename"))
+    del result
+    return peak - base, retained
+
+_TRACE_OVERHEAD = None # Blocks the snapshotting itself leaves behind, measured once
+
+def measure(fn, min_time: float) -> dict:
+    """Times `fn` and traces the memory of a single call."""
+    global _TRACE_OVERHEAD
+    if _TRACE_OVERHEAD is None:
+        _TRACE_OVERHEAD = min(traced_call(lambda: None)[1] for _ in range(3))
+    fn() # Warm up caches and lazy imports
+    number = 1
+    while True:
+        t = timeit.timeit(fn, number=number)
+        if t >= min_time / 5 or number >= 1 << 20:
+            break
+        number *= 4
+    best = min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+    peak, retained = traced_call(fn)
+    return {
+        "ops_per_s": 1 / best,
+        "mean_us": best * 1e6,
+        "peak_bytes": peak,
+        "retained_blocks": max(retained - _TRACE_OVERHEAD, 0),
+    }
+
+def micro_cases(quick: bool) -> list[tuple[str, dict, object]]:
+    rng = np.random.default_rng(0)
+    cases = []
+    for n in (16, 3072, 96000):
+        data = rng.integers(0, 256, n, dtype=np.uint8).tobytes()
+        cases.append(("_crc", {"bytes": n}, lambda d=data: _crc(d)))
+        cases.append(("crc16", {"bytes": n}, lambda d=data: crc16(d)))
+    for n in (8, 3076):
+        payload = rng.integers(0, 256, n, dtype=np.uint8).tobytes()
+        cases.append(("encode", {"payload_bytes": n}, lambda p=payload: encode(ART_CHUNK, p)))
+        cases.append(("encode_v2", {"payload_bytes": n}, lambda p=payload: encode_v2(ART_CHUNK, p, 0)))
+
+    title = "夜に駆ける (Extended Mix) — " * 8
+    artist = "YOASOBI × Ikura 🎤"
+    cases.append(("encode_meta", {"chars": len(title) + len(artist) + 5, "kind": "multi-byte"},
+                  lambda: encode_meta(title, artist, "THE BOOK")))
+    cases.append(("encode_meta", {"chars": 30, "kind": "ascii"},
+                  lambda: encode_meta("Blinding Lights", "The Weeknd", "After Hours")))
+
+    sizes = (300, 1000) if quick else (300, 600, 1000, 2000, 3000)
+    for fmt in ("JPEG", "PNG"):
+        for px in sizes:
+            thumb = make_thumbnail(px, fmt)
+            params = {"input": fmt, "px": px, "input_bytes": len(thumb)}
+            cases.append(("convert_image_to_rgb565", params, lambda t=thumb: convert_image_to_rgb565(t, ART_SIZE)))
+            for art_format in (ArtFormat.RGB565, ArtFormat.RGB565_RLE, ArtFormat.JPEG):
+                cases.append(("encode_art", {**params, "format": art_format.name},
+                              lambda t=thumb, f=art_format: encode_art(t, f, size=ART_SIZE)))
+    return cases
+
+async def transfer_tcp(art: list[bytes], transfers: int) -> float:
+    result = {"recv_calls": 0}
+    done = threading.Event()
+    link = Link(TcpTransport(*tcp_sink(transfers, result, done)), asyncio.get_running_loop(), max_queue_bytes=None)
+    link.start()
+    await link.connected.wait()
+    await link.credit_window.acquire(0)
+    start = time.perf_counter()
+    for _ in range(transfers):
+        for frame in art:
+            link.send(frame)
+    await asyncio.get_running_loop().run_in_executor(None, done.wait, 60)
+    elapsed = time.perf_counter() - start
+    link.task.cancel()
+    return elapsed
+
+async def transfer_pty(art: list[bytes], rate: float) -> float:
+    done = threading.Event()
+    link = Link(SerialTransport(pty_device(sum(map(len, art)), rate, True, done)), asyncio.get_running_loop(), max_queue_bytes=None)
+    link.start()
+    await link.connected.wait()
+    await link.credit_window.acquire(0)
+    start = time.perf_counter()
+    for frame in art:
+        link.send(frame)
+    await asyncio.get_running_loop().run_in_executor(None, done.wait, 60)
+    elapsed = time.perf_counter() - start
+    link.task.cancel()
+    return elapsed
+
+def e2e_cases(quick: bool) -> list[dict]:
+    thumb = make_thumbnail(600, "JPEG")
+    results = []
+    for art_format in (ArtFormat.RGB565, ArtFormat.RGB565_RLE, ArtFormat.JPEG):
+        art = [bytes(p) for p in encode_art(thumb, art_format, size=ART_SIZE)]
+        size = sum(map(len, art))
+        transfers = 10 if quick else 50
+        elapsed = asyncio.run(transfer_tcp(art, transfers))
+        results.append({"name": "e2e_tcp_sink", "params": {"format": art_format.name, "transfer_bytes": size, "transfers": transfers},
+                        "transfers_per_s": transfers / elapsed, "MBps": size * transfers / elapsed / 1e6})
+        if sys.platform != "win32":
+            rate = 2_000_000 # pty stand-in consume rate, bytes/s
+            elapsed = asyncio.run(transfer_pty(art, rate))
+            results.append({"name": "e2e_pty", "params": {"format": art_format.name, "transfer_bytes": size, "device_Bps": rate},
+                            "transfers_per_s": 1 / elapsed, "MBps": size / elapsed / 1e6})
+    return results
+
+def environment() -> dict:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        rev = ""
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git": rev,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pillow": PIL.__version__,
+    }
+
+def case_key(r: dict) -> str:
+    return r["name"] + " " + " ".join(f"{k}={v}" for k, v in sorted(r["params"].items()))
+
+def compare(results: list[dict], baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = {case_key(r): r for r in json.load(f)["results"]}
+    print(f"\ncompared to {baseline_path} (>1 is faster)")
+    for r in results:
+        old = baseline.get(case_key(r))
+        if old is None:
+            continue
+        metric = "ops_per_s" if "ops_per_s" in r else "MBps"
+        print(f"{case_key(r):<75} {r[metric] / old[metric]:6.2f} x")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--quick", action="store_true", help="fewer sizes and shorter timings")
+    parser.add_argument("--no-e2e", action="store_true", help="skip the transport benchmarks")
+    args = parser.parse_args()
+
+    min_time = 0.05 if args.quick else 0.25
+    results = []
+    for name, params, fn in micro_cases(args.quick):
+        r = {"name": name, "params": params, **measure(fn, min_time)}
+        results.append(r)
+        print(f"{case_key(r):<75} {r['ops_per_s']:>11.1f} ops/s {r['peak_bytes'] / 1024:>9.1f} KiB peak {r['retained_blocks']:>5} blocks")
+    if not args.no_e2e:
+        for r in e2e_cases(args.quick):
+            results.append(r)
+            print(f"{case_key(r):<75} {r['transfers_per_s']:>8.1f} transfers/s {r['MBps']:>7.2f} MB/s")
+
+    report = {"environment": environment(), "results": results}
+    if sys.platform != "win32":
+        import resource
+        report["environment"]["max_rss_kB"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nwrote {args.out}")
+    if args.compare:
+        compare(results, args.compare)
@@ -0,0 +1,122 @@
+"""Segments and send calls per art transfer, one write per frame vs. batched vectored writes.
+
+A local TCP sink grants credit like the firmware and drains as fast as it can. The host sends
+full art transfers (with a few control frames in between) through a Link, once with batching
+disabled and once with the default byte budget. Segments are read from the kernel's TCP_INFO
+on Linux, and the sink's recv calls are reported as a portable proxy.
+
+Run from the repo root: python test_codes/bench_tcp_batching.py
+"""
+import argparse
+import asyncio
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from packet_encoder import encode_meta, encode_playback, encode_timeline, encode_art, encode_credit, ArtFormat, FrameDecoder, ART_END
+from transport import Link, TcpTransport
+
+RX_WINDOW = 16384
+CREDIT_BATCH = 2048
+
+def segs_out(sock: socket.socket) -> int | None:
+    """tcpi_segs_out from TCP_INFO (Linux 4.2+), None where unavailable."""
+    if not hasattr(socket, "TCP_INFO"):
+        return None
+    info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, 256)
+    if len(info) < 140:
+        return None
+    return struct.unpack_from("I", info, 136)[0]
+
+def tcp_sink(transfers: int, result: dict, done: threading.Event, release: threading.Event = None) -> tuple[str, int]:
+    """Drains the connection, returning credit, until `transfers` ART_END frames arrived.
+
+    Then sets `done`, and closes the connection once `release` is set too, if given.
+    """
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+
+    def serve():
+        conn, _ = server.accept()
+        server.close()
+        conn.sendall(encode_credit(RX_WINDOW))
+        decoder = FrameDecoder()
+        consumed = 0
+        ends = 0
+        while ends < transfers:
+            data = conn.recv(65536)
+            if not data:
+                break
+            result["recv_calls"] += 1
+            consumed += len(data)
+            if consumed >= CREDIT_BATCH:
+                conn.sendall(encode_credit(consumed))
+                consumed = 0
+            ends += sum(1 for msg_type, _ in decoder.feed(data) if msg_type == ART_END)
+        done.set()
+        if release:
+            release.wait(10)
+        conn.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server.getsockname()
+
+async def run(batch_bytes: int, transfers: int) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, "images", "readme_demo.jpg"), "rb") as f:
+        art = [bytes(p) for p in encode_art(f.read(), ArtFormat.RGB565)]
+
+    result = {"recv_calls": 0}
+    done, release = threading.Event(), threading.Event()
+    host, port = tcp_sink(transfers, result, done, release) # Kept open until measured, the link drops the socket on close
+    transport = TcpTransport(host, port)
+    link = Link(transport, asyncio.get_running_loop(), batch_bytes=batch_bytes, max_queue_bytes=None)
+    link.start()
+    await link.connected.wait()
+    await link.credit_window.acquire(0) # Wait for the initial grant
+
+    segs_before = segs_out(transport.sock)
+    calls_before = transport.send_calls
+    start = time.perf_counter()
+    for i in range(transfers):
+        link.send(encode_meta(f"Track {i}", "Artist", "Album"))
+        link.send(encode_playback(4))
+        for n, frame in enumerate(art):
+            link.send(frame)
+            if n % 8 == 0:
+                link.send(encode_timeline(i, 180))
+                await asyncio.sleep(0) # Let the sender run, like frames trickling in from callbacks
+    await asyncio.get_running_loop().run_in_executor(None, done.wait, 60)
+    elapsed = time.perf_counter() - start
+    segs_after = segs_out(transport.sock)
+    calls = transport.send_calls - calls_before
+    link.task.cancel()
+    release.set()
+
+    return {
+        "batch_bytes": batch_bytes,
+        "frames": link.frames_sent,
+        "elapsed_s": elapsed,
+        "send_calls_per_transfer": calls / transfers,
+        "send_calls_per_s": calls / elapsed,
+        "segments_per_transfer": (segs_after - segs_before) / transfers if segs_before is not None else None,
+        "recv_calls_per_transfer": result["recv_calls"] / transfers,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transfers", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{args.transfers} art transfers over loopback TCP")
+    print(f"{'batch':>7} {'frames':>7} {'ms':>8} {'sends/xfer':>11} {'sends/s':>9} {'segs/xfer':>10} {'recvs/xfer':>11}")
+    for batch_bytes in (0, 12288):
+        r = asyncio.run(run(batch_bytes, args.transfers))
+        segs = f"{r['segments_per_transfer']:.1f}" if r["segments_per_transfer"] is not None else "n/a"
+        print(f"{r['batch_bytes']:>7} {r['frames']:>7} {r['elapsed_s'] * 1000:>8.1f} {r['send_calls_per_transfer']:>11.1f} "
+              f"{r['send_calls_per_s']:>9.0f} {segs:>10} {r['recv_calls_per_transfer']:>11.1f}")
@@ -0,0 +1,130 @@
+"""Timeline frames on the link and timeline bar accuracy on the device, 1 Hz TIMELINE vs TIMELINE_SYNC.
+
+Replays a track played at 1x with WinRT-style timeline reports every 5 s (a little jitter),
+then a seek, a pause, a resume and a switch to 1.5x. The firmware simulator extrapolates
+TIMELINE_SYNC itself. Every 50 ms the bar on the simulated screen is compared with where it
+should be.
+
+Run from the repo root: python test_codes/bench_timeline.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from art_cache import ArtCache
+from device_sim import DeviceSimulator, WIDTH
+from media_controller import MediaController
+from media_source import ReplaySource, PlaybackStatus
+from scheduler import PRIO_TIMELINE
+from transport import Link, TcpTransport
+from bench_device_latency import start_simulator, pct
+
+DURATION = 180.0 # Of the track, seconds
+STEADY = (5.0, 20.0) # Trace seconds of undisturbed playback
+
+def make_trace(path: str, length: float, seed: int = 0) -> list[tuple[float, float, float]]:
+    """Writes the trace, returns the true playback as (from time, position then, rate)."""
+    rng = random.Random(seed)
+    truth = [(0.0, 0.0, 1.0)]
+    lines = [
+        {"t": 0.0, "type": "session", "app": "Spotify.exe"},
+        {"t": 0.0, "type": "media", "title": "Track", "artist": "Artist", "album": "Album", "thumbnail": None},
+        {"t": 0.0, "type": "playback", "status": int(PlaybackStatus.PLAYING)},
+        {"t": 0.0, "type": "timeline", "position": 0.0, "end": DURATION},
+    ]
+
+    def position(t):
+        start, pos, rate = [seg for seg in truth if seg[0] <= t][-1]
+        return pos + (t - start) * rate
+
+    def change(t, pos, rate, playback=None):
+        truth.append((t, pos, rate))
+        if playback:
+            lines.append({"t": t, "type": "playback", **playback})
+        lines.append({"t": t, "type": "timeline", "position": pos, "end": DURATION})
+
+    changes = {20.0: lambda t: change(t, 120.0, 1.0), # Seek
+               28.0: lambda t: change(t, position(t), 0.0, {"status": int(PlaybackStatus.PAUSED)}),
+               32.0: lambda t: change(t, position(t), 1.0, {"status": int(PlaybackStatus.PLAYING)}),
+               36.0: lambda t: change(t, position(t), 1.5, {"status": int(PlaybackStatus.PLAYING), "rate": 1.5})}
+    t = 0.0
+    while t < length:
+        step = min([c for c in changes if c > t] + [t + 5.0])
+        if step in changes:
+            changes.pop(step)(step)
+        elif truth[-1][2]:
+            # Periodic report while playing
+            lines.append({"t": step, "type": "timeline", "position": position(step) + rng.uniform(-0.05, 0.05), "end": DURATION})
+        t = step
+    lines.sort(key=lambda e: e["t"])
+    with open(path, "w") as f:
+        for line in lines:
+            f.write(json.dumps(line) + "\n")
+    return truth
+
+def true_width(truth, t: float) -> int:
+    start, pos, rate = [seg for seg in truth if seg[0] <= t][-1]
+    return min(int((pos + (t - start) * rate) * 1000) * WIDTH // int(DURATION * 1000), WIDTH)
+
+async def run(sync: bool, length: float) -> dict:
+    path = os.path.join(tempfile.gettempdir(), "timeline.jsonl")
+    truth = make_trace(path, length)
+
+    sim = DeviceSimulator()
+    loop = asyncio.get_running_loop()
+    link = Link(TcpTransport(*start_simulator(sim, "tcp")), loop)
+    link.start()
+    await link.connected.wait()
+    source = ReplaySource(path)
+    controller = MediaController(loop, link, ArtCache(), source=source)
+    controller.timeline_sync = sync
+    manager = await source.open()
+    await controller.setup(manager)
+
+    errors = [] # Bar pixels off, sampled after setup
+    frames_at = {}
+    marks = [STEADY[0], STEADY[1], 4.0]
+    while (t := time.perf_counter() - source.start_time) < length:
+        for mark in marks:
+            if t >= mark and mark not in frames_at:
+                frames_at[mark] = link.scheduler.sent[PRIO_TIMELINE]
+        if t >= 4.0:
+            errors.append(abs(sim.timeline_width - true_width(truth, t)))
+        await asyncio.sleep(0.05)
+    frames_at[length] = link.scheduler.sent[PRIO_TIMELINE]
+    link.task.cancel()
+    controller.timeline_task.cancel()
+
+    steady = frames_at[STEADY[1]] - frames_at[STEADY[0]]
+    return {
+        "mode": "TIMELINE_SYNC" if sync else "TIMELINE 1 Hz",
+        "frames_per_min_steady": steady / (STEADY[1] - STEADY[0]) * 60,
+        "frames_per_min": (frames_at[length] - frames_at[4.0]) / (length - 4.0) * 60,
+        "bar_error_px_mean": sum(errors) / len(errors),
+        "bar_error_px_p95": pct(errors, 0.95),
+        "bar_error_px_max": max(errors),
+    }
+
+async def main(length: float) -> list[dict]:
+    return [await run(False, length), await run(True, length)]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--length", type=float, default=45.0, help="trace seconds to replay (at 1x)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    results = asyncio.run(main(args.length))
+    print(f"\n{'mode':<15} {'frames/min steady':>17} {'frames/min':>10} {'bar error px mean':>17} {'p95':>4} {'max':>4}")
+    for r in results:
+        print(f"{r['mode']:<15} {r['frames_per_min_steady']:>17.1f} {r['frames_per_min']:>10.1f} "
+              f"{r['bar_error_px_mean']:>17.2f} {r['bar_error_px_p95']:>4} {r['bar_error_px_max']:>4}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,73 @@
+"""ART_TILE deltas against the full-frame path: the device must end up showing the same pixels.
+
+For pairs of covers (identical, a few pixels changed, noise within the tolerance, a different
+cover) and several tile sizes, the tiles from encode_art_delta are applied with apply_art_tile
+onto the old frame, and the frames go through FrameDecoder and ArtReceiver onto a receiver
+that shows the old cover from a full-frame transfer. Both must give the frame encode_art_delta
+returns, which is the new cover exactly at tolerance 0. Exits non-zero on a failure.
+
+Run from the repo root: python test_codes/check_art_delta.py
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from packet_encoder import encode_art_delta, apply_art_tile, packetize_art, FrameDecoder, ArtReceiver, ArtFormat
+from bench_progressive import make_covers
+from bench_suite import ART_SIZE
+
+def pairs() -> list[tuple[str, bytes, bytes]]:
+    covers = make_covers(2)
+    rng = np.random.default_rng(0)
+    pixels = np.frombuffer(covers[0], dtype='<u2')
+
+    spots = pixels.copy()
+    spots[rng.choice(len(spots), 40, replace=False)] ^= 0xFFFF
+    noise = pixels.copy()
+    noise ^= rng.integers(0, 2, len(noise), dtype=np.uint16) # Lowest blue bit, within tolerance 2
+    edge = pixels.copy().reshape(ART_SIZE[1], ART_SIZE[0])
+    edge[-1, -1] ^= 0xFFFF # Bottom right, in a partial tile for some tile sizes
+    return [("identical", covers[0], covers[0]), ("spots", covers[0], spots.tobytes()),
+            ("noise", covers[0], noise.tobytes()), ("edge pixel", covers[0], edge.tobytes()),
+            ("other cover", covers[0], covers[1])]
+
+def receive(receiver: ArtReceiver, frames: list) -> ArtReceiver:
+    decoder = FrameDecoder()
+    for frame in frames:
+        for msg_type, payload in decoder.feed(bytes(frame)):
+            receiver.handle(msg_type, payload)
+    return receiver
+
+def check() -> list[str]:
+    failures = []
+    for name, old, new in pairs():
+        for tile in ((20, 20), (16, 16), (7, 13), (240, 1)):
+            for tolerance in (0, 2):
+                case = f"{name}, tile {tile[0]}x{tile[1]}, tolerance {tolerance}"
+                frames, result = encode_art_delta(old, new, ART_SIZE, tile, tolerance, transfer_id=1)
+                if tolerance == 0 and result != new:
+                    failures.append(f"{case}: returned frame isn't the new cover")
+
+                frame = bytearray(old)
+                for f in frames:
+                    apply_art_tile(frame, ART_SIZE, bytes(f)[4:-1])
+                if bytes(frame) != result:
+                    failures.append(f"{case}: apply_art_tile gives a different frame")
+
+                receiver = receive(ArtReceiver(), packetize_art(old, ArtFormat.RGB565, size=ART_SIZE, transfer_id=0))
+                receive(receiver, frames)
+                if bytes(receiver.frame) != result:
+                    failures.append(f"{case}: ArtReceiver shows a different frame")
+                if name == "identical" and frames:
+                    failures.append(f"{case}: {len(frames)} tiles for an unchanged cover")
+    return failures
+
+if __name__ == '__main__':
+    failures = check()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("art delta: " + ("ok" if not failures else f"{len(failures)} failures"))
+    sys.exit(1 if failures else 0)
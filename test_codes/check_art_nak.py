@@ -0,0 +1,78 @@
+"""Selective art resends: a cover must get through whichever of its frames is lost.
+
+A cover is queued on a Link (with and without a preview ahead of it) and the frames it writes
+go through FrameDecoder to an ArtReceiver, once with each frame dropped in turn, then with a
+few pairs dropped. The receiver's ART_NAK replies go back to the Link, and a round without a
+reply counts as the ART_END timeout. Every case must end with the full cover drawn and the
+transfer acknowledged, without the Link giving up. Exits non-zero on a failure.
+
+Run from the repo root: python test_codes/check_art_nak.py
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from packet_encoder import packetize_art, packetize_art_progressive, FrameDecoder, ArtReceiver, ArtFormat
+from transport import Link, Transport
+from bench_progressive import make_covers
+from bench_suite import ART_SIZE
+
+def drain(link: Link) -> list[bytes]:
+    frames = []
+    while (item := link.scheduler.get_nowait()) is not None:
+        frames.append(item[2])
+    return frames
+
+def deliver(frames: list, drop: set[int], loop: asyncio.AbstractEventLoop) -> tuple[ArtReceiver, Link]:
+    """Queues `frames`, loses those at the indices in `drop` the first time, answers until done."""
+    link = Link(Transport(), loop, adaptive=False)
+    link.connected.set()
+    for frame in frames:
+        link._put(bytes(frame), None, None)
+    replies = []
+    receiver, decoder = ArtReceiver(send=replies.append), FrameDecoder()
+    for round in range(link.art_retries + 2):
+        for i, frame in enumerate(drain(link)):
+            if round == 0 and i in drop:
+                continue
+            for msg_type, payload in decoder.feed(frame):
+                receiver.handle(msg_type, payload)
+        if not replies and link.art_transfer:
+            link._art_timed_out(link.art_transfer, link.art_transfer.rounds)
+        for reply in replies:
+            for msg_type, payload in FrameDecoder().feed(reply):
+                link._on_frame(msg_type, payload)
+        replies.clear()
+        if link.art_transfer is None and not link.scheduler.qsize():
+            break
+    return receiver, link
+
+def check() -> list[str]:
+    failures = []
+    loop = asyncio.new_event_loop()
+    cover = make_covers(1)[0]
+    transfers = {
+        "full frame": packetize_art(cover, ArtFormat.RGB565_RLE, 1024, ART_SIZE, transfer_id=1, nak=True),
+        "preview and full frame": packetize_art_progressive(cover, ArtFormat.RGB565_RLE, 1024, ART_SIZE, transfer_id=1, nak=True),
+    }
+    for name, frames in transfers.items():
+        n = len(frames)
+        cases = [{i} for i in range(n)] + [{0, n - 1}, {1, 2}, {3, n - 2}]
+        for drop in cases:
+            receiver, link = deliver(frames, drop, loop)
+            case = f"{name}, frames {sorted(drop)} of {n} lost"
+            if receiver.frame is None or bytes(receiver.frame) != cover:
+                failures.append(f"{case}: the full cover isn't drawn")
+            if link.art_resends_failed or link.art_transfer is not None:
+                failures.append(f"{case}: not acknowledged after {link.art_chunks_resent} chunks resent")
+    loop.close()
+    return failures
+
+if __name__ == '__main__':
+    failures = check()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("art NAK: " + ("ok" if not failures else f"{len(failures)} failures"))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,98 @@
+"""A device that boots after the host, or drops its connection, must show the current session again.
+
+The host starts with nothing listening, so the track, playback state, timeline and art of the
+replayed session are all sent while the link is down and discarded. Then the firmware simulator
+starts on that port, and later the connection drops and comes back (a rebooting WiFi board
+starts from a black screen). After each connect the device must draw the title, the playback
+state, the timeline and the full cover, without a new media event. Exits non-zero on a failure.
+
+Run from the repo root: python test_codes/check_device_boot.py
+"""
+import asyncio
+import base64
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from art_cache import ArtCache
+from device_sim import DeviceSimulator, serve_tcp
+from media_controller import MediaController
+from media_source import ReplaySource, PlaybackStatus
+from transport import Link, TcpTransport
+from bench_fanout import closed_port
+from bench_replay import make_thumbnails
+
+def make_trace(path: str):
+    thumb = make_thumbnails(1)[0]
+    lines = [{"t": 0.0, "type": "session", "app": "Spotify.exe"},
+             {"t": 0.0, "type": "thumbnail", "id": "cover", "data": base64.b64encode(thumb).decode()},
+             {"t": 0.1, "type": "media", "title": "Track 1", "artist": "Artist", "album": "Album", "thumbnail": "cover"},
+             {"t": 0.1, "type": "playback", "status": int(PlaybackStatus.PLAYING)},
+             {"t": 0.1, "type": "timeline", "position": 30.0, "end": 200.0}]
+    with open(path, "w") as f:
+        for line in lines:
+            f.write(json.dumps(line) + "\n")
+
+def serve_later(sim: DeviceSimulator, address: tuple[str, int]):
+    """Runs the simulator on `address` on a background loop."""
+    async def run():
+        await serve_tcp(sim, *address)
+        await asyncio.Event().wait()
+    threading.Thread(target=asyncio.run, args=(run(),), daemon=True).start()
+
+async def shown_since(sim: DeviceSimulator, since: float, timeout: float = 6.0) -> set[str]:
+    """Kinds of visible updates after `since`, once the art is among them or after `timeout`."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        kinds = {e.kind for e in list(sim.events) if e.time >= since}
+        if "art" in kinds:
+            await asyncio.sleep(0.3) # Whatever follows the cover
+            break
+        await asyncio.sleep(0.05)
+    return {e.kind for e in list(sim.events) if e.time >= since}
+
+async def main() -> list[str]:
+    path = os.path.join(tempfile.gettempdir(), "device_boot.jsonl")
+    make_trace(path)
+    loop = asyncio.get_running_loop()
+    address = closed_port()
+    link = Link(TcpTransport(*address), loop)
+    link.start()
+    source = ReplaySource(path)
+    controller = MediaController(loop, link, ArtCache(), source=source)
+    await controller.setup(await source.open())
+    await loop.run_in_executor(None, source.done.wait)
+    await asyncio.sleep(0.5) # Art converted and sent into the void
+
+    failures = []
+    sim = DeviceSimulator()
+    for case in ("device boots after the host", "connection drops"):
+        since = time.perf_counter()
+        if case == "connection drops":
+            link.transport.sock.shutdown(socket.SHUT_RDWR)
+        else:
+            serve_later(sim, address)
+        kinds = await shown_since(sim, since)
+        missing = {"meta", "playback", "timeline", "art"} - kinds
+        if missing:
+            failures.append(f"{case}: {', '.join(sorted(missing))} not shown")
+        if sim.title != "Track 1":
+            failures.append(f"{case}: device shows {sim.title!r}")
+        if sim.art.frame is None or bytes(sim.art.frame) != controller.current.art_pixels:
+            failures.append(f"{case}: device doesn't show the full cover")
+    link.task.cancel()
+    controller.timeline_task.cancel()
+    return failures
+
+if __name__ == '__main__':
+    failures = asyncio.run(main())
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("device boot: " + ("ok" if not failures else f"{len(failures)} failures"))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,101 @@
+"""FrameDecoder loopback checks: split feeds, checksum resync, oversized lengths, sequence numbers.
+
+A stream of v1 and v2 frames (empty payloads, payloads full of SOF bytes, a 4096-byte one) with
+firmware debug text in between must decode to the same frames and the same skipped text however
+it is split: whole, byte by byte, in every chunk size up to 64 and at random points. A frame
+with a corrupted checksum or an oversized length must be dropped without losing the frames after
+it, and v2 sequence gaps and reorders must be counted. Exits non-zero on a failure.
+
+Run from the repo root: python test_codes/check_frame_decoder.py
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from packet_encoder import encode, encode_v2, FrameDecoder, SOF, SOF_V2, META, ART_CHUNK
+
+def messages() -> list[tuple[int, bytes]]:
+    rng = np.random.default_rng(0)
+    return [(META, b""), (0x02, b"\x04"), (META, bytes((SOF, SOF_V2)) * 20), (ART_CHUNK, rng.bytes(4096)),
+            (0x03, bytes((SOF,)) * 4 + b"\x00\x00"), (ART_CHUNK, rng.bytes(700)), (0x02, b"\x05")]
+
+def frames(msgs: list[tuple[int, bytes]]) -> list[bytes]:
+    """Alternating v2 and v1 frames, the v2 ones numbered 0, 1, 2..."""
+    return [encode(t, p) if i % 2 else encode_v2(t, p, i // 2) for i, (t, p) in enumerate(msgs)]
+
+def stream(text: bytes = b"dbg: hello\n") -> tuple[bytes, list[tuple[int, bytes]]]:
+    """The frames with `text` before each, and the messages they carry."""
+    msgs = messages()
+    return b"".join(text + f for f in frames(msgs)), msgs
+
+def decode(chunks, **kwargs) -> tuple[list, bytes, FrameDecoder]:
+    skipped = bytearray()
+    decoder = FrameDecoder(on_skipped=skipped.extend, **kwargs)
+    out = [(t, bytes(p)) for chunk in chunks for t, p in decoder.feed(chunk)]
+    return out, bytes(skipped), decoder
+
+def splits(data: bytes):
+    yield "whole", [data]
+    yield "byte by byte", [data[i:i + 1] for i in range(len(data))]
+    for size in range(2, 65):
+        yield f"chunks of {size}", [data[i:i + size] for i in range(0, len(data), size)]
+    rng = np.random.default_rng(1)
+    for n in range(20):
+        cuts = sorted(rng.choice(len(data), 30, replace=False))
+        yield f"random split {n}", [data[a:b] for a, b in zip([0, *cuts], [*cuts, len(data)])]
+
+def check() -> list[str]:
+    failures = []
+    data, msgs = stream()
+    text = b"dbg: hello\n" * len(msgs)
+    for name, chunks in splits(data):
+        out, skipped, decoder = decode(chunks)
+        if out != msgs:
+            failures.append(f"{name}: {len(out)} frames, expected {len(msgs)} (or payloads differ)")
+        if skipped != text:
+            failures.append(f"{name}: skipped text differs")
+        if decoder.crc_errors or decoder.seq_lost or decoder.seq_late:
+            failures.append(f"{name}: {decoder.crc_errors} checksum errors, {decoder.seq_lost} lost, {decoder.seq_late} late")
+
+    # Corrupt each frame in turn (last payload byte, or the checksum of an empty one)
+    good = frames(msgs)
+    for bad in range(len(good)):
+        corrupted = [bytearray(f) for f in good]
+        corrupted[bad][-3 if len(corrupted[bad]) > 8 else -1] ^= 0x01
+        for name, chunks in (("whole", [b"".join(corrupted)]), ("byte by byte", [bytes((b,)) for f in corrupted for b in f])):
+            out, _, decoder = decode(chunks)
+            expected = msgs[:bad] + msgs[bad + 1:]
+            if out != expected or decoder.crc_errors < 1:
+                failures.append(f"frame {bad} corrupted, {name}: {len(out)} frames, {decoder.crc_errors} checksum errors")
+
+    # A header claiming more than max_payload, then good frames
+    oversized = bytes((SOF, META, 0xFF, 0xFF)) + b"junk" + bytes((SOF_V2, META, 0, 0, 0x00, 0x80))
+    out, _, decoder = decode([oversized + data], max_payload=4096)
+    if out != msgs or decoder.oversized != 2:
+        failures.append(f"oversized lengths: {len(out)} frames, {decoder.oversized} oversized")
+
+    # A frame cut off, completed by a later feed
+    out, _, _ = decode([good[3][:100], good[3][100:] + good[4]])
+    if out != msgs[3:5]:
+        failures.append("frame completed by a later feed: not decoded")
+
+    # v2 sequence numbers: 1 lost (seq 2), 1 late (seq 1 again)
+    seqs = [encode_v2(0x02, b"\x04", s) for s in (0, 1, 3, 1, 4)]
+    _, _, decoder = decode([b"".join(seqs)])
+    if (decoder.seq_lost, decoder.seq_late, decoder.seq) != (1, 1, 4):
+        failures.append(f"sequence: {decoder.seq_lost} lost, {decoder.seq_late} late, last {decoder.seq}")
+
+    # Old firmware parses v1 only, v2 frames are skipped like text
+    out, _, _ = decode([data], max_version=1)
+    if out != [m for i, m in enumerate(msgs) if i % 2]:
+        failures.append(f"max_version=1: {len(out)} frames")
+    return failures
+
+if __name__ == '__main__':
+    failures = check()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("FrameDecoder: " + ("ok" if not failures else f"{len(failures)} failures"))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,55 @@
+"""Host reconnects over serial: CAPS and credit come back whether or not the board resets.
+
+Two hosts in turn open the same pty into the firmware simulator, once modelling a board that
+resets when the port opens (it announces after booting, the HELLO is lost) and once one that
+keeps running (only the HELLO gets an answer). Each host must end up on protocol v2 with the
+device's capabilities, exactly one full credit window, and no sequence gaps or late frames on
+the device. Exits non-zero on a failure.
+
+Run from the repo root: python test_codes/check_reconnect.py
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from device_sim import DeviceSimulator, open_pty, RX_WINDOW
+from packet_encoder import encode_meta, PROTOCOL_VERSION
+from transport import Link, SerialTransport
+
+async def run(reset_on_open: bool, hosts: int = 2) -> list[str]:
+    sim = DeviceSimulator()
+    path = open_pty(sim, reset_on_open=reset_on_open)
+    failures = []
+    for host in range(hosts):
+        link = Link(SerialTransport(path), asyncio.get_running_loop())
+        link.start()
+        await link.connected.wait()
+        await link.credit_window.acquire(0)
+        await asyncio.sleep(0.1) # Anything granted twice would have arrived by now
+        for i in range(5):
+            link.send(encode_meta(f"Host {host} track {i}", "Artist", "Album"))
+        await asyncio.sleep(0.3)
+        link.task.cancel()
+        await asyncio.sleep(0.1)
+
+        case = f"{'resetting' if reset_on_open else 'running'} board, host {host}"
+        if link.version != PROTOCOL_VERSION or link.caps != sim.caps:
+            failures.append(f"{case}: v{link.version}, caps {link.caps:#06x}")
+        if link.credit_window.granted != RX_WINDOW:
+            failures.append(f"{case}: granted {link.credit_window.granted} bytes, expected {RX_WINDOW}")
+        if sim._decoder.seq_lost or sim._decoder.seq_late:
+            failures.append(f"{case}: device saw {sim._decoder.seq_lost} lost, {sim._decoder.seq_late} late frames")
+        if sim.title != f"Host {host} track 4":
+            failures.append(f"{case}: device shows {sim.title!r}")
+    return failures
+
+async def main() -> list[str]:
+    return await run(True) + await run(False)
+
+if __name__ == '__main__':
+    failures = asyncio.run(main())
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("reconnect: " + ("ok" if not failures else f"{len(failures)} failures"))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,78 @@
+"""RGB565_RLE round trips: encode_rle565 followed by decode_rle565 must give back every input.
+
+Edge cases around the 128-pixel packet limit (runs of 1, 2, 127, 128, 129 and 257 pixels,
+literals of the same lengths, alternating runs and literals), random data, and real covers,
+which also go through packetize_art, FrameDecoder and ArtReceiver like the firmware receives
+them. Also checks the size of a few encodings that are easy to compute by hand. Exits non-zero
+on a failure.
+
+Run from the repo root: python test_codes/check_rle.py
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from packet_encoder import encode_rle565, decode_rle565, packetize_art, FrameDecoder, ArtReceiver, ArtFormat
+from bench_progressive import make_covers
+from bench_suite import ART_SIZE
+
+def px(values) -> bytes:
+    return np.asarray(values, dtype='<u2').tobytes()
+
+def cases() -> list[tuple[str, bytes]]:
+    rng = np.random.default_rng(0)
+    result = [("empty", b""), ("one pixel", px([0x1234]))]
+    for n in (1, 2, 127, 128, 129, 257):
+        result.append((f"run of {n}", px([0xF800] * n)))
+        result.append((f"literal of {n}", px(np.arange(n))))
+    mixed = []
+    for n in (1, 2, 3, 128, 129, 1, 1, 2):
+        mixed += [n * 7 + 1] * n + list(range(1000 + n, 1000 + 2 * n))
+    result.append(("alternating runs and literals", px(mixed)))
+    result.append(("random", px(rng.integers(0, 65536, 5000))))
+    result.append(("random, few colours", px(rng.integers(0, 3, 5000))))
+    result.append(("0x80 and 0x7F bytes", px([0x8080, 0x8080, 0x7F7F, 0x0080, 0x8000])))
+    return result
+
+# Inputs whose encoded size is easy to work out by hand: (name, pixels, encoded bytes)
+SIZES = [
+    ("run of 128", px([5] * 128), 3),
+    ("run of 129", px([5] * 129), 6), # 128 + a single pixel as a literal
+    ("run of 130", px([5] * 130), 6), # 128 + 2
+    ("literal of 128", px(range(128)), 1 + 256),
+    ("literal of 129", px(range(129)), 2 + 258),
+]
+
+def receive(frames: list) -> ArtReceiver:
+    receiver, decoder = ArtReceiver(), FrameDecoder()
+    for frame in frames:
+        for msg_type, payload in decoder.feed(bytes(frame)):
+            receiver.handle(msg_type, payload)
+    return receiver
+
+def check() -> list[str]:
+    failures = []
+    for name, pixels in cases():
+        if decode_rle565(encode_rle565(pixels)) != pixels:
+            failures.append(f"{name}: round trip differs")
+    for name, pixels, size in SIZES:
+        encoded = len(encode_rle565(pixels))
+        if encoded != size:
+            failures.append(f"{name}: {encoded} bytes, expected {size}")
+    for i, cover in enumerate(make_covers(4)):
+        if decode_rle565(encode_rle565(cover)) != cover:
+            failures.append(f"cover {i}: round trip differs")
+        receiver = receive(packetize_art(cover, ArtFormat.RGB565_RLE, 1024, ART_SIZE, transfer_id=i))
+        if receiver.frame is None or bytes(receiver.frame) != cover:
+            failures.append(f"cover {i}: ArtReceiver shows a different frame")
+    return failures
+
+if __name__ == '__main__':
+    failures = check()
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("RGB565_RLE: " + ("ok" if not failures else f"{len(failures)} failures"))
+    sys.exit(1 if failures else 0)
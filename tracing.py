@@ -0,0 +1,181 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+
+class Trace:
+    """Timestamps of one media event on its way from the WinRT callback to the wire.
+
+    `mark(stage)` records the time a stage finished; the stage's duration is measured from the
+    previous mark. Frames sent with the trace report back via `sent`, which adds two more
+    stages after the last mark: "queue" (until the first frame queued after it was written)
+    and "wire" (until the last frame was written). The trace is recorded once `end` was
+    called and all of its frames have been written or dropped.
+    """
+
+    __slots__ = ("tracer", "id", "kind", "marks", "_first_sent", "_last_sent", "_pending", "_ended", "_dropped", "_lock")
+
+    def __init__(self, tracer: "Tracer", id: int, kind: str):
+        self.tracer = tracer
+        self.id = id
+        self.kind = kind
+        self.marks = [("callback", time.perf_counter())]
+        self._first_sent = None # First write since the last mark
+        self._last_sent = None
+        self._pending = 0
+        self._ended = False
+        self._dropped = False # Some frame never made it to the wire (superseded or cancelled)
+        self._lock = threading.Lock() # Playback/timeline handlers run on WinRT threads
+
+    def mark(self, stage: str):
+        self.marks.append((stage, time.perf_counter()))
+        self._first_sent = None
+
+    def queued(self):
+        """Called by Link.send for every frame carrying this trace."""
+        with self._lock:
+            self._pending += 1
+
+    def sent(self):
+        """Called by the Link once a frame carrying this trace has been written."""
+        now = time.perf_counter()
+        with self._lock:
+            if self._first_sent is None:
+                self._first_sent = now
+            self._last_sent = now
+            self._pending -= 1
+            done = self._ended and self._pending == 0
+        if done:
+            self._finish()
+
+    def dropped(self):
+        """Called by the scheduler for a frame carrying this trace that won't be sent."""
+        with self._lock:
+            self._dropped = True
+            self._pending -= 1
+            done = self._ended and self._pending == 0
+        if done:
+            self._finish()
+
+    def end(self):
+        """No more frames will be sent for this event."""
+        with self._lock:
+            self._ended = True
+            done = self._pending == 0
+        if done:
+            self._finish()
+
+    def _finish(self):
+        if self._dropped:
+            self.tracer.record_dropped(self)
+            return
+        if self._first_sent is not None:
+            self.marks.append(("queue", self._first_sent))
+            self.marks.append(("wire", self._last_sent))
+        self.tracer.record(self)
+
+class Tracer:
+    """Collects finished traces into per-stage latency distributions.
+
+    Disabled tracers hand out no traces at all (`begin` returns None), so instrumented code
+    only pays for an `if trace:` check.
+    """
+
+    def __init__(self, enabled: bool = False, max_samples: int = 4096, keep_last: int = 50):
+        self.enabled = enabled
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._samples: dict[str, dict[str, deque]] = {} # kind -> stage -> durations in ms
+        self._counts: dict[str, int] = {}
+        self._dropped: dict[str, int] = {}
+        self.max_samples = max_samples
+        self.recent = deque(maxlen=keep_last) # Raw timestamps of the last few events
+
+    def begin(self, kind: str) -> Trace | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._next_id += 1
+            return Trace(self, self._next_id, kind)
+
+    def record(self, trace: Trace):
+        start = trace.marks[0][1]
+        with self._lock:
+            stages = self._samples.setdefault(trace.kind, {})
+            prev = start
+            for stage, t in trace.marks[1:]:
+                stages.setdefault(stage, deque(maxlen=self.max_samples)).append((t - prev) * 1000)
+                prev = t
+            stages.setdefault("total", deque(maxlen=self.max_samples)).append((prev - start) * 1000)
+            self._counts[trace.kind] = self._counts.get(trace.kind, 0) + 1
+            self.recent.append({
+                "id": trace.id,
+                "kind": trace.kind,
+                "marks_ms": {stage: (t - start) * 1000 for stage, t in trace.marks},
+            })
+
+    def record_dropped(self, trace: Trace):
+        with self._lock:
+            self._dropped[trace.kind] = self._dropped.get(trace.kind, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = {}
+            for kind, stages in self._samples.items():
+                result[kind] = {"events": self._counts[kind], "dropped": self._dropped.get(kind, 0), "stages": {}}
+                for stage, samples in stages.items():
+                    result[kind]["stages"][stage] = histogram(samples)
+            return {"enabled": self.enabled, "kinds": result, "recent": list(self.recent)}
+
+    def dump(self, path: str):
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.stats(), f, indent=2)
+        os.replace(tmp, path)
+
+    async def dump_every(self, path: str, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.dump(path)
+            except OSError as e:
+                print(f"Trace dump error: {e}")
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 7780) -> asyncio.AbstractServer:
+        """Serves the stats as JSON on a local HTTP endpoint (any path)."""
+        async def on_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                await reader.readuntil(b"\r\n\r\n")
+                body = json.dumps(self.stats(), indent=2).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: %d\r\nConnection: close\r\n\r\n" % len(body) + body)
+                await writer.drain()
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+        return await asyncio.start_server(on_client, host, port)
+
+# Log-spaced histogram bucket upper bounds, in ms
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+def histogram(samples) -> dict:
+    values = sorted(samples)
+    def pct(p):
+        return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+    buckets = [0] * len(BUCKETS_MS)
+    i = 0
+    for v in values:
+        while v > BUCKETS_MS[i]:
+            i += 1
+        buckets[i] += 1
+    return {
+        "count": len(values),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": values[-1] if values else 0.0,
+        "buckets_ms": {("inf" if b == float("inf") else str(b)): n for b, n in zip(BUCKETS_MS, buckets) if n},
+    }
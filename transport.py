@@ -0,0 +1,611 @@
+import asyncio
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import serial
+
+from flow_control import CreditWindow, CreditReader, legacy_pace
+from link_tuner import LinkEstimator, LinkTuner, CHUNK_HEADER
+from scheduler import TxScheduler, PRIO_ART
+from packet_encoder import (
+    is_art_frame, to_v2, decode_caps, decode_art_begin, decode_art_nak, encode_hello,
+    CAPS, ART_NAK, ART_BEGIN, ART_CHUNK, ART_END, PROTOCOL_VERSION, FRAME_OVERHEAD,
+)
+from tracing import Trace
+
+class Transport:
+    """Byte pipe to one desk-thing. Implementations must not block the event loop."""
+
+    name = "transport"
+    legacy_small_delay = 0.05 # Sleep after small frames when the firmware has no flow control
+    nominal_Bps = None # Expected throughput before any is measured, None if unknown
+
+    async def connect(self):
+        raise NotImplementedError
+
+    async def write(self, data: bytes):
+        raise NotImplementedError
+
+    async def write_batch(self, frames: list[bytes]):
+        """Writes several frames with as few system calls as the transport allows."""
+        await self.write(frames[0] if len(frames) == 1 else b"".join(frames))
+
+    async def read(self) -> bytes:
+        """Returns received bytes, b"" on a quiet timeout. Raises once the connection is gone."""
+        raise NotImplementedError
+
+    async def close(self):
+        raise NotImplementedError
+
+class SerialTransport(Transport):
+    """pyserial port. Blocking calls run on dedicated threads, so the loop never waits on them."""
+
+    def __init__(self, port: str, baud_rate: int = 921600):
+        self.port = port
+        self.baud_rate = baud_rate
+        self.name = port
+        self.nominal_Bps = baud_rate / 10 # 8N1
+        self.ser = None
+        # One thread each, so a pending read never delays a write
+        self._tx = ThreadPoolExecutor(max_workers=1, thread_name_prefix="serial-tx")
+        self._rx = ThreadPoolExecutor(max_workers=1, thread_name_prefix="serial-rx")
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        self.ser = await loop.run_in_executor(
+            self._tx, lambda: serial.Serial(self.port, self.baud_rate, timeout=0.5)
+        )
+
+    async def write(self, data: bytes):
+        await asyncio.get_running_loop().run_in_executor(self._tx, self.ser.write, data)
+
+    async def read(self) -> bytes:
+        ser = self.ser
+        return await asyncio.get_running_loop().run_in_executor(
+            self._rx, lambda: ser.read(ser.in_waiting or 1)
+        )
+
+    async def close(self):
+        if self.ser and self.ser.is_open:
+            try:
+                self.ser.cancel_read()
+            except Exception:
+                pass
+            self.ser.close()
+
+class TcpTransport(Transport):
+    """TCP connection to the WiFi firmware, a non-blocking socket driven by the event loop.
+
+    Batches go out with one vectored `sendmsg` call where the platform has it (not Windows),
+    otherwise joined into a single send.
+    """
+
+    legacy_small_delay = 0.01
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.name = f"{host}:{port}"
+        self.sock: socket.socket = None
+        self.send_calls = 0
+
+    async def connect(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            await asyncio.get_running_loop().sock_connect(sock, (self.host, self.port))
+        except Exception:
+            sock.close()
+            raise
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+
+    async def write(self, data: bytes):
+        self.send_calls += 1
+        await asyncio.get_running_loop().sock_sendall(self.sock, data)
+
+    async def write_batch(self, frames: list[bytes]):
+        if len(frames) == 1 or not hasattr(self.sock, "sendmsg"):
+            await super().write_batch(frames)
+            return
+        self.send_calls += 1
+        try:
+            sent = self.sock.sendmsg(frames)
+        except BlockingIOError:
+            sent = 0
+        total = sum(len(f) for f in frames)
+        if sent < total:
+            # Socket buffer full, let the loop finish the rest when it drains
+            await self.write(b"".join(frames)[sent:])
+
+    async def read(self) -> bytes:
+        data = await asyncio.get_running_loop().sock_recv(self.sock, 4096)
+        if not data:
+            raise ConnectionResetError("Connection closed by device")
+        return data
+
+    async def close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+class ArtTransfer:
+    """The frames of the last full art transfer queued to one device, kept to resend what it missed."""
+
+    def __init__(self, transfer_id: int, chunk_size: int, begin: bytes):
+        self.transfer_id = transfer_id
+        self.chunk_size = chunk_size
+        self.begin = begin
+        self.chunks = {} # Chunk index -> frame
+        self.end = None
+        self.rounds = 0 # Times something was resent
+        self.round_chunks = 0 # Chunks queued in the latest round
+
+class Link:
+    """Keeps one transport connected and feeds it frames from a priority TxScheduler.
+
+    `send` may be called from any thread (WinRT callbacks arrive on their own threads).
+    Enqueue-to-wire latency is measured per priority class. Art never takes the last
+    `control_reserve` bytes of the device's credit window, so a control frame finds credit at
+    once instead of waiting for the device to work through a full window of art chunks.
+
+    The queue is bounded by `max_queue_bytes` (None for unbounded): once a slow device falls that far behind, its
+    pending art is dropped (the next art goes out as a full frame), then new frames. Frames
+    sent while disconnected are discarded, a reconnect starts from an empty queue anyway:
+    `on_connect(link)` is called on every connect, once the device sent CAPS (or after
+    `caps_timeout` for firmware without), to send the device what it should show.
+
+    Frames are queued in the v1 format. Once the device announces v2 in its CAPS frame, each
+    one is re-framed as v2 on the way out, numbered in wire order per connection (the same frame
+    may carry a different number on each link of a LinkGroup). `protocol_version=1` sticks to v1.
+
+    The frames of the last art transfer that asked for ART_NAK (see packetize_art) are kept.
+    When the device reports missing chunks, only those and ART_END are queued again, at most
+    `art_retries` times; if it doesn't answer ART_END within `art_ack_timeout`, ART_END is
+    repeated. Giving up resets `art_frame`, so the next art goes out as a full frame.
+
+    With `adaptive`, a LinkEstimator measures the throughput (from CREDIT) and byte error rate
+    (from ART_NAK), and a LinkTuner sets `art_chunk_size` for the next transfer and `batch_bytes`
+    (up to the one given) from them. Otherwise chunks stay at FIXED_CHUNK.
+    """
+
+    def __init__(self, transport: Transport, loop: asyncio.AbstractEventLoop, scheduler: TxScheduler = None,
+                 batch_bytes: int = 12288, flush_deadline_us: int = 200, max_queue_bytes: int = 262144,
+                 protocol_version: int = PROTOCOL_VERSION, art_retries: int = 8, art_ack_timeout: float = 1.0,
+                 adaptive: bool = True, on_connect=None, caps_timeout: float = 0.5, control_reserve: int = 1024):
+        self.transport = transport
+        self.loop = loop
+        self.scheduler = scheduler or TxScheduler()
+        self.batch_bytes = batch_bytes # Max bytes per write (keep below the device window), 0 = one frame per write
+        self.flush_deadline_us = flush_deadline_us # Max wait for more frames once one is ready
+        self.max_queue_bytes = max_queue_bytes
+        self.control_reserve = control_reserve # Credit bytes only frames ahead of art may use
+        self._art_wake = asyncio.Event() # Credit arrived or a frame ahead of art was queued
+        self.protocol_version = protocol_version # Highest frame version to use
+        self.version = 1 # In use on this connection
+        self.caps = 0 # CAP_* flags from the device's CAPS frame
+        self.tx_seq = 0 # v2 sequence number of the next frame
+        self.credit_window = CreditWindow(on_grant=self._on_credit) # Falls back to sleep pacing if the firmware never grants credit
+        self.art_frame = None # Last RGB565 frame sent to the device, used for delta updates
+        self.art_transfer_id = 0
+        self.art_frames_dropped = 0
+        self.art_retries = art_retries
+        self.art_ack_timeout = art_ack_timeout # Seconds after ART_END was written
+        self.art_transfer: ArtTransfer = None
+        self.adaptive = adaptive
+        self.estimator = LinkEstimator(transport.nominal_Bps)
+        self.tuner = LinkTuner(self.estimator, batch_bytes=batch_bytes)
+        if adaptive:
+            self.tuner.tune(protocol_version)
+            self.batch_bytes = self.tuner.batch_bytes
+        self.connected = asyncio.Event()
+        self.on_connect = on_connect # Called with this link on the loop thread, see MediaController
+        self.caps_timeout = caps_timeout
+        self._caps_received = asyncio.Event()
+        self.task = None
+
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.writes = 0
+        self.overflows = 0 # Times the queue bound was hit
+        self.frames_discarded = 0 # Dropped for the queue bound or while disconnected
+        self.art_naks = 0 # ART_NAK replies with missing chunks
+        self.art_chunks_resent = 0
+        self.art_bytes_resent = 0
+        self.art_resends_failed = 0 # Transfers given up after art_retries
+        self._rate_mark = (time.perf_counter(), 0) # For throughput between stats() calls
+
+    def start(self):
+        self.task = self.loop.create_task(self._run())
+
+    def send(self, frame: bytes, priority: int = None, trace: Trace = None):
+        """Queues a frame, classified by its message type unless `priority` is given.
+
+        A `trace` is told when the frame has been written (see tracing.Trace).
+        """
+        if trace:
+            trace.queued()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self._put(frame, priority, trace)
+        else:
+            self.loop.call_soon_threadsafe(self._put, frame, priority, trace)
+
+    def _put(self, frame: bytes, priority: int, trace: Trace):
+        if not self.connected.is_set():
+            self.frames_discarded += 1
+            if trace: trace.dropped()
+            return
+        if self.max_queue_bytes and self.scheduler.queued_bytes + len(frame) > self.max_queue_bytes:
+            self.overflows += 1
+            dropped = self.scheduler.drop(is_art_frame)
+            if dropped:
+                self.frames_discarded += dropped
+                self.art_frame = None
+                self.art_transfer = None
+            if self.scheduler.queued_bytes + len(frame) > self.max_queue_bytes:
+                self.frames_discarded += 1
+                if trace: trace.dropped()
+                return
+        self.scheduler.put(frame, priority, trace)
+        if self.scheduler.urgent():
+            self._art_wake.set()
+        if frame[1] in (ART_BEGIN, ART_CHUNK, ART_END):
+            self._keep_art(frame)
+
+    def _keep_art(self, frame: bytes):
+        msg_type = frame[1]
+        if msg_type == ART_BEGIN:
+            begin = decode_art_begin(frame[4:-1])
+            self.art_transfer = ArtTransfer(begin[4], begin[5], frame) if begin and begin[5] else None
+            return
+        transfer = self.art_transfer
+        if msg_type == ART_CHUNK and transfer and frame[8] == transfer.transfer_id:
+            transfer.chunks[int.from_bytes(frame[4:8], 'little') // transfer.chunk_size] = frame
+        elif msg_type == ART_END and transfer and frame[4] == transfer.transfer_id:
+            transfer.end = frame
+            transfer.round_chunks = len(transfer.chunks)
+
+    def clear(self):
+        self.scheduler.clear()
+
+    def begin_art(self, transfer_id: int = None) -> int:
+        """Starts a new art generation: drops unsent frames of older ones, returns the new transfer id.
+
+        The id is the previous one plus one unless `transfer_id` is given (see LinkGroup).
+
+        Must be called on the event loop thread. If an older transfer was cut short, the device
+        image is unknown, so `art_frame` is reset and the next art goes out as a full frame.
+        """
+        dropped = self.scheduler.drop(is_art_frame)
+        self.art_transfer = None
+        if dropped:
+            self.art_frames_dropped += dropped
+            self.art_frame = None
+            print(f"Dropped {dropped} stale art frames")
+        self.art_transfer_id = (self.art_transfer_id + 1) & 0xFF if transfer_id is None else transfer_id
+        return self.art_transfer_id
+
+    async def _run(self):
+        """Robust connection loop for transmitting and receiving data."""
+        while True:
+            rx_task = tx_task = connect_task = None
+            try:
+                await self.transport.connect()
+                print(f"Connected to {self.transport.name}")
+                self.clear()
+                self.art_frame = None # Device may have reset, next art must be a full frame
+                self.art_transfer = None
+                self.credit_window.reset() # Device grants a fresh window after reset
+                self.version, self.caps, self.tx_seq = 1, 0, 0 # Until the device sends CAPS
+                self._caps_received.clear()
+                await self.transport.write(encode_hello()) # A serial board that didn't reset announces again
+                self.connected.set()
+
+                rx_task = self.loop.create_task(self._rx())
+                tx_task = self.loop.create_task(self._tx())
+                connect_task = self.loop.create_task(self._notify_connect())
+                done, _ = await asyncio.wait((rx_task, tx_task), return_when=asyncio.FIRST_EXCEPTION)
+                for task in done:
+                    task.result() # Re-raise the connection error
+            except Exception as e:
+                print(f"Transport Error ({self.transport.name}): {e}")
+            finally:
+                self.connected.clear()
+                # Also when the link itself is cancelled. Wait for them before closing, a socket
+                # closed under a pending read stays registered with the selector under its fd
+                tasks = [task for task in (rx_task, tx_task, connect_task) if task]
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                await self.transport.close()
+            await asyncio.sleep(2)
+
+    async def _notify_connect(self):
+        """Calls `on_connect` once the device announced its version and capabilities, what to send depends on them."""
+        try:
+            await asyncio.wait_for(self._caps_received.wait(), self.caps_timeout)
+        except asyncio.TimeoutError:
+            pass # Firmware without CAPS
+        if self.on_connect:
+            try:
+                self.on_connect(self)
+            except Exception as e:
+                print(f"Error in on_connect ({self.transport.name}): {e}")
+
+    async def _tx(self):
+        while True:
+            batch = await self._next_batch()
+            queued = [frame for _, _, frame, _ in batch]
+            frames = queued
+            if self.version >= 2:
+                frames = [to_v2(frame, seq & 0xFFFF) for seq, frame in enumerate(queued, self.tx_seq)]
+                self.tx_seq = (self.tx_seq + len(frames)) & 0xFFFF
+            size = sum(len(f) for f in frames)
+            if await self.credit_window.acquire(size):
+                self.writes += 1
+                await self.transport.write_batch(frames)
+            else:
+                # Old firmware: one frame at a time with sleeps in between
+                for frame in frames:
+                    self.writes += 1
+                    await self.transport.write(frame)
+                    await legacy_pace(frame, self.transport.legacy_small_delay)
+            self.frames_sent += len(frames)
+            self.bytes_sent += size
+            transfer = self.art_transfer
+            if transfer and any(frame is transfer.end for frame in queued):
+                self.loop.call_later(self.art_ack_timeout, self._art_timed_out, transfer, transfer.rounds)
+            for enqueued, priority, _, trace in batch:
+                self.scheduler.record_sent(enqueued, priority)
+                if trace:
+                    trace.sent()
+
+    async def _next_batch(self) -> list[tuple[float, int, bytes, Trace]]:
+        """Waits for a frame, then gathers whatever else is queued within the byte budget.
+
+        Waits at most `flush_deadline_us` for further frames, so a lone frame isn't held back.
+        Art is only taken within the credit left beside `control_reserve` (see `_hold_art`).
+        """
+        while True:
+            await self.scheduler.wait(None)
+            head = self.scheduler.peek()
+            if head[1] == PRIO_ART:
+                await self._hold_art(self._wire_size(head[2]))
+            first = self.scheduler.get_nowait()
+            if first is not None:
+                break # else begin_art dropped the art meanwhile
+        batch = [first]
+        size = len(first[2])
+        art_room = self._art_room() - (self._wire_size(first[2]) if first[1] == PRIO_ART else 0)
+        deadline = time.perf_counter() + self.flush_deadline_us / 1e6
+        while size < self.batch_bytes:
+            item = self.scheduler.peek()
+            if item is None:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or not await self.scheduler.wait(remaining):
+                    break
+                continue
+            if len(item[2]) > self.batch_bytes - size:
+                break # Doesn't fit
+            if item[1] == PRIO_ART:
+                if self._wire_size(item[2]) > art_room:
+                    break # Would take the control reserve
+                art_room -= self._wire_size(item[2])
+            self.scheduler.get_nowait()
+            batch.append(item)
+            size += len(item[2])
+        return batch
+
+    def _wire_size(self, frame: bytes) -> int:
+        """Size of a queued (v1) frame once framed for this connection."""
+        return len(frame) + FRAME_OVERHEAD[self.version] - FRAME_OVERHEAD[1]
+
+    def _reserve(self) -> int:
+        """Credit bytes art must leave, at most half the device's window."""
+        return min(self.control_reserve, self.credit_window.window // 2)
+
+    def _art_room(self) -> float:
+        """Credit art may take now, unlimited without credit flow control or priorities."""
+        window = self.credit_window
+        if not window.enabled or not self.scheduler.prioritize:
+            return float("inf")
+        return window.credits - self._reserve()
+
+    async def _hold_art(self, n: int):
+        """Waits until a batch of art starting with an `n` byte frame fits in `_art_room`, or a frame ahead of art is queued.
+
+        Like `acquire` would for the batch, only a frame ahead of art cuts it short. Gives up
+        after the window's stall timeout, `acquire` then deals with the lost credit.
+        """
+        want = max(n, min(self.batch_bytes, self.scheduler.queued_bytes, self.credit_window.window - self._reserve()))
+        deadline = self.loop.time() + self.credit_window.stall_timeout
+        while want > self._art_room() and not self.scheduler.urgent():
+            self._art_wake.clear()
+            try:
+                await asyncio.wait_for(self._art_wake.wait(), deadline - self.loop.time())
+            except asyncio.TimeoutError:
+                return
+
+    async def _rx(self):
+        reader = CreditReader(self.credit_window, lambda line: print(f"[ESP32] {line}"), self._on_frame)
+        while True:
+            data = await self.transport.read()
+            if data:
+                await reader.feed(data)
+
+    def _on_frame(self, msg_type: int, payload: bytes):
+        if msg_type == CAPS:
+            caps = decode_caps(payload)
+            if caps:
+                self.version = min(caps[0], self.protocol_version)
+                self.caps = caps[1]
+                self._caps_received.set()
+                print(f"Device {self.transport.name}: protocol v{caps[0]}, capabilities {self.caps:#06x}, using v{self.version}")
+        elif msg_type == ART_NAK:
+            self._on_art_nak(payload)
+
+    def _on_art_nak(self, payload: bytes):
+        nak = decode_art_nak(payload)
+        transfer = self.art_transfer
+        if not nak or not transfer or nak[0] != transfer.transfer_id:
+            return # Superseded meanwhile
+        _, count, missing = nak
+        frame_bytes = transfer.chunk_size + CHUNK_HEADER + FRAME_OVERHEAD[self.version]
+        if count and not missing:
+            self.art_transfer = None # Drawn
+            self.estimator.on_round(transfer.round_chunks + 1, 0, frame_bytes)
+            self._retune()
+            return
+        self.art_naks += 1
+        if count:
+            frames = [transfer.chunks[i] for i in missing if i in transfer.chunks]
+            self.estimator.on_round(transfer.round_chunks + 1, len(missing), frame_bytes)
+        else:
+            frames = [transfer.begin, *(transfer.chunks[i] for i in sorted(transfer.chunks))] # ART_BEGIN got lost
+            self.estimator.on_round(transfer.round_chunks + 2, 1, frame_bytes)
+        self._retune()
+        self._resend_art(transfer, frames)
+
+    def _art_timed_out(self, transfer: ArtTransfer, rounds: int):
+        if transfer is self.art_transfer and transfer.rounds == rounds and self.connected.is_set():
+            self.estimator.on_timeout(transfer.round_chunks + 1, transfer.chunk_size + CHUNK_HEADER + FRAME_OVERHEAD[self.version])
+            self._retune()
+            self._resend_art(transfer, []) # ART_END or the answer to it got lost
+
+    def _on_credit(self, n: int, buffered: int):
+        self._art_wake.set()
+        self.estimator.on_credit(n, buffered)
+        self._retune()
+
+    def _retune(self):
+        if not self.adaptive:
+            return
+        before = self.tuner.chunk_size
+        if self.tuner.tune(self.version):
+            print(f"Link {self.transport.name}: art chunks {before} -> {self.tuner.chunk_size} bytes "
+                  f"({(self.estimator.bandwidth or 0) / 1000:.0f} kB/s, byte error rate {self.estimator.byte_error_rate:.1e}), "
+                  f"writes up to {self.tuner.batch_bytes} bytes")
+        self.batch_bytes = self.tuner.batch_bytes
+
+    @property
+    def art_chunk_size(self) -> int:
+        """Chunk size for the next full art transfer."""
+        return self.tuner.chunk_size
+
+    def _resend_art(self, transfer: ArtTransfer, chunks: list[bytes]):
+        transfer.rounds += 1
+        if transfer.rounds > self.art_retries or transfer.end is None:
+            print(f"Giving up on art transfer {transfer.transfer_id} to {self.transport.name}")
+            self.art_resends_failed += 1
+            self.art_transfer = None
+            self.art_frame = None # Unknown what the device shows, the next art goes out in full
+            return
+        for frame in (*chunks, transfer.end):
+            self.scheduler.put(frame)
+        transfer.round_chunks = len(chunks)
+        self.art_chunks_resent += len(chunks)
+        self.art_bytes_resent += sum(len(frame) for frame in chunks)
+
+    def supports(self, cap: int) -> bool:
+        """True if the connected device announced capability `cap` (a CAP_* flag)."""
+        return bool(self.caps & cap)
+
+    def stats(self) -> dict:
+        now = time.perf_counter()
+        since, bytes_then = self._rate_mark
+        self._rate_mark = (now, self.bytes_sent)
+        oldest = self.scheduler.oldest()
+        return {
+            "transport": self.transport.name,
+            "connected": self.connected.is_set(),
+            "protocol_version": self.version,
+            "caps": self.caps,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "writes": self.writes,
+            "throughput_Bps": (self.bytes_sent - bytes_then) / (now - since) if now > since else 0.0, # Since the last call
+            "queue_depth": self.scheduler.qsize(),
+            "queued_bytes": self.scheduler.queued_bytes,
+            "lag_ms": (now - oldest) * 1000 if oldest is not None else 0.0, # Age of the oldest pending frame
+            "overflows": self.overflows,
+            "frames_discarded": self.frames_discarded,
+            "art_frames_dropped": self.art_frames_dropped,
+            "art_naks": self.art_naks,
+            "art_chunks_resent": self.art_chunks_resent,
+            "art_bytes_resent": self.art_bytes_resent,
+            "art_resends_failed": self.art_resends_failed,
+            "art_chunk_size": self.art_chunk_size,
+            "batch_bytes": self.batch_bytes,
+            **{f"link_{k}": v for k, v in self.estimator.stats().items()},
+            "classes": self.scheduler.stats(),
+            **{f"credit_{k}": v for k, v in self.credit_window.stats().items()},
+        }
+
+class LinkGroup:
+    """Fans every frame out to several Links, one per device, behind the interface of a single Link.
+
+    Frames are encoded once and the same bytes object is queued on each link. Every link has its
+    own bounded queue and writer task, so a slow or disconnected device only backs up its own
+    queue. Art deltas are encoded against the frame all devices show; once one of them diverges
+    (reconnect, overflow), `art_frame` is None and the next art goes to all as a full frame.
+    """
+
+    def __init__(self, links: list[Link]):
+        self.links = links
+        self.art_transfer_id = 0
+
+    def start(self):
+        for link in self.links:
+            link.start()
+
+    def send(self, frame: bytes, priority: int = None, trace: Trace = None):
+        for link in self.links:
+            link.send(frame, priority, trace)
+
+    def clear(self):
+        for link in self.links:
+            link.clear()
+
+    def supports(self, cap: int) -> bool:
+        """True if every connected device supports `cap`, frames are shared so the least capable one decides."""
+        connected = [link for link in self.links if link.connected.is_set()]
+        return bool(connected) and all(link.supports(cap) for link in connected)
+
+    @property
+    def art_chunk_size(self) -> int:
+        """The smallest chunk size of the connected links, frames are shared."""
+        links = [link for link in self.links if link.connected.is_set()] or self.links
+        return min(link.art_chunk_size for link in links)
+
+    @property
+    def on_connect(self):
+        return self.links[0].on_connect
+
+    @on_connect.setter
+    def on_connect(self, callback):
+        for link in self.links:
+            link.on_connect = callback
+
+    def begin_art(self) -> int:
+        self.art_transfer_id = (self.art_transfer_id + 1) & 0xFF
+        for link in self.links:
+            link.begin_art(self.art_transfer_id)
+        return self.art_transfer_id
+
+    @property
+    def art_frame(self) -> bytes | None:
+        frame = self.links[0].art_frame
+        return frame if all(link.art_frame is frame for link in self.links) else None
+
+    @art_frame.setter
+    def art_frame(self, frame: bytes | None):
+        for link in self.links:
+            link.art_frame = frame
+
+    def stats(self) -> dict:
+        return {"devices": [link.stats() for link in self.links]}